@@ -1,4 +1,13 @@
+from datetime import timedelta
+from decimal import Decimal
+
 import pytest
+from django.db import connection
+from django.utils import timezone
+from huey.contrib.djhuey import HUEY
+from laybys.models import Layby
+from rest_framework import status
+from rest_framework.test import APIClient
 
 from pay_by_plan.users.models import User
 from pay_by_plan.users.tests.factories import UserFactory
@@ -12,3 +21,70 @@ def _media_storage(settings, tmpdir) -> None:
 @pytest.fixture
 def user(db) -> User:
     return UserFactory()
+
+
+@pytest.fixture
+def api_client(user) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def layby(user) -> Layby:
+    return Layby.objects.create(
+        user=user,
+        shop_name="Game",
+        item_description="Double door fridge",
+        total_cost=Decimal("1000.00"),
+        expected_end_date=timezone.now().date() + timedelta(days=90),
+    )
+
+
+@pytest.fixture
+def immediate_huey():
+    HUEY.immediate = True
+    yield HUEY
+    HUEY.immediate = False
+
+
+@pytest.fixture
+def assert_query_budget(api_client, django_assert_max_num_queries):
+    """
+    GET an endpoint and fail if it runs more than ``budget`` queries.
+
+    Checking a list endpoint with several rows on the page against a small
+    budget catches queries issued per row.
+    """
+
+    def check(url, budget, params=None):
+        with django_assert_max_num_queries(budget):
+            response = api_client.get(url, params)
+        assert response.status_code == status.HTTP_200_OK
+        return response
+
+    return check
+
+
+@pytest.fixture
+def assert_uses_index(db):
+    """
+    Fail unless Postgres would read ``queryset`` through the named index.
+
+    Sequential scans are switched off for the test's transaction, as on the
+    handful of rows a test creates the planner would otherwise always prefer
+    them. The table is analyzed first so the plan reflects the rows the test
+    created rather than statistics left behind by earlier runs.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def check(queryset, index_name):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ANALYZE {connection.ops.quote_name(queryset.model._meta.db_table)}",  # noqa: SLF001
+            )
+        plan = queryset.explain()
+        assert index_name in plan, plan
+
+    return check
@@ -1,3 +1,23 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ShopDailyRollup
+
+
+@admin.register(ShopDailyRollup)
+class ShopDailyRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        "shop_name",
+        "date",
+        "payments_total",
+        "payments_count",
+        "new_laybys",
+        "new_laybys_value",
+        "completed_laybys",
+        "outstanding_change",
+    )
+    search_fields = ("shop_name",)
+    date_hierarchy = "date"
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
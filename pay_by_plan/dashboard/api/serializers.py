@@ -1,11 +1,22 @@
+from dashboard.services import GRANULARITIES
+from dashboard.services import GRANULARITY_MONTH
+from dashboard.services import GRANULARITY_WEEK
+from dashboard.services import PROJECTION_WINDOW_MONTHS
+from dashboard.services import SHOP_REPORT_DAYS
+from dashboard.services import STATISTICS_WINDOW_MONTHS
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+SHOP_REPORT_MAX_DAYS = 366
+
 
 class DashboardSummarySerializer(serializers.Serializer):
     active_laybys_count = serializers.IntegerField()
     total_remaining_balance = serializers.DecimalField(max_digits=10, decimal_places=2)
     total_paid_last_30_days = serializers.DecimalField(max_digits=10, decimal_places=2)
     overdue_count = serializers.IntegerField()
+    total_arrears = serializers.DecimalField(max_digits=10, decimal_places=2)
     upcoming_reminders_count = serializers.IntegerField()
 
 
@@ -15,3 +26,55 @@ class DashboardOverviewSerializer(serializers.Serializer):
     reminders = serializers.DictField()
     recent_activity = serializers.DictField()
     alerts = serializers.DictField()
+
+
+class DashboardStatisticsQuerySerializer(serializers.Serializer):
+    months = serializers.IntegerField(
+        min_value=1,
+        max_value=60,
+        default=STATISTICS_WINDOW_MONTHS,
+    )
+    granularity = serializers.ChoiceField(
+        choices=GRANULARITIES,
+        default=GRANULARITY_MONTH,
+    )
+
+
+class DashboardProjectionQuerySerializer(serializers.Serializer):
+    months = serializers.IntegerField(
+        min_value=1,
+        max_value=60,
+        default=PROJECTION_WINDOW_MONTHS,
+    )
+    granularity = serializers.ChoiceField(
+        choices=GRANULARITIES,
+        default=GRANULARITY_WEEK,
+    )
+
+
+class DashboardShopReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        """
+        Default to the last SHOP_REPORT_DAYS days and bound the window.
+        """
+        end = attrs.setdefault("end", timezone.now().date())
+        start = attrs.setdefault(
+            "start",
+            end - timezone.timedelta(days=SHOP_REPORT_DAYS - 1),
+        )
+        if start > end:
+            raise serializers.ValidationError(
+                {"start": _("Start date must not be after the end date.")},
+            )
+        if (end - start).days >= SHOP_REPORT_MAX_DAYS:
+            raise serializers.ValidationError(
+                {"start": _("The report window is limited to a year.")},
+            )
+        return attrs
+
+
+class DashboardShopDailyReportQuerySerializer(DashboardShopReportQuerySerializer):
+    shop_name = serializers.CharField(max_length=100)
@@ -1,13 +1,19 @@
+from dashboard.cache import DashboardCache
 from dashboard.services import DashboardService
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 from drf_spectacular.utils import extend_schema_view
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from .serializers import DashboardOverviewSerializer
+from .serializers import DashboardProjectionQuerySerializer
+from .serializers import DashboardShopDailyReportQuerySerializer
+from .serializers import DashboardShopReportQuerySerializer
+from .serializers import DashboardStatisticsQuerySerializer
 
 
 @extend_schema_view(
@@ -17,6 +23,26 @@ from .serializers import DashboardOverviewSerializer
     ),
     statistics=extend_schema(
         summary="Get dashboard statistics",
+        parameters=[DashboardStatisticsQuerySerializer],
+        responses={200: OpenApiTypes.OBJECT},
+    ),
+    projection=extend_schema(
+        summary="Get projected inflows across all laybys",
+        parameters=[DashboardProjectionQuerySerializer],
+        responses={200: OpenApiTypes.OBJECT},
+    ),
+    shops=extend_schema(
+        summary="Get the activity and outstanding balance of every shop",
+        parameters=[DashboardShopReportQuerySerializer],
+        responses={200: OpenApiTypes.OBJECT},
+    ),
+    cache_stats=extend_schema(
+        summary="Get the hit and miss counts of the dashboard cache",
+        responses={200: OpenApiTypes.OBJECT},
+    ),
+    shop_report=extend_schema(
+        summary="Get the daily activity and outstanding balance of a shop",
+        parameters=[DashboardShopDailyReportQuerySerializer],
         responses={200: OpenApiTypes.OBJECT},
     ),
 )
@@ -29,7 +55,11 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Get comprehensive dashboard data including laybys, payments, and reminders.
         """
-        dashboard_data = DashboardService.get_user_dashboard_overview(request.user)
+        dashboard_data = DashboardCache.get_or_set(
+            request.user.pk,
+            "overview",
+            lambda: DashboardService.get_user_dashboard_overview(request.user),
+        )
         return Response(dashboard_data)
 
     @action(detail=False, methods=["get"])
@@ -37,5 +67,69 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Get statistical data for charts and graphs.
         """
-        stats = DashboardService.get_user_statistics(request.user)
+        params = DashboardStatisticsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        months = params.validated_data["months"]
+        granularity = params.validated_data["granularity"]
+
+        stats = DashboardCache.get_or_set(
+            request.user.pk,
+            f"statistics:{months}:{granularity}",
+            lambda: DashboardService.get_user_statistics(
+                request.user,
+                months=months,
+                granularity=granularity,
+            ),
+        )
         return Response(stats)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def projection(self, request):
+        """
+        Get the payments expected across all open laybys per period, for staff.
+        """
+        params = DashboardProjectionQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(
+            DashboardService.get_inflow_projection(
+                months=params.validated_data["months"],
+                granularity=params.validated_data["granularity"],
+            ),
+        )
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def shops(self, request):
+        """
+        Get the activity of every shop over a date range, for staff.
+        """
+        params = DashboardShopReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(DashboardService.get_shop_report(**params.validated_data))
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="shop-report",
+        permission_classes=[IsAdminUser],
+    )
+    def shop_report(self, request):
+        """
+        Get the daily activity of one shop over a date range, for staff.
+        """
+        params = DashboardShopDailyReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(
+            DashboardService.get_shop_daily_report(**params.validated_data),
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="cache-stats",
+        permission_classes=[IsAdminUser],
+    )
+    def cache_stats(self, request):
+        """
+        Get the dashboard cache hits and misses across all workers, for staff.
+        """
+        return Response(DashboardCache.get_stats())
@@ -2,5 +2,9 @@ from django.apps import AppConfig
 
 
 class DashboardConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'dashboard'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "dashboard"
+
+    def ready(self):
+        # The receivers import models, so they are connected once apps are loaded.
+        from . import signals  # noqa: F401, PLC0415
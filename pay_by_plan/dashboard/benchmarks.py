@@ -0,0 +1,120 @@
+"""
+Benchmarks for the dashboard services.
+
+These are not collected by the regular test run. Run them explicitly with output
+enabled, optionally overriding the number of payments and the number of laybys
+in the inflow projection:
+
+    $ BENCHMARK_PAYMENTS=100000 BENCHMARK_PROJECTION_LAYBYS=1000000 \
+        pytest pay_by_plan/dashboard/benchmarks.py -s
+"""
+
+import os
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from dashboard.services import DashboardService
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from laybys.models import Installment
+from laybys.models import Layby
+from laybys.schedule import build_schedule
+from payments.models import Payment
+
+PAYMENTS = int(os.environ.get("BENCHMARK_PAYMENTS", "50000"))
+LAYBYS = 200
+PROJECTION_LAYBYS = int(os.environ.get("BENCHMARK_PROJECTION_LAYBYS", "20000"))
+
+
+def test_statistics_for_user_with_many_payments(user):
+    laybys = Layby.objects.bulk_create(
+        Layby(
+            user=user,
+            shop_name=f"Shop {i}",
+            item_description="Benchmark item",
+            total_cost=Decimal("100000.00"),
+            expected_end_date="2099-01-01",
+        )
+        for i in range(LAYBYS)
+    )
+    now = timezone.now()
+    payments = [
+        Payment(layby=laybys[i % LAYBYS], amount=Decimal("25.00"))
+        for i in range(PAYMENTS)
+    ]
+    Payment.objects.bulk_create(payments, batch_size=5000)
+    for i, payment in enumerate(payments):
+        payment.payment_date = now - timedelta(minutes=i * 10)
+    Payment.objects.bulk_update(payments, ["payment_date"], batch_size=5000)
+
+    for granularity in ("month", "week"):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            stats = DashboardService.get_user_statistics(user, granularity=granularity)
+            elapsed = time.perf_counter() - start
+
+        counted = sum(period["count"] for period in stats["payment_trends"])
+        print(  # noqa: T201
+            f"{granularity:<6} {PAYMENTS} payments: {elapsed * 1000:8.1f} ms, "
+            f"{len(queries)} queries, {len(stats['payment_trends'])} periods, "
+            f"{counted} payments in window",
+        )
+        assert len(queries) == 2  # noqa: PLR2004
+
+
+def _create_scheduled_laybys(user):
+    today = timezone.now().date()
+    for offset in range(0, PROJECTION_LAYBYS, 10000):
+        laybys = Layby.objects.bulk_create(
+            Layby(
+                user=user,
+                shop_name=f"Shop {i}",
+                item_description="Benchmark item",
+                total_cost=Decimal("1200.00"),
+                payment_frequency=(
+                    Layby.FREQUENCY_BIWEEKLY if i % 2 else Layby.FREQUENCY_MONTHLY
+                ),
+                start_date=today - timedelta(days=i % 180),
+                expected_end_date=today + timedelta(days=180 + i % 365),
+            )
+            for i in range(offset, min(offset + 10000, PROJECTION_LAYBYS))
+        )
+        Installment.objects.bulk_create(
+            (
+                Installment(
+                    layby=layby,
+                    due_date=due_date,
+                    amount=amount,
+                    cumulative_amount=cumulative_amount,
+                )
+                for layby in laybys
+                for due_date, amount, cumulative_amount in build_schedule(
+                    layby.total_cost,
+                    layby.start_date,
+                    layby.expected_end_date,
+                    layby.payment_frequency,
+                )
+            ),
+            batch_size=10000,
+        )
+
+
+def test_inflow_projection_for_many_laybys(user):
+    _create_scheduled_laybys(user)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE laybys_installment")
+
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        projection = DashboardService.get_inflow_projection()
+        elapsed = time.perf_counter() - start
+
+    expected = sum(period["total"] for period in projection["projection"])
+    print(  # noqa: T201
+        f"projection {PROJECTION_LAYBYS} laybys: {elapsed * 1000:8.1f} ms, "
+        f"{len(queries)} queries, {len(projection['projection'])} periods, "
+        f"R{expected + projection['arrears']['total']:,} outstanding",
+    )
+    assert len(queries) == 1
@@ -0,0 +1,124 @@
+import logging
+import time
+from collections.abc import Callable
+from collections.abc import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardCache:
+    """
+    Versioned per-user cache for DashboardService results.
+
+    Each user has a version counter that is bumped on every write touching their
+    data. Cached entries are stored together with the version they were computed
+    for, so a single get_many() of the version and the entry is enough to decide
+    whether the entry is still current. Bumping the counter invalidates all of a
+    user's entries at once.
+
+    Hits and misses are counted in the cache backend, so the counts cover every
+    worker process.
+    """
+
+    TIMEOUT = 60 * 15
+    KEY_PREFIX = "dashboard"
+
+    @classmethod
+    def version_key(cls, user_id: int) -> str:
+        return f"{cls.KEY_PREFIX}:{user_id}:version"
+
+    @classmethod
+    def entry_key(cls, user_id: int, name: str) -> str:
+        return f"{cls.KEY_PREFIX}:{user_id}:{name}"
+
+    @classmethod
+    def stats_key(cls, outcome: str) -> str:
+        return f"{cls.KEY_PREFIX}:stats:{outcome}"
+
+    @classmethod
+    def get_or_set(cls, user_id: int, name: str, compute: Callable):
+        """
+        Return the cached result for a user, computing and storing it on a miss.
+        """
+        version_key = cls.version_key(user_id)
+        entry_key = cls.entry_key(user_id, name)
+        cached = cache.get_many([version_key, entry_key])
+
+        version = cached.get(version_key)
+        entry = cached.get(entry_key)
+        if version is not None and entry is not None and entry[0] == version:
+            cls._count("hits")
+            return entry[1]
+
+        cls._count("misses")
+        if version is None:
+            version = cls._init_version(version_key)
+        # The version is read before computing, so a write that lands while the
+        # result is computed bumps the version and the stored entry is never served.
+        result = compute()
+        cache.set(entry_key, (version, result), cls.TIMEOUT)
+        return result
+
+    @classmethod
+    def invalidate(cls, user_id: int) -> None:
+        cls.invalidate_users([user_id])
+
+    @classmethod
+    def invalidate_users(cls, user_ids: Iterable[int]) -> None:
+        """
+        Bump the version of each user, now and again once the transaction commits.
+
+        The immediate bump makes reads inside the writing transaction miss; the
+        bump on commit discards anything a concurrent reader cached from the
+        pre-commit state in between.
+        """
+        keys = [cls.version_key(user_id) for user_id in set(user_ids)]
+        if not keys:
+            return
+        cls._bump(keys)
+        transaction.on_commit(lambda: cls._bump(keys))
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """
+        Return the hits and misses counted by every process and the hit ratio.
+        """
+        keys = {outcome: cls.stats_key(outcome) for outcome in ("hits", "misses")}
+        counts = cache.get_many(keys.values())
+        hits = counts.get(keys["hits"], 0)
+        misses = counts.get(keys["misses"], 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+    @classmethod
+    def _count(cls, outcome: str) -> None:
+        key = cls.stats_key(outcome)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The first count, or the counter was evicted: start it from zero.
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+
+    @classmethod
+    def _init_version(cls, version_key: str) -> int:
+        # Start from the clock rather than zero, so an evicted counter can never
+        # return to a version that stale entries are still tagged with.
+        cache.add(version_key, time.time_ns(), timeout=None)
+        return cache.get(version_key)
+
+    @staticmethod
+    def _bump(keys: list[str]) -> None:
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # No version yet: the next read starts a fresh one.
+                logger.debug("No dashboard cache version to bump for %s", key)
@@ -0,0 +1,27 @@
+from dashboard.rollups import ShopRollup
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the daily shop rollups used by the shop reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report shop days whose stored rollup differs from the data.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            rebuilt = ShopRollup.rebuild()
+            self.stdout.write(f"Rebuilt {rebuilt} shop daily rollups.")
+
+        mismatched = ShopRollup.get_mismatched()
+        if mismatched:
+            days = [f"{shop_name} on {day}" for shop_name, day in mismatched]
+            msg = f"{len(mismatched)} shop daily rollups are stale: {days}"
+            raise CommandError(msg)
+
+        self.stdout.write(self.style.SUCCESS("All shop daily rollups are correct."))
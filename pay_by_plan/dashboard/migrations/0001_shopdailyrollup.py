@@ -0,0 +1,35 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:20
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shop_name', models.CharField(max_length=100, verbose_name='Shop name')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('payments_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Payments total')),
+                ('payments_count', models.IntegerField(default=0, verbose_name='Payments count')),
+                ('new_laybys', models.IntegerField(default=0, verbose_name='New laybys')),
+                ('new_laybys_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='New laybys value')),
+                ('completed_laybys', models.IntegerField(default=0, verbose_name='Completed laybys')),
+                ('outstanding_change', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Cost of new laybys less the payments made on the day', max_digits=14, verbose_name='Outstanding change')),
+            ],
+            options={
+                'verbose_name': 'Shop daily rollup',
+                'verbose_name_plural': 'Shop daily rollups',
+                'ordering': ['shop_name', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('shop_name', 'date'), name='unique_shop_daily_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ShopDailyRollup(models.Model):
+    """
+    Pre-aggregated layby and payment activity of one shop on one day.
+
+    Rows only hold the changes that happened on their day, so they are kept up to
+    date with additive upserts from LaybyService and PaymentService. A shop's
+    outstanding balance on a day is the sum of its outstanding changes up to and
+    including that day.
+    """
+
+    METRICS = (
+        "payments_total",
+        "payments_count",
+        "new_laybys",
+        "new_laybys_value",
+        "completed_laybys",
+        "outstanding_change",
+    )
+
+    shop_name = models.CharField(
+        _("Shop name"),
+        max_length=100,
+    )
+    date = models.DateField(
+        _("Date"),
+    )
+    payments_total = models.DecimalField(
+        _("Payments total"),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+    )
+    payments_count = models.IntegerField(
+        _("Payments count"),
+        default=0,
+    )
+    new_laybys = models.IntegerField(
+        _("New laybys"),
+        default=0,
+    )
+    new_laybys_value = models.DecimalField(
+        _("New laybys value"),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+    )
+    completed_laybys = models.IntegerField(
+        _("Completed laybys"),
+        default=0,
+    )
+    outstanding_change = models.DecimalField(
+        _("Outstanding change"),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        help_text=_("Cost of new laybys less the payments made on the day"),
+    )
+
+    class Meta:
+        verbose_name = _("Shop daily rollup")
+        verbose_name_plural = _("Shop daily rollups")
+        ordering = ["shop_name", "date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shop_name", "date"],
+                name="unique_shop_daily_rollup",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.shop_name} on {self.date}"
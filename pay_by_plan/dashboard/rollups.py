@@ -0,0 +1,282 @@
+from collections import Counter
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import date
+from decimal import Decimal
+
+from dashboard.models import ShopDailyRollup
+from django.db import connection
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from laybys.models import Layby
+from payments.models import Payment
+
+ROLLUP_BATCH_SIZE = 1000
+
+# A change to the rollups: the shop, the day and the amount added to each metric.
+RollupRow = tuple[str, date, dict]
+
+
+class ShopRollup:
+    """
+    Incremental maintenance of the ShopDailyRollup table.
+
+    The write paths describe what they changed as rows of metric deltas, which
+    are merged per (shop, day) and added to the stored rows with one INSERT ...
+    ON CONFLICT DO UPDATE. Additions commute, so concurrent writers never lose
+    each other's changes. A layby is booked on the day it was created and, once
+    complete, counted as completed on the day of its last payment.
+    """
+
+    @staticmethod
+    def payment_rows(
+        shop_name: str,
+        paid_at,
+        amount: Decimal,
+        count: int = 0,
+    ) -> list[RollupRow]:
+        return [
+            (
+                shop_name,
+                timezone.localdate(paid_at),
+                {
+                    "payments_total": amount,
+                    "payments_count": count,
+                    "outstanding_change": -amount,
+                },
+            ),
+        ]
+
+    @staticmethod
+    def completion_rows(layby: Layby, sign: int = 1) -> list[RollupRow]:
+        if not layby.is_complete:
+            return []
+        completed_at = layby.last_payment_at or layby.created_at
+        return [
+            (
+                layby.shop_name,
+                timezone.localdate(completed_at),
+                {"completed_laybys": sign},
+            ),
+        ]
+
+    @staticmethod
+    def batch_rows(payments: list[Payment], completed: list[Layby]) -> list[RollupRow]:
+        """
+        Rows booking a batch of new payments and the laybys they completed.
+        """
+        rows = []
+        for payment in payments:
+            rows += ShopRollup.payment_rows(
+                payment.layby.shop_name,
+                payment.payment_date,
+                payment.amount,
+                count=1,
+            )
+        for layby in completed:
+            rows += ShopRollup.completion_rows(layby)
+        return rows
+
+    @staticmethod
+    def layby_rows(layby: Layby, sign: int = 1) -> list[RollupRow]:
+        """
+        Rows booking a layby itself, without its payments.
+        """
+        return [
+            (
+                layby.shop_name,
+                timezone.localdate(layby.created_at),
+                {
+                    "new_laybys": sign,
+                    "new_laybys_value": sign * layby.total_cost,
+                    "outstanding_change": sign * layby.total_cost,
+                },
+            ),
+            *ShopRollup.completion_rows(layby, sign),
+        ]
+
+    @staticmethod
+    def payment_history_rows(
+        layby: Layby,
+        shop_name: str,
+        sign: int = 1,
+    ) -> list[RollupRow]:
+        """
+        Rows booking every stored payment of a layby against a shop.
+        """
+        days = (
+            Payment.objects.filter(layby=layby)
+            .annotate(day=TruncDate("payment_date"))
+            .values("day")
+            .annotate(total=Sum("amount"), count=Count("pk"))
+            .order_by()
+        )
+        return [
+            (
+                shop_name,
+                day["day"],
+                {
+                    "payments_total": sign * day["total"],
+                    "payments_count": sign * day["count"],
+                    "outstanding_change": -sign * day["total"],
+                },
+            )
+            for day in days
+        ]
+
+    @staticmethod
+    def merge(rows: Iterable[RollupRow]) -> dict[tuple[str, date], Counter]:
+        """
+        Sum rows per (shop, day), dropping the days whose changes cancel out.
+        """
+        merged = defaultdict(Counter)
+        for shop_name, day, deltas in rows:
+            merged[shop_name, day].update(deltas)
+        return {key: deltas for key, deltas in merged.items() if any(deltas.values())}
+
+    @staticmethod
+    def record(rows: Iterable[RollupRow]) -> None:
+        """
+        Add rows of metric deltas to the stored rollups.
+
+        Rows are merged first, since one statement cannot update the same row
+        twice, and written in key order so that concurrent writers lock the rows
+        in the same order.
+        """
+        merged = sorted(ShopRollup.merge(rows).items())
+        if not merged:
+            return
+
+        table = connection.ops.quote_name(
+            ShopDailyRollup._meta.db_table,  # noqa: SLF001
+        )
+        columns = ("shop_name", "date", *ShopDailyRollup.METRICS)
+        additions = ", ".join(
+            f"{metric} = {table}.{metric} + EXCLUDED.{metric}"
+            for metric in ShopDailyRollup.METRICS
+        )
+        row_placeholder = f"({', '.join(['%s'] * len(columns))})"
+
+        with connection.cursor() as cursor:
+            for start in range(0, len(merged), ROLLUP_BATCH_SIZE):
+                batch = merged[start : start + ROLLUP_BATCH_SIZE]
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "  # noqa: S608
+                    f"VALUES {', '.join([row_placeholder] * len(batch))} "
+                    f"ON CONFLICT (shop_name, date) DO UPDATE SET {additions}",
+                    [
+                        value
+                        for (shop_name, day), deltas in batch
+                        for value in (
+                            shop_name,
+                            day,
+                            *(deltas[metric] for metric in ShopDailyRollup.METRICS),
+                        )
+                    ],
+                )
+
+    @staticmethod
+    def compute() -> dict[tuple[str, date], Counter]:
+        """
+        Aggregate the rollups from the laybys and payments in three queries.
+        """
+        payments = (
+            Payment.objects.annotate(
+                shop_name=F("layby__shop_name"),
+                day=TruncDate("payment_date"),
+            )
+            .values("shop_name", "day")
+            .annotate(total=Sum("amount"), count=Count("pk"))
+            .order_by()
+        )
+        created = (
+            Layby.objects.annotate(day=TruncDate("created_at"))
+            .values("shop_name", "day")
+            .annotate(count=Count("pk"), value=Sum("total_cost"))
+            .order_by()
+        )
+        completed = (
+            Layby.objects.filter(is_complete=True)
+            .annotate(day=TruncDate(Coalesce("last_payment_at", "created_at")))
+            .values("shop_name", "day")
+            .annotate(count=Count("pk"))
+            .order_by()
+        )
+
+        rows = [
+            (
+                row["shop_name"],
+                row["day"],
+                {
+                    "payments_total": row["total"],
+                    "payments_count": row["count"],
+                    "outstanding_change": -row["total"],
+                },
+            )
+            for row in payments
+        ]
+        rows += [
+            (
+                row["shop_name"],
+                row["day"],
+                {
+                    "new_laybys": row["count"],
+                    "new_laybys_value": row["value"],
+                    "outstanding_change": row["value"],
+                },
+            )
+            for row in created
+        ]
+        rows += [
+            (row["shop_name"], row["day"], {"completed_laybys": row["count"]})
+            for row in completed
+        ]
+        return ShopRollup.merge(rows)
+
+    @staticmethod
+    def rebuild() -> int:
+        """
+        Replace the stored rollups with ones aggregated from scratch.
+
+        Returns:
+            int: The number of rollup rows written
+        """
+        with transaction.atomic():
+            ShopDailyRollup.objects.all().delete()
+            rollups = ShopDailyRollup.objects.bulk_create(
+                (
+                    ShopDailyRollup(shop_name=shop_name, date=day, **deltas)
+                    for (shop_name, day), deltas in ShopRollup.compute().items()
+                ),
+                batch_size=ROLLUP_BATCH_SIZE,
+            )
+        return len(rollups)
+
+    @staticmethod
+    def get_mismatched() -> list[tuple[str, date]]:
+        """
+        Return the (shop, day) keys whose stored rollup differs from the data.
+        """
+        expected = ShopRollup.compute()
+        stored = {
+            (row.pop("shop_name"), row.pop("date")): row
+            for row in ShopDailyRollup.objects.values(
+                "shop_name",
+                "date",
+                *ShopDailyRollup.METRICS,
+            )
+        }
+        return sorted(
+            key
+            for key in expected.keys() | stored.keys()
+            if any(
+                expected.get(key, {}).get(metric, 0)
+                != stored.get(key, {}).get(metric, 0)
+                for metric in ShopDailyRollup.METRICS
+            )
+        )
@@ -1,127 +1,482 @@
+from collections import defaultdict
+from datetime import date
+from datetime import datetime
+from datetime import time
+from decimal import Decimal
+
+from dashboard.models import ShopDailyRollup
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import DateField
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Q
 from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Trunc
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
+from laybys.models import Installment
 from laybys.models import Layby
+from laybys.schedule import add_months
 from payments.models import Payment
 from reminders.models import Reminder
 
+RECENT_DAYS = 30
+UPCOMING_DAYS = 30
+DUE_THIS_WEEK_DAYS = 7
+
+GRANULARITY_WEEK = "week"
+GRANULARITY_MONTH = "month"
+GRANULARITIES = (GRANULARITY_WEEK, GRANULARITY_MONTH)
+STATISTICS_WINDOW_MONTHS = 12
+PROJECTION_WINDOW_MONTHS = 12
+SHOP_REPORT_DAYS = 30
+
 
 class DashboardService:
     @staticmethod
     def get_user_dashboard_overview(user):
-        today = timezone.now().date()
-        recent_date = today - timezone.timedelta(days=30)
-        upcoming_date = today + timezone.timedelta(days=30)
-
-        # Core Data
-        active_laybys = Layby.objects.filter(user=user, is_active=True)
-        total_remaining = sum(layby.remaining_balance() for layby in active_laybys)
+        """
+        Build the dashboard overview for a user.
 
-        # Payments Data
-        recent_payments = Payment.objects.filter(
-            layby__user=user,
-            payment_date__gte=recent_date,
-        ).order_by("-payment_date")[:10]
+        Every section comes from a fixed set of aggregate or joined queries, so the
+        number of queries does not grow with the number of laybys a user has.
+        """
+        today = timezone.now().date()
+        upcoming_date = today + timezone.timedelta(days=UPCOMING_DAYS)
+        week_date = today + timezone.timedelta(days=DUE_THIS_WEEK_DAYS)
 
-        total_paid_recently = (
-            recent_payments.aggregate(Sum("amount"))["amount__sum"] or 0
+        summary = DashboardService._get_summary(user, today, upcoming_date)
+        upcoming_payments = DashboardService._get_upcoming_payments(user, upcoming_date)
+        summary["total_arrears"] = sum(
+            (
+                payment["amount_due"]
+                for payment in upcoming_payments
+                if payment["due_date"] < today
+            ),
+            Decimal("0.00"),
         )
 
-        # Reminders Data
-        upcoming_reminders = Reminder.objects.filter(
-            layby__user=user,
-            is_active=True,
-            next_reminder_date__lte=upcoming_date,
-        ).order_by("next_reminder_date")
-
-        # Overdue Items
-        overdue_laybys = active_laybys.filter(expected_end_date__lt=today)
-
         return {
-            "summary": {
-                "active_laybys_count": active_laybys.count(),
-                "total_remaining_balance": total_remaining,
-                "total_paid_last_30_days": total_paid_recently,
-                "overdue_count": overdue_laybys.count(),
-                "upcoming_reminders_count": upcoming_reminders.count(),
-            },
+            "summary": summary,
             "upcoming_payments": {
-                "due_this_week": DashboardService._get_upcoming_payments(user, days=7),
-                "due_this_month": DashboardService._get_upcoming_payments(
-                    user,
-                    days=30,
-                ),
+                "due_this_week": [
+                    payment
+                    for payment in upcoming_payments
+                    if payment["due_date"] <= week_date
+                ],
+                "due_this_month": upcoming_payments,
             },
             "reminders": {
                 "upcoming": [
                     {
                         "id": reminder.id,
-                        "layby_id": reminder.layby.id,
+                        "layby_id": reminder.layby_id,
                         "shop_name": reminder.layby.shop_name,
                         "next_reminder_date": reminder.next_reminder_date,
                         "frequency": reminder.frequency,
-                        "remaining_balance": reminder.layby.remaining_balance(),
+                        "remaining_balance": reminder.layby.remaining_balance,
                     }
-                    for reminder in upcoming_reminders[:5]
+                    for reminder in Reminder.objects.filter(
+                        layby__user=user,
+                        is_active=True,
+                        next_reminder_date__lte=upcoming_date,
+                    )
+                    .select_related("layby")
+                    .order_by("next_reminder_date")[:5]
                 ],
             },
             "recent_activity": {
                 "laybys": DashboardService._get_recent_laybys(user),
                 "payments": DashboardService._get_recent_payments(user),
             },
-            "alerts": DashboardService._get_user_alerts(user),
+            "alerts": DashboardService._get_user_alerts(user, today, upcoming_payments),
+        }
+
+    @staticmethod
+    def get_user_statistics(
+        user,
+        months: int = STATISTICS_WINDOW_MONTHS,
+        granularity: str = GRANULARITY_MONTH,
+    ):
+        """
+        Build chart statistics for a user over the last `months` months.
+
+        Payment series are bucketed by `granularity` ("week" or "month") and always
+        by month for the monthly summary. Both come from a single grouped query, and
+        the layby status figures from one conditional aggregate, so the number of
+        queries does not depend on how many payments a user has.
+        """
+        today = timezone.now().date()
+        month_start = DashboardService._get_window_start(today, months)
+        start = month_start
+        if granularity == GRANULARITY_WEEK:
+            start -= timezone.timedelta(days=start.weekday())
+        periods, monthly = DashboardService._get_payment_series(
+            user,
+            start,
+            granularity,
+        )
+        distribution = DashboardService._get_layby_distribution(user, today)
+
+        return {
+            "window": {"start": start, "end": today, "granularity": granularity},
+            "payment_trends": DashboardService._get_payment_trends(
+                periods,
+                DashboardService._iter_periods(start, today, granularity),
+            ),
+            "layby_status_distribution": distribution,
+            "monthly_payment_summary": DashboardService._get_monthly_summary(
+                monthly,
+                DashboardService._iter_periods(month_start, today, GRANULARITY_MONTH),
+            ),
+            "completion_rate": DashboardService._get_completion_rate(distribution),
         }
 
     @staticmethod
-    def get_user_statistics(user):
+    def get_inflow_projection(
+        months: int = PROJECTION_WINDOW_MONTHS,
+        granularity: str = GRANULARITY_WEEK,
+    ):
+        """
+        Project the payments expected across all open laybys over the next months.
+
+        The projection is the unpaid balance of every installment of an active,
+        incomplete layby, summed per period by the database in one grouped query
+        over the precomputed schedules. Installments already past due are grouped
+        into a period of their own and reported as arrears.
+        """
+        today = timezone.now().date()
+        end = add_months(today, months)
+        if granularity == GRANULARITY_WEEK:
+            start = today - timezone.timedelta(days=today.weekday())
+        else:
+            start = today.replace(day=1)
+
+        rows = (
+            Installment.objects.filter(
+                layby__is_active=True,
+                layby__is_complete=False,
+                balance__gt=0,
+                due_date__lt=end,
+            )
+            .annotate(
+                period=Trunc(
+                    Case(
+                        When(due_date__lt=today, then=Value(None)),
+                        default=F("due_date"),
+                        output_field=DateField(),
+                    ),
+                    granularity,
+                    output_field=DateField(),
+                ),
+            )
+            .values("period")
+            .annotate(total=Sum("balance"), count=Count("pk"))
+            .order_by()
+        )
+
+        periods = defaultdict(lambda: {"total": Decimal("0.00"), "count": 0})
+        for row in rows:
+            periods[row["period"]] = {"total": row["total"], "count": row["count"]}
+        arrears = periods.pop(None, {"total": Decimal("0.00"), "count": 0})
+
         return {
-            "payment_trends": DashboardService._get_payment_trends(user),
-            "layby_status_distribution": DashboardService._get_layby_distribution(user),
-            "monthly_payment_summary": DashboardService._get_monthly_summary(user),
-            "completion_rate": DashboardService._get_completion_rate(user),
+            "window": {"start": today, "end": end, "granularity": granularity},
+            "arrears": arrears,
+            "projection": [
+                {"period": period, **periods[period]}
+                for period in DashboardService._iter_periods(
+                    start,
+                    end - timezone.timedelta(days=1),
+                    granularity,
+                )
+            ],
+        }
+
+    @staticmethod
+    def get_shop_report(start: date, end: date):
+        """
+        Report the activity of every shop between start and end, for staff.
+
+        Read from the daily shop rollups in one grouped query: the activity is
+        summed over the days in the window and the outstanding balance over every
+        day up to its end.
+        """
+        in_window = Q(date__gte=start)
+        zero = Value(Decimal("0.00"))
+        shops = (
+            ShopDailyRollup.objects.filter(date__lte=end)
+            .values("shop_name")
+            .annotate(
+                payments_total=Coalesce(Sum("payments_total", filter=in_window), zero),
+                payments_count=Coalesce(Sum("payments_count", filter=in_window), 0),
+                new_laybys=Coalesce(Sum("new_laybys", filter=in_window), 0),
+                new_laybys_value=Coalesce(
+                    Sum("new_laybys_value", filter=in_window),
+                    zero,
+                ),
+                completed_laybys=Coalesce(
+                    Sum("completed_laybys", filter=in_window),
+                    0,
+                ),
+                outstanding_balance=Sum("outstanding_change"),
+            )
+            .order_by("shop_name")
+        )
+        return {"window": {"start": start, "end": end}, "shops": list(shops)}
+
+    @staticmethod
+    def get_shop_daily_report(shop_name: str, start: date, end: date):
+        """
+        Report the activity and outstanding balance of one shop for every day.
+
+        Takes two queries on the shop's rollups: the outstanding balance before
+        the window and the rollups inside it. Days without activity are filled in.
+        """
+        rollups = ShopDailyRollup.objects.filter(shop_name=shop_name)
+        outstanding = rollups.filter(date__lt=start).aggregate(
+            total=Coalesce(Sum("outstanding_change"), Value(Decimal("0.00"))),
+        )["total"]
+        days = {
+            row.pop("date"): row
+            for row in rollups.filter(date__range=(start, end)).values(
+                "date",
+                *ShopDailyRollup.METRICS,
+            )
+        }
+        empty = {
+            "payments_total": Decimal("0.00"),
+            "payments_count": 0,
+            "new_laybys": 0,
+            "new_laybys_value": Decimal("0.00"),
+            "completed_laybys": 0,
+            "outstanding_change": Decimal("0.00"),
         }
 
+        report = {
+            "shop_name": shop_name,
+            "window": {"start": start, "end": end},
+            "opening_balance": outstanding,
+            "days": [],
+        }
+        day = start
+        while day <= end:
+            activity = days.get(day, empty).copy()
+            outstanding += activity.pop("outstanding_change")
+            report["days"].append(
+                {"date": day, **activity, "outstanding_balance": outstanding},
+            )
+            day += timezone.timedelta(days=1)
+        return report
+
     @staticmethod
-    def _get_upcoming_payments(user, days):
-        end_date = timezone.now().date() + timezone.timedelta(days=days)
+    def _get_payment_series(user, start, granularity):
+        """
+        Total payments per period and per month from one grouped query.
+
+        Rows are grouped by (period, month) so that weeks spanning two months can be
+        summed into either series without a second query.
+        """
+        start_at = timezone.make_aware(datetime.combine(start, time.min))
+        rows = (
+            Payment.objects.filter(layby__user=user, payment_date__gte=start_at)
+            .annotate(
+                period=Trunc("payment_date", granularity, output_field=DateField()),
+                month=TruncMonth("payment_date", output_field=DateField()),
+            )
+            .values("period", "month")
+            .annotate(total=Sum("amount"), count=Count("pk"))
+            .order_by()
+        )
+
+        periods = defaultdict(lambda: {"total": Decimal("0.00"), "count": 0})
+        monthly = defaultdict(lambda: {"total": Decimal("0.00"), "count": 0})
+        for row in rows:
+            for series, key in ((periods, row["period"]), (monthly, row["month"])):
+                series[key]["total"] += row["total"]
+                series[key]["count"] += row["count"]
+        return periods, monthly
+
+    @staticmethod
+    def _get_payment_trends(periods, period_starts):
+        return [{"period": period, **periods[period]} for period in period_starts]
+
+    @staticmethod
+    def _get_monthly_summary(monthly, month_starts):
+        summary = []
+        for month in month_starts:
+            totals = monthly[month]
+            average = Decimal("0.00")
+            if totals["count"]:
+                average = (totals["total"] / totals["count"]).quantize(average)
+            summary.append({"month": month, **totals, "average_payment": average})
+        return summary
+
+    @staticmethod
+    def _get_layby_distribution(user, today):
+        open_laybys = Q(is_active=True, is_complete=False)
+        return Layby.objects.filter(user=user).aggregate(
+            total=Count("pk"),
+            active=Count("pk", filter=open_laybys),
+            completed=Count("pk", filter=Q(is_complete=True)),
+            inactive=Count("pk", filter=Q(is_active=False, is_complete=False)),
+            overdue=Count("pk", filter=open_laybys & Q(expected_end_date__lt=today)),
+        )
+
+    @staticmethod
+    def _get_completion_rate(distribution):
+        if not distribution["total"]:
+            return 0.0
+        return round(distribution["completed"] * 100 / distribution["total"], 2)
+
+    @staticmethod
+    def _get_window_start(today, months):
+        """
+        Return the first day of the month `months - 1` months before today.
+        """
+        month_index = today.year * 12 + today.month - 1 - (months - 1)
+        return date(month_index // 12, month_index % 12 + 1, 1)
+
+    @staticmethod
+    def _iter_periods(start, end, granularity):
+        """
+        Yield the first day of every period from start up to and including end.
+        """
+        period = start
+        while period <= end:
+            yield period
+            if granularity == GRANULARITY_WEEK:
+                period += timezone.timedelta(weeks=1)
+            else:
+                period = (period.replace(day=28) + timezone.timedelta(days=4)).replace(
+                    day=1,
+                )
+
+    @staticmethod
+    def _get_summary(user, today, upcoming_date):
+        active = Q(is_active=True)
+        summary = Layby.objects.filter(user=user).aggregate(
+            active_laybys_count=Count("pk", filter=active),
+            total_remaining_balance=Coalesce(
+                Sum("remaining_balance", filter=active),
+                Value(Decimal("0.00")),
+            ),
+            overdue_count=Count("pk", filter=active & Q(expected_end_date__lt=today)),
+            # Reminder is one-to-one with Layby, so the join cannot inflate the sums.
+            upcoming_reminders_count=Count(
+                "reminder",
+                filter=Q(
+                    reminder__is_active=True,
+                    reminder__next_reminder_date__lte=upcoming_date,
+                ),
+            ),
+        )
+        summary["total_paid_last_30_days"] = Payment.objects.filter(
+            layby__user=user,
+            payment_date__gte=today - timezone.timedelta(days=RECENT_DAYS),
+        ).aggregate(total=Coalesce(Sum("amount"), Value(Decimal("0.00"))))["total"]
+        return summary
+
+    @staticmethod
+    def _get_upcoming_payments(user, end_date):
+        """
+        List the unpaid installments of active laybys due on or before end_date,
+        including overdue ones.
+        """
+        installments = (
+            Installment.objects.filter(
+                layby__user=user,
+                layby__is_active=True,
+                balance__gt=0,
+                due_date__lte=end_date,
+            )
+            .select_related("layby")
+            .annotate(
+                has_reminder=Exists(
+                    Reminder.objects.filter(layby=OuterRef("layby_id")),
+                ),
+            )
+            .order_by("due_date", "layby_id")
+        )
         return [
             {
-                "layby_id": layby.id,
-                "shop_name": layby.shop_name,
-                "amount_due": layby.remaining_balance(),
-                "due_date": layby.expected_end_date,
-                "progress_percentage": layby.payment_progress(),
-                "has_reminder": hasattr(layby, "reminder"),
+                "layby_id": installment.layby_id,
+                "shop_name": installment.layby.shop_name,
+                "amount_due": installment.balance,
+                "due_date": installment.due_date,
+                "remaining_balance": installment.layby.remaining_balance,
+                "progress_percentage": installment.layby.payment_progress(),
+                "has_reminder": installment.has_reminder,
             }
-            for layby in Layby.objects.filter(
-                user=user,
-                is_active=True,
-                expected_end_date__lte=end_date,
-            )
+            for installment in installments
         ]
 
     @staticmethod
-    def _get_user_alerts(user):
-        today = timezone.now().date()
-        return {
-            "overdue_payments": [
+    def _get_recent_laybys(user, limit=5):
+        return list(
+            Layby.objects.filter(user=user)
+            .order_by("-created_at")
+            .values(
+                "id",
+                "shop_name",
+                "total_cost",
+                "remaining_balance",
+                "is_complete",
+                "created_at",
+            )[:limit],
+        )
+
+    @staticmethod
+    def _get_recent_payments(user, limit=10):
+        return [
+            {
+                "id": payment["id"],
+                "layby_id": payment["layby_id"],
+                "shop_name": payment["layby__shop_name"],
+                "amount": payment["amount"],
+                "payment_date": payment["payment_date"],
+            }
+            for payment in Payment.objects.filter(layby__user=user)
+            .order_by("-payment_date")
+            .values("id", "layby_id", "layby__shop_name", "amount", "payment_date")[
+                :limit
+            ]
+        ]
+
+    @staticmethod
+    def _get_user_alerts(user, today, upcoming_payments):
+        """
+        Alert on laybys in arrears, counted from their oldest unpaid installment.
+        """
+        overdue = {}
+        for payment in upcoming_payments:
+            if payment["due_date"] >= today:
+                continue
+            alert = overdue.setdefault(
+                payment["layby_id"],
                 {
-                    "layby_id": layby.id,
-                    "shop_name": layby.shop_name,
-                    "days_overdue": (today - layby.expected_end_date).days,
-                    "remaining_balance": layby.remaining_balance(),
-                }
-                for layby in Layby.objects.filter(
-                    user=user,
-                    is_active=True,
-                    expected_end_date__lt=today,
-                )
-            ],
+                    "layby_id": payment["layby_id"],
+                    "shop_name": payment["shop_name"],
+                    "days_overdue": (today - payment["due_date"]).days,
+                    "remaining_balance": payment["remaining_balance"],
+                    "arrears": Decimal("0.00"),
+                },
+            )
+            alert["arrears"] += payment["amount_due"]
+
+        return {
+            "overdue_payments": list(overdue.values()),
             "inactive_reminders": [
-                {"layby_id": reminder.layby.id, "shop_name": reminder.layby.shop_name}
+                {"layby_id": reminder["layby_id"], "shop_name": reminder["shop_name"]}
                 for reminder in Reminder.objects.filter(
                     layby__user=user,
                     is_active=False,
                     layby__is_active=True,
-                )
+                ).values("layby_id", shop_name=F("layby__shop_name"))
             ],
         }
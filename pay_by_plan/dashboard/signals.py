@@ -0,0 +1,51 @@
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from laybys.models import Layby
+from payments.models import Payment
+from reminders.models import Notification
+from reminders.models import Reminder
+
+from .cache import DashboardCache
+
+
+def _get_layby_user_id(layby_id: int) -> int | None:
+    return Layby.objects.filter(pk=layby_id).values_list("user_id", flat=True).first()
+
+
+def get_user_id(instance) -> int | None:
+    """
+    Resolve the owning user of a dashboard-related object.
+
+    Related objects already loaded on the instance are used when available, so the
+    common service paths do not pay for an extra query.
+    """
+    if isinstance(instance, Notification):
+        if not Notification.reminder.is_cached(instance):
+            return (
+                Reminder.objects.filter(pk=instance.reminder_id)
+                .values_list("layby__user_id", flat=True)
+                .first()
+            )
+        instance = instance.reminder
+    if isinstance(instance, Payment | Reminder):
+        if not type(instance).layby.is_cached(instance):
+            return _get_layby_user_id(instance.layby_id)
+        instance = instance.layby
+    return instance.user_id
+
+
+# Payment and Notification deletes are deliberately not hooked up: a post_delete
+# receiver stops Django from fast-deleting them when a layby or reminder is
+# deleted. PaymentService.delete_payment invalidates explicitly instead, as do the
+# bulk write paths, which send no signals at all.
+@receiver(post_save, sender=Layby)
+@receiver(post_delete, sender=Layby)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Reminder)
+@receiver(post_delete, sender=Reminder)
+@receiver(post_save, sender=Notification)
+def invalidate_dashboard_cache(sender, instance, **kwargs):
+    user_id = get_user_id(instance)
+    if user_id is not None:
+        DashboardCache.invalidate(user_id)
@@ -1,3 +1,415 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from dashboard.cache import DashboardCache
+from dashboard.models import ShopDailyRollup
+from dashboard.rollups import ShopRollup
+from dashboard.services import DashboardService
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.utils import timezone
+from laybys.models import Layby
+from laybys.services import LaybyService
+from payments.models import Payment
+from payments.services import PaymentService
+from reminders.models import Reminder
+from rest_framework import status
+
+from pay_by_plan.users.tests.factories import UserFactory
+
+
+def create_laybys(user, count):
+    today = timezone.now().date()
+    laybys = Layby.objects.bulk_create(
+        Layby(
+            user=user,
+            shop_name=f"Shop {i}",
+            item_description="Item",
+            total_cost=Decimal("100.00"),
+            amount_paid=Decimal("40.00"),
+            payment_count=1,
+            expected_end_date=today + timedelta(days=i % 60 - 10),
+        )
+        for i in range(count)
+    )
+    Reminder.objects.bulk_create(
+        Reminder(
+            layby=layby,
+            frequency="weekly",
+            next_reminder_date=today + timedelta(days=i % 40),
+            is_active=i % 3 != 0,
+        )
+        for i, layby in enumerate(laybys)
+    )
+    Payment.objects.bulk_create(
+        Payment(layby=layby, amount=Decimal("40.00")) for layby in laybys
+    )
+    LaybyService.schedule_installments(laybys)
+    return laybys
+
+
+class TestDashboardOverview:
+    @pytest.mark.parametrize("layby_count", [1, 500])
+    def test_query_count_is_constant(
+        self,
+        user,
+        layby_count,
+        django_assert_num_queries,
+    ):
+        create_laybys(user, layby_count)
+
+        with django_assert_num_queries(7):
+            overview = DashboardService.get_user_dashboard_overview(user)
+
+        assert overview["summary"]["active_laybys_count"] == layby_count
+        assert overview["summary"]["total_remaining_balance"] == layby_count * 60
+
+    def test_overview_sections(self, user):
+        create_laybys(user, 20)
+
+        overview = DashboardService.get_user_dashboard_overview(user)
+
+        today = timezone.now().date()
+        week = overview["upcoming_payments"]["due_this_week"]
+        month = overview["upcoming_payments"]["due_this_month"]
+        assert all(payment["due_date"] <= today + timedelta(days=7) for payment in week)
+        assert {payment["layby_id"] for payment in week} <= {
+            payment["layby_id"] for payment in month
+        }
+        assert month[0]["progress_percentage"] == 40  # noqa: PLR2004
+        assert month[0]["has_reminder"]
+        overdue = overview["alerts"]["overdue_payments"]
+        assert len(overdue) == overview["summary"]["overdue_count"] == 10  # noqa: PLR2004
+        assert overview["summary"]["total_arrears"] == Decimal("600.00")
+        assert len(overview["reminders"]["upcoming"]) == 5  # noqa: PLR2004
+        assert overview["summary"]["total_paid_last_30_days"] == Decimal("800.00")
+        assert len(overview["recent_activity"]["payments"]) == 10  # noqa: PLR2004
+
+    def test_overview_endpoint(self, api_client, layby):
+        response = api_client.get(reverse("api:dashboard:dashboard-overview"))
+
+        assert response.status_code == 200  # noqa: PLR2004
+        assert response.data["summary"]["active_laybys_count"] == 1
+
+
+def backdate_payments(payments, days_ago):
+    now = timezone.now()
+    for payment, days in zip(payments, days_ago, strict=True):
+        payment.payment_date = now - timedelta(days=days)
+    Payment.objects.bulk_update(payments, ["payment_date"])
+
+
+class TestDashboardStatistics:
+    def test_statistics_use_fixed_query_budget(
+        self,
+        user,
+        django_assert_num_queries,
+    ):
+        laybys = create_laybys(user, 50)
+        payments = Payment.objects.bulk_create(
+            Payment(layby=laybys[i % 50], amount=Decimal("10.00")) for i in range(1000)
+        )
+        backdate_payments(payments, [i % 300 for i in range(1000)])
+
+        with django_assert_num_queries(2):
+            stats = DashboardService.get_user_statistics(user, granularity="week")
+
+        expected = 1050
+        assert sum(period["count"] for period in stats["payment_trends"]) == expected
+        assert (
+            sum(month["count"] for month in stats["monthly_payment_summary"])
+            == expected
+        )
+
+    def test_series_cover_window_with_empty_periods(self, user, layby):
+        payments = [
+            PaymentService.create_payment(layby, Decimal("100.00")),
+            PaymentService.create_payment(layby, Decimal("50.00")),
+        ]
+        backdate_payments(payments, [0, 0])
+
+        stats = DashboardService.get_user_statistics(user, months=3)
+
+        months = stats["monthly_payment_summary"]
+        assert len(months) == len(stats["payment_trends"]) == 3  # noqa: PLR2004
+        assert months[-1]["total"] == Decimal("150.00")
+        assert months[-1]["average_payment"] == Decimal("75.00")
+        assert months[0]["count"] == 0
+        assert stats["layby_status_distribution"]["active"] == 1
+        assert stats["completion_rate"] == 0.0
+
+    def test_completion_rate(self, user, layby):
+        PaymentService.create_payment(layby, layby.total_cost)
+        create_laybys(user, 3)
+
+        stats = DashboardService.get_user_statistics(user)
+
+        assert stats["layby_status_distribution"]["completed"] == 1
+        assert stats["completion_rate"] == 25.0  # noqa: PLR2004
+
+    def test_statistics_endpoint_validates_params(self, api_client, layby):
+        url = reverse("api:dashboard:dashboard-statistics")
+
+        response = api_client.get(url, {"granularity": "week", "months": 2})
+        assert response.status_code == 200  # noqa: PLR2004
+        assert response.data["window"]["granularity"] == "week"
+
+        response = api_client.get(url, {"granularity": "year"})
+        assert response.status_code == 400  # noqa: PLR2004
+
+
+class TestInflowProjection:
+    def test_projection_covers_every_open_layby_in_one_query(
+        self,
+        user,
+        django_assert_num_queries,
+    ):
+        laybys = create_laybys(user, 20) + create_laybys(UserFactory(), 20)
+        Layby.objects.filter(pk__in=[laybys[15].pk, laybys[35].pk]).update(
+            is_active=False,
+        )
+
+        with django_assert_num_queries(1):
+            projection = DashboardService.get_inflow_projection()
+
+        assert projection["arrears"] == {"total": Decimal("1200.00"), "count": 20}
+        periods = projection["projection"]
+        assert len(periods) in {53, 54}
+        assert sum(period["total"] for period in periods) == Decimal("1080.00")
+        assert periods[0]["period"] <= timezone.now().date() < periods[1]["period"]
+
+    def test_projection_endpoint_is_for_staff_only(self, user, api_client):
+        url = reverse("api:dashboard:dashboard-projection")
+
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        response = api_client.get(url, {"granularity": "month", "months": 3})
+        assert response.status_code == status.HTTP_200_OK
+        # The current month and the partial month three months ahead.
+        assert len(response.data["projection"]) == 4  # noqa: PLR2004
+
+
+def create_shop_layby(user, shop_name, total_cost):
+    return LaybyService.create_layby(
+        user=user,
+        shop_name=shop_name,
+        item_description="Item",
+        total_cost=Decimal(total_cost),
+        payment_frequency=Layby.FREQUENCY_MONTHLY,
+        expected_end_date=timezone.now().date() + timedelta(days=90),
+    )
+
+
+class TestShopRollups:
+    def test_incremental_updates_match_a_rebuild(self, user):
+        fridge = create_shop_layby(user, "Game", "1000.00")
+        stove = create_shop_layby(user, "Game", "300.00")
+        bed = create_shop_layby(user, "Makro", "500.00")
+        removed = create_shop_layby(user, "Makro", "200.00")
+
+        payment = PaymentService.create_payment(fridge, Decimal("100.00"))
+        PaymentService.update_payment(payment, Decimal("150.00"))
+        PaymentService.create_payment(stove, Decimal("300.00"))
+        PaymentService.bulk_create_payments(
+            [
+                {"layby_id": fridge.pk, "amount": "50.00"},
+                {"layby_id": bed.pk, "amount": "500.00"},
+            ],
+        )
+        PaymentService.create_payment(removed, Decimal("20.00"))
+        PaymentService.delete_payment(
+            PaymentService.create_payment(fridge, Decimal("10.00")),
+        )
+        fridge.refresh_from_db()
+        LaybyService.update_layby(fridge, shop_name="Hifi Corp", total_cost="900.00")
+        LaybyService.delete_layby(removed)
+
+        assert ShopRollup.get_mismatched() == []
+        rollups = {rollup.shop_name: rollup for rollup in ShopDailyRollup.objects.all()}
+        assert rollups["Game"].new_laybys == 1
+        assert rollups["Game"].completed_laybys == 1
+        assert rollups["Game"].outstanding_change == Decimal("0.00")
+        assert rollups["Makro"].payments_total == Decimal("500.00")
+        assert rollups["Hifi Corp"].payments_count == 2  # noqa: PLR2004
+        assert rollups["Hifi Corp"].outstanding_change == Decimal("700.00")
+
+    def test_command_rebuilds_stale_rollups(self, user):
+        layby = create_shop_layby(user, "Game", "1000.00")
+        PaymentService.create_payment(layby, Decimal("100.00"))
+        ShopDailyRollup.objects.update(payments_total=Decimal("0.00"))
+
+        with pytest.raises(CommandError, match="1 shop daily rollups are stale"):
+            call_command("rebuild_shop_rollups", "--verify")
+
+        call_command("rebuild_shop_rollups")
+
+        assert ShopDailyRollup.objects.get().payments_total == Decimal("100.00")
+
+    @pytest.mark.django_db
+    def test_reports_read_the_rollups(self, django_assert_num_queries):
+        today = timezone.now().date()
+        ShopDailyRollup.objects.bulk_create(
+            [
+                ShopDailyRollup(
+                    shop_name="Game",
+                    date=today - timedelta(days=40),
+                    new_laybys=2,
+                    new_laybys_value=Decimal("2000.00"),
+                    outstanding_change=Decimal("2000.00"),
+                ),
+                ShopDailyRollup(
+                    shop_name="Game",
+                    date=today - timedelta(days=2),
+                    payments_total=Decimal("300.00"),
+                    payments_count=3,
+                    outstanding_change=Decimal("-300.00"),
+                ),
+                ShopDailyRollup(
+                    shop_name="Makro",
+                    date=today,
+                    completed_laybys=1,
+                ),
+            ],
+        )
+        start = today - timedelta(days=6)
+
+        with django_assert_num_queries(1):
+            report = DashboardService.get_shop_report(start, today)
+        with django_assert_num_queries(2):
+            daily = DashboardService.get_shop_daily_report("Game", start, today)
+
+        game, makro = report["shops"]
+        assert game["payments_total"] == Decimal("300.00")
+        assert game["new_laybys"] == 0
+        assert game["outstanding_balance"] == Decimal("1700.00")
+        assert makro["completed_laybys"] == 1
+        assert daily["opening_balance"] == Decimal("2000.00")
+        assert len(daily["days"]) == 7  # noqa: PLR2004
+        assert daily["days"][4]["outstanding_balance"] == Decimal("1700.00")
+        assert daily["days"][-1]["payments_count"] == 0
+
+    def test_report_endpoints_are_for_staff_only(self, user, api_client):
+        url = reverse("api:dashboard:dashboard-shops")
+
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        create_shop_layby(user, "Game", "1000.00")
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["shops"][0]["new_laybys"] == 1
+
+        response = api_client.get(
+            reverse("api:dashboard:dashboard-shop-report"),
+            {"shop_name": "Game", "start": "2026-01-31", "end": "2026-01-01"},
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestDashboardCache:
+    @pytest.fixture(autouse=True)
+    def _clear_cache(self):
+        cache.clear()
+
+    def test_second_read_is_a_hit(self, user):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"value": len(calls)}
+
+        first = DashboardCache.get_or_set(user.pk, "overview", compute)
+        second = DashboardCache.get_or_set(user.pk, "overview", compute)
+
+        assert first == second == {"value": 1}
+        assert len(calls) == 1
+        assert DashboardCache.get_stats() == {
+            "hits": 1,
+            "misses": 1,
+            "hit_ratio": 0.5,
+        }
+
+    def test_write_invalidates_user_entries(self, user, layby):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return DashboardService.get_user_dashboard_overview(user)
+
+        before = DashboardCache.get_or_set(user.pk, "overview", compute)
+        PaymentService.create_payment(layby, Decimal("100.00"))
+        after = DashboardCache.get_or_set(user.pk, "overview", compute)
+
+        assert before["summary"]["total_remaining_balance"] == Decimal("1000.00")
+        assert after["summary"]["total_remaining_balance"] == Decimal("900.00")
+        assert len(calls) == 2  # noqa: PLR2004
+        assert DashboardCache.get_stats()["hits"] == 0
+
+    def test_bulk_and_delete_paths_invalidate(self, user, layby):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {}
+
+        payment = PaymentService.create_payment(layby, Decimal("100.00"))
+        DashboardCache.get_or_set(user.pk, "overview", compute)
+
+        PaymentService.bulk_create_payments(
+            [{"layby_id": layby.pk, "amount": "1.00"}],
+        )
+        DashboardCache.get_or_set(user.pk, "overview", compute)
+        PaymentService.delete_payment(payment)
+        DashboardCache.get_or_set(user.pk, "overview", compute)
+
+        assert len(calls) == 3  # noqa: PLR2004
+        assert DashboardCache.get_stats() == {
+            "hits": 0,
+            "misses": 3,
+            "hit_ratio": 0.0,
+        }
+
+    def test_counters_survive_a_lost_counter(self, user):
+        DashboardCache.get_or_set(user.pk, "overview", dict)
+        cache.delete(DashboardCache.stats_key("misses"))
+
+        DashboardCache.get_or_set(user.pk, "statistics", dict)
+
+        assert DashboardCache.get_stats()["misses"] == 1
+
+    def test_cache_stats_endpoint_is_for_staff(self, user, api_client):
+        overview_url = reverse("api:dashboard:dashboard-overview")
+        stats_url = reverse("api:dashboard:dashboard-cache-stats")
+        api_client.get(overview_url)
+        api_client.get(overview_url)
+
+        assert api_client.get(stats_url).status_code == status.HTTP_403_FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        response = api_client.get(stats_url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+    def test_cached_overview_endpoint_skips_dashboard_queries(
+        self,
+        api_client,
+        layby,
+        django_assert_num_queries,
+    ):
+        url = reverse("api:dashboard:dashboard-overview")
+        api_client.get(url)
+
+        # Only the ATOMIC_REQUESTS savepoint and its release.
+        with django_assert_num_queries(2):
+            response = api_client.get(url)
+
+        assert response.data["summary"]["active_laybys_count"] == 1
@@ -1,11 +1,14 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from laybys.services import LaybyService
 from payments.models import Payment
-from django.contrib import admin
-from allauth.account.decorators import secure_admin_login
 
-admin.autodiscover()
+from pay_by_plan.utils.admin import CachedAllValuesFieldListFilter
+from pay_by_plan.utils.admin import LargeTableAdminMixin
+
+from .models import Installment
 from .models import Layby
+from .models import OutboxEmail
 
 
 class PaymentInline(admin.TabularInline):
@@ -15,8 +18,19 @@ class PaymentInline(admin.TabularInline):
     can_delete = False
 
 
+class InstallmentInline(admin.TabularInline):
+    model = Installment
+    extra = 0
+    fields = ("due_date", "amount", "cumulative_amount", "amount_paid", "balance")
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Layby)
-class LaybyAdmin(admin.ModelAdmin):
+class LaybyAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         "user",
         "shop_name",
@@ -27,13 +41,19 @@ class LaybyAdmin(admin.ModelAdmin):
         "is_complete",
         "expected_end_date",
     )
-    list_filter = ("is_active", "is_complete", "shop_name", "expected_end_date")
-    search_fields = ("shop_name", "user__username", "user__email")
+    list_filter = (
+        "is_active",
+        "is_complete",
+        ("shop_name", CachedAllValuesFieldListFilter),
+        "expected_end_date",
+    )
+    search_fields = ("shop_name", "user__name", "user__email")
+    list_select_related = ("user",)
     readonly_fields = ("remaining_balance_display",)
-    inlines = [PaymentInline]
+    inlines = [InstallmentInline, PaymentInline]
 
     def remaining_balance_display(self, obj):
-        remaining = obj.remaining_balance()
+        remaining = obj.remaining_balance
         return format_html(f"<b>R{remaining:.2f}</b>")
 
     remaining_balance_display.short_description = "Remaining Balance"
@@ -48,3 +68,30 @@ class LaybyAdmin(admin.ModelAdmin):
         return description
 
     item_description_truncated.short_description = "Item Description"
+
+    def save_model(self, request, obj, form, change):
+        # Saves go through LaybyService so the installment schedule, the shop
+        # rollups and the outbox stay in step with admin edits.
+        if change:
+            LaybyService.update_layby(
+                Layby.objects.get(pk=obj.pk),
+                **{field: form.cleaned_data[field] for field in form.changed_data},
+            )
+            return
+        LaybyService.record_layby(obj)
+
+    def delete_model(self, request, obj):
+        LaybyService.delete_layby(obj)
+
+    def delete_queryset(self, request, queryset):
+        for layby in queryset:
+            LaybyService.delete_layby(layby)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("layby", "kind", "created_at", "sent_at", "attempts")
+    list_filter = ("kind", "sent_at")
+    search_fields = ("layby__shop_name", "layby__user__email")
+    list_select_related = ("layby",)
+    readonly_fields = ("created_at", "sent_at", "attempts")
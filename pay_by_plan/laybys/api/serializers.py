@@ -11,6 +11,14 @@ class LaybySerializer(serializers.ModelSerializer):
         exclude = ("user",)
 
 
+class LaybySummarySerializer(serializers.ModelSerializer):
+    """Compact layby serializer for embedding in other resources' lists."""
+
+    class Meta:
+        model = Layby
+        fields = ("id", "shop_name")
+
+
 class LaybyCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating laybys."""
 
@@ -35,7 +43,10 @@ class LaybyDetailSerializer(serializers.ModelSerializer):
         decimal_places=2,
         read_only=True,
     )
-    progress_percentage = serializers.IntegerField(read_only=True)
+    progress_percentage = serializers.IntegerField(
+        source="payment_progress",
+        read_only=True,
+    )
 
     class Meta:
         model = Layby
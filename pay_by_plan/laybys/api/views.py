@@ -1,9 +1,11 @@
 from django.db.models import QuerySet
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 from laybys.filters import LaybyFilter
 from laybys.models import Layby
+from laybys.services import EXPORT_COLUMNS
 from laybys.services import LaybyService
 from rest_framework import filters
 from rest_framework import permissions
@@ -13,6 +15,10 @@ from rest_framework.decorators import action
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from pay_by_plan.utils.export import ExportQuerySerializer
+from pay_by_plan.utils.export import stream_export
+from pay_by_plan.utils.pagination import LaybyCursorPagination
+
 from .serializers import LaybyCreateSerializer
 from .serializers import LaybyDetailSerializer
 from .serializers import LaybySerializer
@@ -29,6 +35,9 @@ class LaybyViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = LaybyFilter
+    pagination_class = LaybyCursorPagination
+    # Default for OrderingFilter, which cursor pagination takes its ordering from.
+    ordering = LaybyCursorPagination.ordering
 
     def get_queryset(self) -> QuerySet[Layby]:
         """Get laybys for the current user with optional filters."""
@@ -46,14 +55,14 @@ class LaybyViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         """Create a new layby."""
-        return LaybyService.create_layby(
+        serializer.instance = LaybyService.create_layby(
             user=self.request.user,
             **serializer.validated_data,
         )
 
     def perform_update(self, serializer):
         """Update an existing layby."""
-        return LaybyService.update_layby(
+        serializer.instance = LaybyService.update_layby(
             self.get_object(),
             **serializer.validated_data,
         )
@@ -65,13 +74,15 @@ class LaybyViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def overdue(self, request: Request) -> Response:
         """List overdue laybys."""
-        laybys = self.get_queryset().filter(
-            is_active=True,
-            is_complete=False,
-            expected_end_date__lt=timezone.now().date(),
+        laybys = self.paginate_queryset(
+            self.get_queryset().filter(
+                is_active=True,
+                is_complete=False,
+                expected_end_date__lt=timezone.now().date(),
+            ),
         )
         serializer = LaybySerializer(laybys, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["post"])
     def complete(self, request: Request, pk=None) -> Response:
@@ -92,3 +103,24 @@ class LaybyViewSet(viewsets.ModelViewSet):
             return Response(LaybyDetailSerializer(active_layby).data)
         except ValueError as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        parameters=[ExportQuerySerializer],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def export(self, request: Request):
+        """Stream every layby as CSV or NDJSON for reconciliation, for staff."""
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        export_format = params.validated_data.pop("export_format")
+        return stream_export(
+            "laybys",
+            tuple(EXPORT_COLUMNS),
+            LaybyService.get_laybys_for_export(**params.validated_data),
+            export_format,
+        )
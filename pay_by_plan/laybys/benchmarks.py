@@ -0,0 +1,130 @@
+"""
+Benchmarks for layby creation and the layby emails.
+
+These are not collected by the regular test run. Run them explicitly with output
+enabled, optionally overriding the number of laybys created, the latency of the
+SMTP stand-in and the number of users sent a daily summary:
+
+    $ BENCHMARK_LAYBYS=200 BENCHMARK_SMTP_LATENCY=0.2 BENCHMARK_USERS=100000 \
+        pytest pay_by_plan/laybys/benchmarks.py -s
+"""
+
+import os
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from laybys.mailer import LaybyMailer
+from laybys.models import Layby
+from laybys.models import OutboxEmail
+from laybys.services import LaybyService
+from rest_framework import status
+
+from pay_by_plan.users.models import User
+from pay_by_plan.utils.benchmarks import SMTPStandIn
+from pay_by_plan.utils.benchmarks import smtp_server  # noqa: F401
+
+LAYBYS = int(os.environ.get("BENCHMARK_LAYBYS", "50"))
+SMTP_LATENCY = float(os.environ.get("BENCHMARK_SMTP_LATENCY", "0.1"))
+USERS = int(os.environ.get("BENCHMARK_USERS", "20000"))
+LAYBYS_PER_USER = 2
+
+
+def send_inline(layby, kind):
+    """The original behaviour: send the confirmation inside the request."""
+    LaybyMailer.send_layby_confirmation(layby)
+
+
+def _create_laybys(api_client):
+    payload = {
+        "shop_name": "Game",
+        "item_description": "Benchmark item",
+        "total_cost": "1000.00",
+        "payment_frequency": "monthly",
+        "expected_end_date": timezone.now().date() + timedelta(days=90),
+    }
+    timings = []
+    for _ in range(LAYBYS):
+        start = time.perf_counter()
+        response = api_client.post(reverse("api:layby-list"), payload, format="json")
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == status.HTTP_201_CREATED
+    return timings
+
+
+def _report(label, timings):
+    p95 = statistics.quantiles(timings, n=20)[-1]
+    print(  # noqa: T201
+        f"{label:<8} {LAYBYS} laybys  "
+        f"mean {statistics.mean(timings):7.1f}ms  "
+        f"p50 {statistics.median(timings):7.1f}ms  p95 {p95:7.1f}ms",
+    )
+
+
+@pytest.mark.usefixtures("smtp_server")
+def test_create_latency_with_slow_smtp(api_client, monkeypatch):
+    monkeypatch.setattr(SMTPStandIn, "connect_delay", SMTP_LATENCY)
+    monkeypatch.setattr(SMTPStandIn, "message_delay", SMTP_LATENCY / 2)
+
+    with monkeypatch.context() as inline:
+        inline.setattr(LaybyService, "queue_email", staticmethod(send_inline))
+        _report("inline", _create_laybys(api_client))
+
+    _report("outbox", _create_laybys(api_client))
+
+    start = time.perf_counter()
+    sent = LaybyService.send_outbox_emails()
+    elapsed = time.perf_counter() - start
+    print(f"drain    {sent} emails in {elapsed:.2f}s")  # noqa: T201
+    assert sent == LAYBYS
+    assert not OutboxEmail.objects.filter(sent_at__isnull=True).exists()
+
+
+def _create_users_with_laybys(start, stop):
+    users = User.objects.bulk_create(
+        (User(email=f"user{i}@example.com") for i in range(start, stop)),
+        batch_size=5000,
+    )
+    Layby.objects.bulk_create(
+        (
+            Layby(
+                user=user,
+                shop_name=f"Shop {i}",
+                item_description="Benchmark item",
+                total_cost=Decimal("1000.00"),
+                expected_end_date="2099-01-01",
+            )
+            for user in users
+            for i in range(LAYBYS_PER_USER)
+        ),
+        batch_size=5000,
+    )
+
+
+@pytest.mark.django_db
+def test_daily_summary_memory_stays_flat(settings):
+    settings.EMAIL_BACKEND = "django.core.mail.backends.dummy.EmailBackend"
+    created = 0
+    for users in (USERS // 4, USERS):
+        _create_users_with_laybys(created, users)
+        created = users
+
+        start = time.perf_counter()
+        sent = LaybyService.send_layby_summaries()
+        elapsed = time.perf_counter() - start
+        assert sent == users
+
+        tracemalloc.start()
+        LaybyService.send_layby_summaries()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(  # noqa: T201
+            f"summary  {users:>8} users in {elapsed:7.2f}s "
+            f"{users / elapsed:8.0f}/sec  peak {peak / 2**20:6.1f} MiB",
+        )
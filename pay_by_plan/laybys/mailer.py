@@ -1,5 +1,9 @@
+from collections.abc import Iterable
+
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
+from django.template import Context
+from django.template.loader import get_template
 from django.template.loader import render_to_string
 
 from .models import Layby
@@ -9,9 +13,9 @@ class LaybyMailer:
     """Handles all layby-related email notifications."""
 
     @classmethod
-    def send_layby_confirmation(cls, layby: Layby) -> None:
+    def build_layby_confirmation(cls, layby: Layby) -> EmailMessage:
         """
-        Send email confirming the layby
+        Build the email confirming the layby
         """
         context = {
             "user": layby.user,
@@ -19,9 +23,56 @@ class LaybyMailer:
             "total_cost": layby.total_cost,
         }
 
-        send_mail(
+        return EmailMessage(
             subject="Your Layby Purchase Confirmation",
-            message=render_to_string("laybys/emails/confirmation.txt", context),
+            body=render_to_string("laybys/emails/confirmation.txt", context),
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[layby.user.email],
+            to=[layby.user.email],
         )
+
+    @classmethod
+    def send_layby_confirmation(cls, layby: Layby) -> None:
+        """
+        Send email confirming the layby
+        """
+        cls.build_layby_confirmation(layby).send()
+
+    @classmethod
+    def build_layby_completion(cls, layby: Layby) -> EmailMessage:
+        """
+        Build the email congratulating the user on paying off the layby
+        """
+        return EmailMessage(
+            subject="Your Layby Is Fully Paid",
+            body=render_to_string(
+                "laybys/emails/completion.txt",
+                {"user": layby.user, "layby": layby},
+            ),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[layby.user.email],
+        )
+
+    @classmethod
+    def build_layby_summaries(cls, recipients: Iterable[tuple]) -> list[EmailMessage]:
+        """
+        Build the daily status report for each (user, laybys) pair.
+
+        The template is compiled once for the batch and rendered against one
+        context, with only the user and their laybys pushed for each message.
+        """
+        template = get_template("laybys/emails/status_report.txt").template
+        context = Context()
+
+        messages = []
+        for user, laybys in recipients:
+            with context.push(user=user, laybys=laybys):
+                body = template.render(context)
+            messages.append(
+                EmailMessage(
+                    subject="Your Daily Layby Summary",
+                    body=body,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[user.email],
+                ),
+            )
+        return messages
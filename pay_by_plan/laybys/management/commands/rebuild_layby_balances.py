@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import DecimalField
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from laybys.models import Layby
+from laybys.services import LaybyService
+from payments.models import Payment
+
+
+def actual_payment_totals() -> dict:
+    """
+    Build correlated subqueries computing a layby's totals from its payments.
+    """
+    payments = Payment.objects.filter(layby=OuterRef("pk")).order_by().values("layby")
+    return {
+        "actual_amount_paid": Coalesce(
+            Subquery(payments.annotate(total=Sum("amount")).values("total")),
+            Value(Decimal("0.00")),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+        "actual_payment_count": Coalesce(
+            Subquery(payments.annotate(count=Count("pk")).values("count")),
+            Value(0),
+        ),
+        "actual_last_payment_at": Subquery(
+            payments.annotate(latest=Max("payment_date")).values("latest"),
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the denormalized payment totals stored on laybys."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report laybys whose stored totals differ from their payments.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            with transaction.atomic():
+                totals = actual_payment_totals()
+                updated = Layby.objects.update(
+                    amount_paid=totals["actual_amount_paid"],
+                    payment_count=totals["actual_payment_count"],
+                    last_payment_at=totals["actual_last_payment_at"],
+                )
+                LaybyService.allocate_installments()
+            self.stdout.write(f"Rebuilt payment totals for {updated} laybys.")
+
+        mismatched = list(self.get_mismatched_laybys().values_list("pk", flat=True))
+        if mismatched:
+            msg = f"{len(mismatched)} laybys have stale payment totals: {mismatched}"
+            raise CommandError(msg)
+
+        self.stdout.write(self.style.SUCCESS("All layby payment totals are correct."))
+
+    @staticmethod
+    def get_mismatched_laybys():
+        last_payment_differs = (
+            Q(last_payment_at__isnull=True, actual_last_payment_at__isnull=False)
+            | Q(last_payment_at__isnull=False, actual_last_payment_at__isnull=True)
+            | (
+                Q(last_payment_at__isnull=False, actual_last_payment_at__isnull=False)
+                & ~Q(last_payment_at=F("actual_last_payment_at"))
+            )
+        )
+        return Layby.objects.annotate(**actual_payment_totals()).filter(
+            ~Q(amount_paid=F("actual_amount_paid"))
+            | ~Q(payment_count=F("actual_payment_count"))
+            | last_payment_differs,
+        )
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.8 on 2026-10-18 06:56
+
+import django.db.models.expressions
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_payment_totals(apps, schema_editor):
+    Layby = apps.get_model("laybys", "Layby")
+    Payment = apps.get_model("payments", "Payment")
+
+    payments = Payment.objects.filter(layby=models.OuterRef("pk")).order_by().values("layby")
+    Layby.objects.update(
+        amount_paid=Coalesce(
+            models.Subquery(payments.annotate(total=models.Sum("amount")).values("total")),
+            models.Value(Decimal("0.00")),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        payment_count=Coalesce(
+            models.Subquery(payments.annotate(count=models.Count("pk")).values("count")),
+            models.Value(0),
+        ),
+        last_payment_at=models.Subquery(
+            payments.annotate(latest=models.Max("payment_date")).values("latest"),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laybys', '0003_alter_layby_start_date'),
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='layby',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Running total of payments, maintained by PaymentService', max_digits=10, verbose_name='Amount paid'),
+        ),
+        migrations.AddField(
+            model_name='layby',
+            name='last_payment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Last payment at'),
+        ),
+        migrations.AddField(
+            model_name='layby',
+            name='payment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Payment count'),
+        ),
+        migrations.AddField(
+            model_name='layby',
+            name='remaining_balance',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('total_cost'), '-', models.F('amount_paid')), output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='Remaining balance'),
+        ),
+        migrations.RunPython(backfill_payment_totals, migrations.RunPython.noop),
+    ]
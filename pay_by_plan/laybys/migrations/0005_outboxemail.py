@@ -0,0 +1,31 @@
+# Generated by Django 5.0.8 on 2026-10-18 07:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laybys', '0004_layby_payment_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('confirmation', 'Confirmation')], max_length=20, verbose_name='Kind')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent at')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('layby', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_emails', to='laybys.layby', verbose_name='Layby')),
+            ],
+            options={
+                'verbose_name': 'Outbox email',
+                'verbose_name_plural': 'Outbox emails',
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['id'], name='outbox_email_pending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('layby', 'kind'), name='unique_outbox_email_per_layby')],
+            },
+        ),
+    ]
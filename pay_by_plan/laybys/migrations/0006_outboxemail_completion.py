@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-18 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laybys', '0005_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxemail',
+            name='kind',
+            field=models.CharField(choices=[('confirmation', 'Confirmation'), ('completion', 'Completion')], max_length=20, verbose_name='Kind'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.8 on 2026-10-18 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laybys', '0006_outboxemail_completion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='layby',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_complete', False)), fields=['user', 'expected_end_date'], name='layby_open_due_idx'),
+        ),
+    ]
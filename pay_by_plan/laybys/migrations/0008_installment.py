@@ -0,0 +1,104 @@
+# Generated by Django 5.0.8 on 2026-10-18 09:30
+
+import calendar
+import django.db.models.deletion
+import django.db.models.expressions
+from datetime import date, timedelta
+from decimal import ROUND_DOWN, Decimal
+from django.db import migrations, models
+
+# The schedule arithmetic is copied from laybys.schedule as it was when this
+# migration was written, so later changes to that module cannot alter it.
+CENT = Decimal("0.01")
+
+
+def add_months(start, months):
+    month_index = start.year * 12 + start.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def iter_due_dates(start, end, frequency):
+    step = 1
+    while True:
+        if frequency == "biweekly":
+            due_date = start + timedelta(weeks=2 * step)
+        else:
+            due_date = add_months(start, step)
+        if due_date >= end:
+            yield end
+            return
+        yield due_date
+        step += 1
+
+
+def build_schedule(total_cost, start, end, frequency):
+    due_dates = list(iter_due_dates(start, end, frequency))
+    amount = (total_cost / len(due_dates)).quantize(CENT, rounding=ROUND_DOWN)
+
+    schedule = []
+    cumulative = Decimal("0.00")
+    for number, due_date in enumerate(due_dates, start=1):
+        if number == len(due_dates):
+            amount = total_cost - cumulative
+        cumulative += amount
+        schedule.append((due_date, amount, cumulative))
+    return schedule
+
+
+def allocate(amount_paid, amount, cumulative):
+    return min(amount, max(Decimal("0.00"), amount_paid - cumulative + amount))
+
+
+def backfill_installments(apps, schema_editor):
+    Layby = apps.get_model("laybys", "Layby")
+    Installment = apps.get_model("laybys", "Installment")
+
+    installments = []
+    for layby in Layby.objects.order_by("pk").iterator():
+        for due_date, amount, cumulative in build_schedule(
+            layby.total_cost, layby.start_date, layby.expected_end_date, layby.payment_frequency,
+        ):
+            installments.append(
+                Installment(
+                    layby=layby,
+                    due_date=due_date,
+                    amount=amount,
+                    cumulative_amount=cumulative,
+                    amount_paid=allocate(layby.amount_paid, amount, cumulative),
+                ),
+            )
+        if len(installments) >= 1000:
+            Installment.objects.bulk_create(installments)
+            installments = []
+    Installment.objects.bulk_create(installments)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laybys', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Installment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateField(verbose_name='Due date')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Amount')),
+                ('cumulative_amount', models.DecimalField(decimal_places=2, help_text='Total expected to be paid by the due date', max_digits=10, verbose_name='Cumulative amount')),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text="Share of the layby's payments allocated to this installment", max_digits=10, verbose_name='Amount paid')),
+                ('balance', models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('amount'), '-', models.F('amount_paid')), output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='Balance')),
+                ('layby', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='laybys.layby', verbose_name='Layby')),
+            ],
+            options={
+                'verbose_name': 'Installment',
+                'verbose_name_plural': 'Installments',
+                'ordering': ['due_date'],
+                'indexes': [models.Index(condition=models.Q(('balance__gt', 0)), fields=['layby', 'due_date'], name='installment_unpaid_idx')],
+                'constraints': [models.UniqueConstraint(fields=('layby', 'due_date'), name='unique_installment_per_due_date')],
+            },
+        ),
+        migrations.RunPython(backfill_installments, migrations.RunPython.noop),
+    ]
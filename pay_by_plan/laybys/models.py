@@ -73,6 +73,31 @@ class Layby(models.Model):
         _("Updated at"),
         auto_now=True,
     )
+    amount_paid = models.DecimalField(
+        _("Amount paid"),
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        editable=False,
+        help_text=_("Running total of payments, maintained by PaymentService"),
+    )
+    remaining_balance = models.GeneratedField(
+        expression=models.F("total_cost") - models.F("amount_paid"),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+        verbose_name=_("Remaining balance"),
+    )
+    payment_count = models.PositiveIntegerField(
+        _("Payment count"),
+        default=0,
+        editable=False,
+    )
+    last_payment_at = models.DateTimeField(
+        _("Last payment at"),
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = _("Layby")
@@ -80,11 +105,32 @@ class Layby(models.Model):
         ordering = ["-start_date"]
         indexes = [
             models.Index(fields=["-start_date", "user"]),
+            models.Index(
+                fields=["user", "expected_end_date"],
+                condition=models.Q(is_active=True, is_complete=False),
+                name="layby_open_due_idx",
+            ),
         ]
 
+    # Denormalized payment totals. These are only ever written with F() updates
+    # by PaymentService, so a regular save() must not overwrite them with
+    # whatever stale values happen to be loaded on the instance.
+    BALANCE_FIELDS = ("amount_paid", "payment_count", "last_payment_at")
+
     def __str__(self):
         return f"{self.shop_name} - {self.item_description[:30]}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and not field.generated
+                and field.name not in self.BALANCE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def clean(self):
         """Validate the model data."""
 
@@ -93,16 +139,6 @@ class Layby(models.Model):
                 {"expected_end_date": _("Expected end date must be after start date")},
             )
 
-    def remaining_balance(self) -> Decimal:
-        """
-        Calculate the remaining balance for this layby.
-
-        Returns:
-            Decimal: The amount still to be paid
-        """
-        paid_amount = sum(payment.amount for payment in self.payments.all())
-        return self.total_cost - paid_amount
-
     def is_overdue(self) -> bool:
         """
         Check if the layby is overdue based on expected end date.
@@ -117,14 +153,25 @@ class Layby(models.Model):
             and self.expected_end_date < timezone.now().date()
         )
 
-    def get_total_payments(self) -> float:
+    def payment_progress(self) -> int:
+        """
+        Calculate how much of the total cost has been paid.
+
+        Returns:
+            int: The percentage of the total cost paid, from 0 to 100
+        """
+        if not self.total_cost:
+            return 0
+        return int(self.amount_paid * 100 / self.total_cost)
+
+    def get_total_payments(self) -> Decimal:
         """
-        Calculate the total amount of payments received for this layby.
+        Get the total amount of payments received for this layby.
 
         Returns:
-            float: The total amount of payments
+            Decimal: The total amount of payments
         """
-        return self.payments.aggregate(total=models.Sum("amount"))["total"] or 0
+        return self.amount_paid
 
     def mark_as_complete(self):
         """
@@ -149,3 +196,133 @@ class Layby(models.Model):
             self.is_active = False
         else:
             self.is_active = True
+
+
+class OutboxEmail(models.Model):
+    """
+    An email about a layby waiting to be sent.
+
+    Rows are written in the same transaction as the change they announce and are
+    sent later in batches by the send_outbox_emails task, so requests never wait
+    on the mail server and an email is only sent for changes that committed.
+    """
+
+    KIND_CONFIRMATION = "confirmation"
+    KIND_COMPLETION = "completion"
+
+    KIND_CHOICES = [
+        (KIND_CONFIRMATION, _("Confirmation")),
+        (KIND_COMPLETION, _("Completion")),
+    ]
+
+    layby = models.ForeignKey(
+        Layby,
+        on_delete=models.CASCADE,
+        related_name="outbox_emails",
+        verbose_name=_("Layby"),
+    )
+    kind = models.CharField(
+        _("Kind"),
+        max_length=20,
+        choices=KIND_CHOICES,
+    )
+    created_at = models.DateTimeField(
+        _("Created at"),
+        auto_now_add=True,
+    )
+    sent_at = models.DateTimeField(
+        _("Sent at"),
+        null=True,
+        blank=True,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        _("Attempts"),
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = _("Outbox email")
+        verbose_name_plural = _("Outbox emails")
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sent_at__isnull=True),
+                name="outbox_email_pending_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["layby", "kind"],
+                name="unique_outbox_email_per_layby",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} email for {self.layby}"
+
+
+class Installment(models.Model):
+    """
+    One scheduled payment of a layby.
+
+    The schedule is written by LaybyService whenever a layby's cost or dates
+    change. Payments are allocated to installments oldest first, so an
+    installment is paid once the layby's amount paid reaches its cumulative
+    amount.
+    """
+
+    layby = models.ForeignKey(
+        Layby,
+        on_delete=models.CASCADE,
+        related_name="installments",
+        verbose_name=_("Layby"),
+    )
+    due_date = models.DateField(
+        _("Due date"),
+    )
+    amount = models.DecimalField(
+        _("Amount"),
+        max_digits=10,
+        decimal_places=2,
+    )
+    cumulative_amount = models.DecimalField(
+        _("Cumulative amount"),
+        max_digits=10,
+        decimal_places=2,
+        help_text=_("Total expected to be paid by the due date"),
+    )
+    amount_paid = models.DecimalField(
+        _("Amount paid"),
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        editable=False,
+        help_text=_("Share of the layby's payments allocated to this installment"),
+    )
+    balance = models.GeneratedField(
+        expression=models.F("amount") - models.F("amount_paid"),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+        verbose_name=_("Balance"),
+    )
+
+    class Meta:
+        verbose_name = _("Installment")
+        verbose_name_plural = _("Installments")
+        ordering = ["due_date"]
+        indexes = [
+            models.Index(
+                fields=["layby", "due_date"],
+                condition=models.Q(balance__gt=0),
+                name="installment_unpaid_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["layby", "due_date"],
+                name="unique_installment_per_due_date",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.layby} - R{self.amount} due {self.due_date}"
@@ -0,0 +1,80 @@
+"""
+Installment schedule arithmetic.
+
+These functions only work on dates and amounts and are used by LaybyService.
+Migration 0008 keeps its own copy, so changes here do not alter the schedules it
+backfilled.
+"""
+
+import calendar
+from collections.abc import Iterator
+from datetime import date
+from datetime import timedelta
+from decimal import ROUND_DOWN
+from decimal import Decimal
+
+from laybys.models import Layby
+
+CENT = Decimal("0.01")
+
+
+def add_months(start: date, months: int) -> date:
+    """
+    Return the same day `months` months after start, clamped to the month's end.
+    """
+    month_index = start.year * 12 + start.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def iter_due_dates(start: date, end: date, frequency: str) -> Iterator[date]:
+    """
+    Yield the installment due dates of a layby.
+
+    Installments fall every frequency period after the start date, and the last
+    one always falls on the end date, so a layby has at least one installment.
+    """
+    step = 1
+    while True:
+        if frequency == Layby.FREQUENCY_BIWEEKLY:
+            due_date = start + timedelta(weeks=2 * step)
+        else:
+            due_date = add_months(start, step)
+        if due_date >= end:
+            yield end
+            return
+        yield due_date
+        step += 1
+
+
+def build_schedule(
+    total_cost: Decimal,
+    start: date,
+    end: date,
+    frequency: str,
+) -> list[tuple[date, Decimal, Decimal]]:
+    """
+    Split a layby's cost into (due date, amount, cumulative amount) installments.
+
+    Every installment is the cost divided evenly and rounded down to the cent,
+    and the last one takes the remaining cents so the amounts add up exactly.
+    """
+    due_dates = list(iter_due_dates(start, end, frequency))
+    amount = (total_cost / len(due_dates)).quantize(CENT, rounding=ROUND_DOWN)
+
+    schedule = []
+    cumulative = Decimal("0.00")
+    for number, due_date in enumerate(due_dates, start=1):
+        if number == len(due_dates):
+            amount = total_cost - cumulative
+        cumulative += amount
+        schedule.append((due_date, amount, cumulative))
+    return schedule
+
+
+def allocate(amount_paid: Decimal, amount: Decimal, cumulative: Decimal) -> Decimal:
+    """
+    Return the share of a layby's amount paid that falls on one installment.
+    """
+    return min(amount, max(Decimal("0.00"), amount_paid - cumulative + amount))
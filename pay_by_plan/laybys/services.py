@@ -1,13 +1,64 @@
 from datetime import date
 from decimal import Decimal
+from functools import partial
+from itertools import islice
 
+from dashboard.rollups import ShopRollup
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import DecimalField
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Prefetch
 from django.db.models import QuerySet
+from django.db.models import Subquery
+from django.db.models import Value
+from django.db.models.functions import Greatest
+from django.db.models.functions import Least
+from django.utils import timezone
 from laybys.mailer import LaybyMailer
+from laybys.models import Installment
 from laybys.models import Layby
+from laybys.models import OutboxEmail
+from laybys.schedule import build_schedule
+
+from pay_by_plan.utils.mail import MailDispatcher
+from pay_by_plan.utils.mail import send_mass_messages
 
 User = get_user_model()
 
+SUMMARY_CHUNK_SIZE = 500
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+INSTALLMENT_BATCH_SIZE = 1000
+
+# Changing any of these fields rewrites the layby's installment schedule.
+SCHEDULE_FIELDS = ("total_cost", "payment_frequency", "start_date", "expected_end_date")
+
+# Columns of the layby export and the lookups they are read from.
+EXPORT_COLUMNS = {
+    "id": "pk",
+    "user_email": "user__email",
+    "shop_name": "shop_name",
+    "item_description": "item_description",
+    "total_cost": "total_cost",
+    "amount_paid": "amount_paid",
+    "remaining_balance": "remaining_balance",
+    "payment_count": "payment_count",
+    "payment_frequency": "payment_frequency",
+    "start_date": "start_date",
+    "expected_end_date": "expected_end_date",
+    "is_active": "is_active",
+    "is_complete": "is_complete",
+    "created_at": "created_at",
+}
+
+OUTBOX_BUILDERS = {
+    OutboxEmail.KIND_CONFIRMATION: LaybyMailer.build_layby_confirmation,
+    OutboxEmail.KIND_COMPLETION: LaybyMailer.build_layby_completion,
+}
+
 
 class LaybyService:
     @staticmethod
@@ -23,28 +74,216 @@ class LaybyService:
         is_complete: bool = False,
     ) -> Layby:
         """
-        Create a new layby with the provided details and send confirmation.
-        """
-        layby = Layby(
-            user=user,
-            shop_name=shop_name,
-            item_description=item_description,
-            total_cost=total_cost,
-            payment_frequency=payment_frequency,
-            start_date=start_date,
-            expected_end_date=expected_end_date,
-            is_active=is_active,
-            is_complete=is_complete,
+        Create a new layby with the provided details and queue its confirmation.
+        """
+        return LaybyService.record_layby(
+            Layby(
+                user=user,
+                shop_name=shop_name,
+                item_description=item_description,
+                total_cost=total_cost,
+                payment_frequency=payment_frequency,
+                start_date=start_date or timezone.now().date(),
+                expected_end_date=expected_end_date,
+                is_active=is_active,
+                is_complete=is_complete,
+            ),
         )
 
-        layby.full_clean()
-        layby.save()
+    @staticmethod
+    def record_layby(layby: Layby) -> Layby:
+        """
+        Save a new layby with its installment schedule, rollup and confirmation.
 
-        # Sending confirmation email
-        LaybyMailer.send_layby_confirmation(layby=layby)
+        Everything is written in one transaction, so a layby is never committed
+        without its outbox email.
+        """
+        layby.full_clean()
+        with transaction.atomic():
+            layby.save()
+            LaybyService.schedule_installments([layby])
+            ShopRollup.record(ShopRollup.layby_rows(layby))
+            LaybyService.queue_email(layby, OutboxEmail.KIND_CONFIRMATION)
 
         return layby
 
+    @staticmethod
+    def schedule_installments(laybys: list[Layby]) -> None:
+        """
+        Replace the installment schedule of laybys and allocate their payments.
+        """
+        with transaction.atomic():
+            Installment.objects.filter(layby__in=laybys).delete()
+            Installment.objects.bulk_create(
+                [
+                    Installment(
+                        layby=layby,
+                        due_date=due_date,
+                        amount=amount,
+                        cumulative_amount=cumulative_amount,
+                    )
+                    for layby in laybys
+                    for due_date, amount, cumulative_amount in build_schedule(
+                        layby.total_cost,
+                        layby.start_date,
+                        layby.expected_end_date,
+                        layby.payment_frequency,
+                    )
+                ],
+                batch_size=INSTALLMENT_BATCH_SIZE,
+            )
+            LaybyService.allocate_installments([layby.pk for layby in laybys])
+
+    @staticmethod
+    def allocate_installments(layby_ids=None) -> int:
+        """
+        Allocate the amount paid on laybys to their installments, oldest first.
+
+        An installment's share is worked out from its cumulative amount and the
+        layby's stored amount paid, so this runs after the layby totals have been
+        written. It is a single UPDATE which only touches the installments whose
+        share changed, which for one payment are the few it straddles. All
+        laybys are allocated when no ids are given.
+
+        Returns:
+            int: The number of installments updated
+        """
+        amount_paid = Subquery(
+            Layby.objects.filter(pk=OuterRef("layby_id")).values("amount_paid"),
+        )
+        allocated = Least(
+            F("amount"),
+            Greatest(
+                Value(Decimal("0.00")),
+                amount_paid - F("cumulative_amount") + F("amount"),
+            ),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        installments = Installment.objects.all()
+        if layby_ids is not None:
+            installments = installments.filter(layby_id__in=layby_ids)
+        return installments.exclude(amount_paid=allocated).update(
+            amount_paid=allocated,
+        )
+
+    @staticmethod
+    def queue_email(layby: Layby, kind: str) -> OutboxEmail:
+        """
+        Write an outbox email for a layby and send the outbox once committed.
+        """
+        email = OutboxEmail.objects.create(layby=layby, kind=kind)
+        transaction.on_commit(LaybyService._enqueue_outbox)
+        return email
+
+    @staticmethod
+    def _enqueue_outbox() -> None:
+        # laybys.tasks imports this module, so the task is looked up lazily.
+        from laybys.tasks import send_outbox_emails  # noqa: PLC0415
+
+        send_outbox_emails()
+
+    @staticmethod
+    def on_laybys_completed(laybys: list[Layby]) -> None:
+        """
+        Queue the completion email of laybys whose balance was just paid off.
+
+        Called inside the payment transaction. The outbox rows are inserted with
+        ON CONFLICT DO NOTHING against the unique (layby, kind) constraint, so a
+        layby that is completed again never gets a second email, and the
+        notify_layby_completion task only runs once the payment has committed.
+        """
+        OutboxEmail.objects.bulk_create(
+            [
+                OutboxEmail(layby=layby, kind=OutboxEmail.KIND_COMPLETION)
+                for layby in laybys
+            ],
+            ignore_conflicts=True,
+        )
+        for layby in laybys:
+            transaction.on_commit(
+                partial(LaybyService._enqueue_completion, layby.pk),
+            )
+
+    @staticmethod
+    def _enqueue_completion(layby_id: int) -> None:
+        from laybys.tasks import notify_layby_completion  # noqa: PLC0415
+
+        notify_layby_completion(layby_id)
+
+    @staticmethod
+    def notify_layby_completion(layby: Layby) -> bool:
+        """
+        Send the pending completion email of a layby.
+
+        The outbox row is claimed with SKIP LOCKED, so concurrent tasks for the
+        same layby send it once. A failed send stays pending for the outbox retry.
+
+        Returns:
+            bool: True if an email was sent
+        """
+        with transaction.atomic():
+            email = (
+                OutboxEmail.objects.filter(
+                    layby=layby,
+                    kind=OutboxEmail.KIND_COMPLETION,
+                    sent_at__isnull=True,
+                )
+                .select_for_update(skip_locked=True)
+                .first()
+            )
+            if email is None:
+                return False
+
+            (sent,) = send_mass_messages([LaybyMailer.build_layby_completion(layby)])
+            email.attempts += 1
+            if sent:
+                email.sent_at = timezone.now()
+            email.save(update_fields=["attempts", "sent_at"])
+        return sent
+
+    @staticmethod
+    def send_outbox_emails(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+        """
+        Send the pending outbox emails in batches.
+
+        Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so
+        overlapping runs never send the same email twice, and is sent over one
+        mail connection. Emails that fail stay pending and are retried by later
+        runs until they have been attempted OUTBOX_MAX_ATTEMPTS times.
+
+        Returns:
+            int: The number of emails sent
+        """
+        pending = (
+            OutboxEmail.objects.filter(
+                sent_at__isnull=True,
+                attempts__lt=OUTBOX_MAX_ATTEMPTS,
+            )
+            .select_related("layby__user")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("pk")
+        )
+
+        sent = 0
+        cursor = 0
+        while True:
+            with transaction.atomic():
+                batch = list(pending.filter(pk__gt=cursor)[:batch_size])
+                if not batch:
+                    break
+                results = send_mass_messages(
+                    OUTBOX_BUILDERS[email.kind](email.layby) for email in batch
+                )
+                now = timezone.now()
+                for email, is_sent in zip(batch, results, strict=True):
+                    email.attempts += 1
+                    if is_sent:
+                        email.sent_at = now
+                OutboxEmail.objects.bulk_update(batch, ["attempts", "sent_at"])
+            sent += sum(results)
+            cursor = batch[-1].pk
+        return sent
+
     @staticmethod
     def get_layby(layby_id: int) -> Layby | None:
         """
@@ -63,22 +302,69 @@ class LaybyService:
     def update_layby(layby: Layby, **kwargs) -> Layby:
         """
         Update a layby with the provided field-value pairs.
+
+        The installment schedule is rebuilt if the cost, frequency or dates
+        changed, and the shop rollups are moved over if the cost, shop or
+        completion changed.
         """
+        schedule = [getattr(layby, field) for field in SCHEDULE_FIELDS]
+        shop_name = layby.shop_name
+        rollups = ShopRollup.layby_rows(layby, sign=-1)
         for field, value in kwargs.items():
             if value is not None:
                 setattr(layby, field, value)
 
         layby.full_clean()
-        layby.save()
+        with transaction.atomic():
+            layby.save()
+            if schedule != [getattr(layby, field) for field in SCHEDULE_FIELDS]:
+                LaybyService.schedule_installments([layby])
+
+            rollups += ShopRollup.layby_rows(layby)
+            if shop_name != layby.shop_name:
+                rollups += ShopRollup.payment_history_rows(layby, shop_name, sign=-1)
+                rollups += ShopRollup.payment_history_rows(layby, layby.shop_name)
+            ShopRollup.record(rollups)
 
         return layby
 
     @staticmethod
     def delete_layby(layby: Layby) -> None:
         """
-        Delete a layby.
+        Delete a layby and take it and its payments out of the shop rollups.
+        """
+        with transaction.atomic():
+            ShopRollup.record(
+                [
+                    *ShopRollup.layby_rows(layby, sign=-1),
+                    *ShopRollup.payment_history_rows(
+                        layby,
+                        layby.shop_name,
+                        sign=-1,
+                    ),
+                ],
+            )
+            layby.delete()
+
+    @staticmethod
+    def get_laybys_for_export(
+        shop_name: str | None = None,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> QuerySet:
+        """
+        Return the laybys to export as tuples of EXPORT_COLUMNS, in id order.
+
+        The start and end dates are inclusive bounds on the layby's start date.
         """
-        layby.delete()
+        laybys = Layby.objects.all()
+        if shop_name:
+            laybys = laybys.filter(shop_name=shop_name)
+        if start:
+            laybys = laybys.filter(start_date__gte=start)
+        if end:
+            laybys = laybys.filter(start_date__lte=end)
+        return laybys.order_by("pk").values_list(*EXPORT_COLUMNS.values())
 
     @staticmethod
     def get_active_laybys() -> QuerySet[Layby]:
@@ -94,15 +380,18 @@ class LaybyService:
         """
         Calculate the remaining balance for a layby.
         """
-        return layby.remaining_balance()
+        return layby.remaining_balance
 
     @staticmethod
     def mark_complete(layby: Layby) -> Layby:
         """
         Mark a layby as complete.
         """
+        rollups = ShopRollup.completion_rows(layby, sign=-1)
         layby.mark_as_complete()
-        layby.save()
+        with transaction.atomic():
+            layby.save()
+            ShopRollup.record(rollups + ShopRollup.completion_rows(layby))
         return layby
 
     @staticmethod
@@ -111,3 +400,40 @@ class LaybyService:
         layby.mark_as_active()
         layby.save()
         return layby
+
+    @staticmethod
+    def get_summary_recipients() -> QuerySet[User]:
+        """
+        Retrieve the users with active laybys, with those laybys prefetched.
+        """
+        active_laybys = LaybyService.get_active_laybys()
+        return (
+            User.objects.filter(Exists(active_laybys.filter(user=OuterRef("pk"))))
+            .prefetch_related(
+                Prefetch("laybys", queryset=active_laybys, to_attr="active_laybys"),
+            )
+            .order_by("pk")
+        )
+
+    @staticmethod
+    def send_layby_summaries(chunk_size: int = SUMMARY_CHUNK_SIZE) -> int:
+        """
+        Send the daily summary to every user with active laybys.
+
+        Users are streamed from a server-side cursor chunk_size at a time, each
+        chunk with its laybys prefetched in one query, and every chunk is rendered
+        and sent over the same mail connection. Memory use depends on chunk_size,
+        not on the number of users.
+
+        Returns:
+            int: The number of summaries sent
+        """
+        users = LaybyService.get_summary_recipients().iterator(chunk_size=chunk_size)
+        sent = 0
+        with MailDispatcher() as dispatcher:
+            while batch := list(islice(users, chunk_size)):
+                messages = LaybyMailer.build_layby_summaries(
+                    (user, user.active_laybys) for user in batch
+                )
+                sent += sum(dispatcher.send_messages(messages))
+        return sent
@@ -1,3 +1,520 @@
-from django.test import TestCase
+import csv
+from datetime import date
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from dashboard.models import ShopDailyRollup
+from dashboard.rollups import ShopRollup
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.utils import timezone
+from laybys.mailer import LaybyMailer
+from laybys.models import Installment
+from laybys.models import Layby
+from laybys.models import OutboxEmail
+from laybys.schedule import build_schedule
+from laybys.services import OUTBOX_MAX_ATTEMPTS
+from laybys.services import LaybyService
+from payments.services import PaymentService
+from rest_framework import status
+
+from pay_by_plan.users.tests.factories import UserFactory
+from pay_by_plan.utils.testing import REJECTED
+from pay_by_plan.utils.testing import REJECTING_BACKEND
+
+
+def create_layby(user):
+    return LaybyService.create_layby(
+        user=user,
+        shop_name="Game",
+        item_description="Double door fridge",
+        total_cost=Decimal("1000.00"),
+        payment_frequency=Layby.FREQUENCY_MONTHLY,
+        expected_end_date=timezone.now().date() + timedelta(days=90),
+    )
+
+
+class TestRebuildLaybyBalances:
+    def test_rebuild_restores_stale_totals(self, layby):
+        payment = PaymentService.create_payment(layby, Decimal("120.00"))
+        Layby.objects.filter(pk=layby.pk).update(amount_paid=0, payment_count=0)
+
+        call_command("rebuild_layby_balances")
+
+        layby.refresh_from_db()
+        assert layby.amount_paid == Decimal("120.00")
+        assert layby.remaining_balance == Decimal("880.00")
+        assert layby.payment_count == 1
+        assert layby.last_payment_at == payment.payment_date
+
+    def test_verify_reports_stale_totals(self, layby):
+        PaymentService.create_payment(layby, Decimal("120.00"))
+        Layby.objects.filter(pk=layby.pk).update(amount_paid=0)
+
+        with pytest.raises(CommandError, match="1 laybys have stale payment totals"):
+            call_command("rebuild_layby_balances", "--verify")
+
+    def test_verify_passes_when_totals_match(self, layby):
+        PaymentService.create_payment(layby, Decimal("120.00"))
+
+        call_command("rebuild_layby_balances", "--verify")
+
+
+class TestOutboxEmails:
+    def test_create_layby_queues_confirmation_without_sending(
+        self,
+        user,
+        django_capture_on_commit_callbacks,
+    ):
+        with django_capture_on_commit_callbacks() as callbacks:
+            layby = create_layby(user)
+
+        assert LaybyService._enqueue_outbox in callbacks  # noqa: SLF001
+        assert mail.outbox == []
+        email = OutboxEmail.objects.get()
+        assert (email.layby, email.kind) == (layby, OutboxEmail.KIND_CONFIRMATION)
+        assert email.sent_at is None
+
+    def test_layby_is_not_saved_without_its_outbox_email(self, user, monkeypatch):
+        def fail(*args, **kwargs):
+            msg = "outbox unavailable"
+            raise RuntimeError(msg)
+
+        monkeypatch.setattr(LaybyService, "queue_email", staticmethod(fail))
+
+        with pytest.raises(RuntimeError):
+            create_layby(user)
+
+        assert not Layby.objects.exists()
+        assert not Installment.objects.exists()
+
+    def test_create_endpoint_does_not_wait_for_email(self, api_client):
+        response = api_client.post(
+            reverse("api:layby-list"),
+            {
+                "shop_name": "Game",
+                "item_description": "Double door fridge",
+                "total_cost": "1000.00",
+                "payment_frequency": Layby.FREQUENCY_MONTHLY,
+                "expected_end_date": timezone.now().date() + timedelta(days=90),
+            },
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["remaining_balance"] == Decimal("1000.00")
+        assert mail.outbox == []
+        assert OutboxEmail.objects.filter(layby=response.data["id"]).exists()
+
+    def test_confirmation_renders_layby_details(self, layby):
+        body = LaybyMailer.build_layby_confirmation(layby).body
+
+        assert "Store: Game" in body
+        assert "Total Cost: $1000.00" in body
+
+    @pytest.mark.usefixtures("immediate_huey")
+    def test_confirmation_is_sent_after_commit(
+        self,
+        user,
+        django_capture_on_commit_callbacks,
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            create_layby(user)
+
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].to == [user.email]
+        assert OutboxEmail.objects.get().sent_at is not None
+
+    def test_send_outbox_emails_sends_pending_in_batches(
+        self,
+        user,
+        django_assert_num_queries,
+    ):
+        for _ in range(5):
+            create_layby(user)
+        OutboxEmail.objects.filter(pk=OutboxEmail.objects.first().pk).update(
+            sent_at=timezone.now(),
+        )
+
+        # Per batch: SAVEPOINT, SELECT, UPDATE, RELEASE; then the empty batch.
+        with django_assert_num_queries(11):
+            sent = LaybyService.send_outbox_emails(batch_size=2)
+
+        assert sent == 4  # noqa: PLR2004
+        assert len(mail.outbox) == 4  # noqa: PLR2004
+        assert not OutboxEmail.objects.filter(sent_at__isnull=True).exists()
+
+    def test_failed_emails_are_retried_until_max_attempts(self, user, settings):
+        settings.EMAIL_BACKEND = REJECTING_BACKEND
+        user.email = REJECTED
+        user.save()
+        create_layby(user)
+
+        for _ in range(OUTBOX_MAX_ATTEMPTS + 1):
+            assert LaybyService.send_outbox_emails() == 0
+
+        email = OutboxEmail.objects.get()
+        assert email.sent_at is None
+        assert email.attempts == OUTBOX_MAX_ATTEMPTS
+
+
+class TestLaybySummaries:
+    def test_only_users_with_active_laybys_get_a_summary(self, user, layby):
+        Layby.objects.create(
+            user=user,
+            shop_name="Makro",
+            item_description="Completed TV",
+            total_cost=Decimal("500.00"),
+            expected_end_date=layby.expected_end_date,
+            is_complete=True,
+        )
+        inactive_user = UserFactory()
+        Layby.objects.create(
+            user=inactive_user,
+            shop_name="Makro",
+            item_description="Paused TV",
+            total_cost=Decimal("500.00"),
+            expected_end_date=layby.expected_end_date,
+            is_active=False,
+        )
+        UserFactory()
+
+        sent = LaybyService.send_layby_summaries()
+
+        assert sent == 1
+        (summary,) = mail.outbox
+        assert summary.to == [user.email]
+        assert "Game - Double door fridge" in summary.body
+        assert "Remaining balance: R1000.00" in summary.body
+        assert "Completed TV" not in summary.body
+
+    @pytest.mark.django_db
+    def test_queries_depend_only_on_chunks(self, django_assert_num_queries):
+        for _ in range(5):
+            create_layby(UserFactory())
+
+        # The streamed user query, then one layby prefetch per chunk of two.
+        with django_assert_num_queries(4):
+            sent = LaybyService.send_layby_summaries(chunk_size=2)
+
+        assert sent == 5  # noqa: PLR2004
+
+
+class TestCompletionEmails:
+    def test_completion_is_queued_without_sending(
+        self,
+        layby,
+        django_capture_on_commit_callbacks,
+    ):
+        with django_capture_on_commit_callbacks():
+            PaymentService.create_payment(layby, Decimal("1000.00"))
+
+        assert mail.outbox == []
+        assert OutboxEmail.objects.filter(
+            layby=layby,
+            kind=OutboxEmail.KIND_COMPLETION,
+            sent_at__isnull=True,
+        ).exists()
+
+    def test_partial_payment_queues_nothing(self, layby):
+        PaymentService.create_payment(layby, Decimal("999.99"))
+
+        assert not OutboxEmail.objects.filter(layby=layby).exists()
+
+    @pytest.mark.usefixtures("immediate_huey")
+    def test_completion_email_is_sent_after_commit(
+        self,
+        layby,
+        django_capture_on_commit_callbacks,
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            PaymentService.create_payment(layby, Decimal("1000.00"))
+
+        (email,) = mail.outbox
+        assert email.to == [layby.user.email]
+        assert "Store: Game" in email.body
+        assert "Total Paid: $1000.00" in email.body
+        assert OutboxEmail.objects.get(layby=layby).sent_at is not None
+
+    @pytest.mark.usefixtures("immediate_huey")
+    def test_layby_completed_again_is_not_emailed_again(
+        self,
+        layby,
+        django_capture_on_commit_callbacks,
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            payment = PaymentService.create_payment(layby, Decimal("1000.00"))
+        PaymentService.delete_payment(payment)
+        Layby.objects.filter(pk=layby.pk).update(is_complete=False)
+        layby.refresh_from_db()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            PaymentService.create_payment(layby, Decimal("1000.00"))
+
+        assert len(mail.outbox) == 1
+
+    def test_bulk_payments_queue_completions(self, layby):
+        PaymentService.bulk_create_payments(
+            [
+                {"layby_id": layby.pk, "amount": "600.00"},
+                {"layby_id": layby.pk, "amount": "400.00"},
+            ],
+        )
+
+        assert OutboxEmail.objects.filter(
+            layby=layby,
+            kind=OutboxEmail.KIND_COMPLETION,
+        ).exists()
+
+
+def allocations(layby):
+    return list(layby.installments.values_list("amount_paid", flat=True))
+
+
+class TestInstallmentSchedule:
+    def test_cost_is_split_evenly_with_the_remainder_last(self):
+        schedule = build_schedule(
+            Decimal("1000.00"),
+            date(2024, 1, 31),
+            date(2024, 4, 15),
+            Layby.FREQUENCY_MONTHLY,
+        )
+
+        assert schedule == [
+            (date(2024, 2, 29), Decimal("333.33"), Decimal("333.33")),
+            (date(2024, 3, 31), Decimal("333.33"), Decimal("666.66")),
+            (date(2024, 4, 15), Decimal("333.34"), Decimal("1000.00")),
+        ]
+
+    def test_biweekly_installments_end_on_the_end_date(self):
+        schedule = build_schedule(
+            Decimal("100.00"),
+            date(2024, 1, 1),
+            date(2024, 1, 29),
+            Layby.FREQUENCY_BIWEEKLY,
+        )
+
+        assert [due_date for due_date, _, _ in schedule] == [
+            date(2024, 1, 15),
+            date(2024, 1, 29),
+        ]
+
+    def test_create_layby_writes_the_schedule(self, user):
+        layby = create_layby(user)
+
+        installments = list(layby.installments.all())
+        assert len(installments) == 3  # noqa: PLR2004
+        assert installments[-1].due_date == layby.expected_end_date
+        assert installments[-1].cumulative_amount == layby.total_cost
+
+    def test_payments_are_allocated_oldest_first(self, user):
+        layby = create_layby(user)
+
+        payment = PaymentService.create_payment(layby, Decimal("400.00"))
+        assert allocations(layby) == [Decimal("333.33"), Decimal("66.67"), 0]
+
+        PaymentService.update_payment(payment, Decimal("300.00"))
+        assert allocations(layby) == [Decimal("300.00"), 0, 0]
+
+        PaymentService.delete_payment(payment)
+        assert allocations(layby) == [0, 0, 0]
+
+    def test_bulk_payments_are_allocated(self, user):
+        layby = create_layby(user)
+
+        PaymentService.bulk_create_payments(
+            [{"layby_id": layby.pk, "amount": "350.00"}] * 2,
+        )
+
+        assert allocations(layby) == [
+            Decimal("333.33"),
+            Decimal("333.33"),
+            Decimal("33.34"),
+        ]
+
+    def test_rescheduling_keeps_payments_allocated(self, user):
+        layby = create_layby(user)
+        PaymentService.create_payment(layby, Decimal("400.00"))
+
+        LaybyService.update_layby(
+            layby,
+            expected_end_date=layby.start_date + timedelta(days=20),
+        )
+
+        assert layby.installments.get().amount_paid == Decimal("400.00")
+
+    def test_unpaid_installments_due_soon_use_the_unpaid_index(
+        self,
+        user,
+        assert_uses_index,
+    ):
+        layby = create_layby(user)
+        today = timezone.now().date()
+
+        due_this_week = Installment.objects.filter(
+            layby=layby,
+            balance__gt=0,
+            due_date__range=(today, today + timedelta(days=7)),
+        )
+
+        assert_uses_index(due_this_week, "installment_unpaid_idx")
+
+
+class TestLaybyListing:
+    def test_list_endpoints_run_a_fixed_number_of_queries(
+        self,
+        user,
+        assert_query_budget,
+    ):
+        for _ in range(5):
+            create_layby(user)
+
+        assert_query_budget(reverse("api:layby-list"), 3)
+        assert_query_budget(reverse("api:layby-overdue"), 3)
+
+
+class TestLaybyExport:
+    def test_csv_export_filters_by_shop(self, user, api_client, layby):
+        user.is_staff = True
+        user.save()
+        PaymentService.create_payment(layby, Decimal("250.00"))
+        Layby.objects.create(
+            user=UserFactory(),
+            shop_name="Makro",
+            item_description="Television",
+            total_cost=Decimal("500.00"),
+            expected_end_date=layby.expected_end_date,
+        )
+
+        response = api_client.get(reverse("api:layby-export"), {"shop_name": "Game"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "text/csv"
+        assert response["Content-Disposition"].startswith(
+            'attachment; filename="laybys-',
+        )
+        rows = list(
+            csv.DictReader(b"".join(response.streaming_content).decode().splitlines()),
+        )
+        assert len(rows) == 1
+        assert rows[0]["id"] == str(layby.pk)
+        assert rows[0]["amount_paid"] == "250.00"
+        assert rows[0]["remaining_balance"] == "750.00"
+
+
+class TestQueryPlans:
+    def test_overdue_laybys_use_the_open_layby_index(self, user, assert_uses_index):
+        today = timezone.now().date()
+        Layby.objects.bulk_create(
+            Layby(
+                user=user,
+                shop_name=f"Shop {i}",
+                item_description="Item",
+                total_cost=Decimal("100.00"),
+                expected_end_date=today + timedelta(days=i - 2),
+            )
+            for i in range(200)
+        )
+        overdue = Layby.objects.filter(
+            user=user,
+            is_active=True,
+            is_complete=False,
+            expected_end_date__lt=today,
+        )
+
+        assert_uses_index(overdue, "layby_open_due_idx")
+
+
+class TestLaybyAdmin:
+    @pytest.fixture(autouse=True)
+    def _clear_cache(self):
+        cache.clear()
+
+    @pytest.mark.parametrize(
+        ("changelist", "queries"),
+        [
+            ("admin:laybys_layby_changelist", 8),
+            ("admin:laybys_outboxemail_changelist", 7),
+        ],
+    )
+    def test_changelist_renders_100_rows_in_fixed_queries(
+        self,
+        admin_client,
+        changelist,
+        queries,
+        django_assert_num_queries,
+    ):
+        for _ in range(100):
+            create_layby(UserFactory())
+
+        with django_assert_num_queries(queries):
+            response = admin_client.get(reverse(changelist))
+
+        assert response.status_code == status.HTTP_200_OK
+
+    @staticmethod
+    def _layby_form(user, **data):
+        return {
+            "user": user.pk,
+            "shop_name": "Game",
+            "item_description": "Double door fridge",
+            "total_cost": "1200.00",
+            "payment_frequency": Layby.FREQUENCY_MONTHLY,
+            "start_date": "2026-01-01",
+            "expected_end_date": "2026-04-01",
+            "is_active": "on",
+            **{
+                f"{prefix}-{key}": value
+                for prefix in ("installments", "payments")
+                for key, value in (("TOTAL_FORMS", 0), ("INITIAL_FORMS", 0))
+            },
+            **data,
+        }
+
+    def test_admin_writes_go_through_the_service(self, user, admin_client):
+        response = admin_client.post(
+            reverse("admin:laybys_layby_add"),
+            self._layby_form(user),
+        )
+
+        assert response.status_code == status.HTTP_302_FOUND
+        layby = Layby.objects.get()
+        assert layby.installments.count() == 3  # noqa: PLR2004
+        assert OutboxEmail.objects.filter(layby=layby).exists()
+        assert ShopRollup.get_mismatched() == []
+
+        admin_client.post(
+            reverse("admin:laybys_layby_change", args=[layby.pk]),
+            self._layby_form(user, total_cost="900.00"),
+        )
+
+        assert [i.amount for i in layby.installments.all()] == [Decimal("300.00")] * 3
+        assert ShopRollup.get_mismatched() == []
+
+        admin_client.post(
+            reverse("admin:laybys_layby_delete", args=[layby.pk]),
+            {"post": "yes"},
+        )
+
+        assert not Layby.objects.exists()
+        assert ShopRollup.get_mismatched() == []
+        assert ShopDailyRollup.objects.get().new_laybys == 0
+
+    def test_shop_filter_choices_are_cached(
+        self,
+        admin_client,
+        django_assert_num_queries,
+    ):
+        create_layby(UserFactory())
+        url = reverse("admin:laybys_layby_changelist")
+        admin_client.get(url)
+
+        # The SELECT DISTINCT of shop names is not repeated.
+        with django_assert_num_queries(7):
+            response = admin_client.get(url)
+
+        assert "Game" in response.content.decode()
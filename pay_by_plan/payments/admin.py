@@ -1,10 +1,11 @@
-from decimal import Decimal
-
 from django.contrib import admin
 from django.contrib import messages
-from django.db.models import Sum
 from django.utils.html import format_html
 from laybys.models import Layby
+from payments.services import PaymentService
+
+from pay_by_plan.utils.admin import CachedAllValuesFieldListFilter
+from pay_by_plan.utils.admin import LargeTableAdminMixin
 
 from .models import Payment
 
@@ -24,7 +25,7 @@ class LaybyInline(admin.StackedInline):
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         "layby",
         "user_name",
@@ -32,14 +33,18 @@ class PaymentAdmin(admin.ModelAdmin):
         "payment_date_formatted",
         "layby_shop_name",
     )
-    list_filter = ("payment_date", "layby__shop_name")
+    list_filter = (
+        "payment_date",
+        ("layby__shop_name", CachedAllValuesFieldListFilter),
+    )
     search_fields = (
         "layby__shop_name",
-        "layby__user__username",
+        "layby__user__name",
         "layby__user__email",
     )
     readonly_fields = ("layby_details",)
     date_hierarchy = "payment_date"
+    list_select_related = ("layby__user",)
 
     def user_name(self, obj):
         return obj.layby.user.get_full_name()
@@ -71,36 +76,40 @@ class PaymentAdmin(admin.ModelAdmin):
 
     layby_details.short_description = "Layby Details"
 
+    def get_readonly_fields(self, request, obj=None):
+        # update_payment only rewrites the amount, so a payment cannot be moved
+        # to another layby once posted.
+        if obj is not None:
+            return (*self.readonly_fields, "layby")
+        return self.readonly_fields
+
     def save_model(self, request, obj, form, change):
-        if not change:  # This is a new payment being created
-            layby = obj.layby
-            amount = obj.amount
-
-            # Check if the new payment would exceed the total cost of the layby
-            total_paid = Payment.objects.filter(layby=layby).aggregate(
-                total=Sum("amount"),
-            )["total"] or Decimal("0.00")
-            if total_paid + amount > layby.total_cost:
-                remaining = layby.total_cost - total_paid
-                self.message_user(
-                    request,
-                    f"Payment of {amount} exceeds the remaining balance of {remaining}. "
-                    f"The maximum allowed payment is {remaining}.",
-                    level=messages.ERROR,
-                )
-                return  # Stop the save process
-
-        # Save the payment
-        super().save_model(request, obj, form, change)
-
-        if not change:  # Only for new payments
-            # Check if the sum of all payments equals the total cost
-            new_total_paid = Payment.objects.filter(layby=layby).aggregate(
-                total=Sum("amount"),
-            )["total"] or Decimal("0.00")
-            if new_total_paid == layby.total_cost:
-                layby.is_complete = True
-                layby.save()
+        if change:
+            PaymentService.update_payment(obj)
+            return
+
+        layby = obj.layby
+        amount = obj.amount
+
+        # Check if the new payment would exceed the total cost of the layby
+        if amount > layby.remaining_balance:
+            self.message_user(
+                request,
+                f"Payment of {amount} exceeds the remaining balance of "
+                f"{layby.remaining_balance}. "
+                f"The maximum allowed payment is {layby.remaining_balance}.",
+                level=messages.ERROR,
+            )
+            return  # Stop the save process
+
+        PaymentService.record_payment(obj)
+
+    def delete_model(self, request, obj):
+        PaymentService.delete_payment(obj)
+
+    def delete_queryset(self, request, queryset):
+        for payment in queryset.select_related("layby"):
+            PaymentService.delete_payment(payment)
 
     def response_add(self, request, obj, post_url_continue=None):
         if obj.layby.is_complete:
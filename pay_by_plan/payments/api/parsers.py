@@ -0,0 +1,42 @@
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class CSVParser(BaseParser):
+    """Parse a CSV document with a header row into a list of row dicts."""
+
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            text = stream.read().decode(encoding) if stream else ""
+        except UnicodeDecodeError as e:
+            msg = f"CSV parse error - {e}"
+            raise ParseError(msg) from e
+        return list(csv.DictReader(text.splitlines()))
+
+
+class JSONLinesParser(BaseParser):
+    """Parse a JSON lines document (one JSON object per line) into a list."""
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        rows = []
+        if not stream:
+            return rows
+        for line_number, line in enumerate(stream.read().splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line.decode(encoding)))
+            except (UnicodeDecodeError, ValueError) as e:
+                msg = f"JSON parse error on line {line_number} - {e}"
+                raise ParseError(msg) from e
+        return rows
@@ -1,4 +1,5 @@
 from laybys.api.serializers import LaybySerializer
+from laybys.api.serializers import LaybySummarySerializer
 from laybys.models import Layby
 from payments.models import Payment
 from rest_framework import serializers
@@ -24,6 +25,16 @@ class PaymentSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "payment_date"]
 
 
+class PaymentListSerializer(serializers.ModelSerializer):
+    """Compact payment serializer for list views."""
+
+    layby = LaybySummarySerializer(read_only=True)
+
+    class Meta:
+        model = Payment
+        fields = ["id", "layby", "amount", "payment_date"]
+
+
 class PaymentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
@@ -1,13 +1,26 @@
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 from laybys.models import Layby
+from payments.services import EXPORT_COLUMNS
 from payments.services import PaymentService
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from pay_by_plan.payments.api.serializers import PaymentListSerializer
 from pay_by_plan.payments.api.serializers import PaymentSerializer
+from pay_by_plan.utils.export import ExportQuerySerializer
+from pay_by_plan.utils.export import stream_export
+from pay_by_plan.utils.pagination import PaymentCursorPagination
+
+from .parsers import CSVParser
+from .parsers import JSONLinesParser
 
 
 @extend_schema(tags=["payments"])
@@ -19,11 +32,17 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
     permission_classes = [IsAuthenticated]
     serializer_class = PaymentSerializer
+    pagination_class = PaymentCursorPagination
 
     def get_queryset(self):
         """Get payments for the current user."""
         return PaymentService.get_payments_for_user(self.request.user)
 
+    def get_serializer_class(self):
+        if self.action in ["list", "layby_payments", "recent"]:
+            return PaymentListSerializer
+        return PaymentSerializer
+
     def retrieve(self, request, pk=None):
         """Retrieve a specific payment."""
         payment = PaymentService.get_payment(pk)
@@ -68,14 +87,44 @@ class PaymentViewSet(viewsets.ModelViewSet):
         PaymentService.delete_payment(payment)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        parser_classes=[CSVParser, JSONLinesParser, JSONParser],
+        permission_classes=[IsAdminUser],
+    )
+    def bulk(self, request):
+        """
+        Import a batch of payments from CSV, JSON lines or a JSON array, for staff.
+
+        Each row needs a layby_id and an amount. Valid rows are posted and
+        invalid rows are reported by row number.
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {"detail": "Expected a list of payment rows."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result = PaymentService.bulk_create_payments(request.data)
+        return Response(
+            {"created": len(result["created"]), "errors": result["errors"]},
+            status=status.HTTP_201_CREATED
+            if result["created"]
+            else status.HTTP_400_BAD_REQUEST,
+        )
+
     @action(detail=False, methods=["get"])
     def layby_payments(self, request):
         """Get payments for a specific layby."""
-        layby_id = request.query_params.get("layby_id")
-        layby = Layby.objects.get(id=layby_id)
-        payments = PaymentService.get_layby_payments(layby)
+        layby = get_object_or_404(
+            Layby,
+            id=request.query_params.get("layby_id"),
+            user=request.user,
+        )
+        payments = self.paginate_queryset(PaymentService.get_layby_payments(layby))
         serializer = self.get_serializer(payments, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=["get"])
     def summary(self, request):
@@ -89,6 +138,28 @@ class PaymentViewSet(viewsets.ModelViewSet):
     def recent(self, request):
         """Get recent payments."""
         days = int(request.query_params.get("days", 30))
-        payments = PaymentService.get_recent_payments(days)
+        start_date = timezone.now() - timezone.timedelta(days=days)
+        payments = self.paginate_queryset(
+            self.get_queryset().filter(payment_date__gte=start_date),
+        )
         serializer = self.get_serializer(payments, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        parameters=[ExportQuerySerializer],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Stream every payment as CSV or NDJSON for reconciliation, for staff.
+        """
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        export_format = params.validated_data.pop("export_format")
+        return stream_export(
+            "payments",
+            tuple(EXPORT_COLUMNS),
+            PaymentService.get_payments_for_export(**params.validated_data),
+            export_format,
+        )
@@ -0,0 +1,115 @@
+"""
+Benchmarks for the payment posting paths.
+
+These are not collected by the regular test run. Run them explicitly with output
+enabled, optionally overriding the number of payment rows posted and exported:
+
+    $ BENCHMARK_ROWS=5000 BENCHMARK_EXPORT_ROWS=1000000 \
+        pytest pay_by_plan/payments/benchmarks.py -s
+"""
+
+import os
+import time
+import tracemalloc
+from decimal import Decimal
+
+from laybys.models import Layby
+from payments.models import Payment
+from payments.services import EXPORT_COLUMNS
+from payments.services import PaymentService
+
+from pay_by_plan.utils.export import EXPORT_FORMATS
+from pay_by_plan.utils.export import stream_export
+
+ROWS = int(os.environ.get("BENCHMARK_ROWS", "2000"))
+EXPORT_ROWS = int(os.environ.get("BENCHMARK_EXPORT_ROWS", "200000"))
+ROWS_PER_LAYBY = 10
+
+
+def _create_laybys(user, count):
+    template = Layby.objects.create(
+        user=user,
+        shop_name="Benchmark",
+        item_description="Benchmark item",
+        total_cost=Decimal("100000.00"),
+        expected_end_date="2099-01-01",
+    )
+    Layby.objects.bulk_create(
+        Layby(
+            user=user,
+            shop_name=template.shop_name,
+            item_description=template.item_description,
+            total_cost=template.total_cost,
+            expected_end_date=template.expected_end_date,
+        )
+        for _ in range(count - 1)
+    )
+    return list(Layby.objects.filter(user=user).values_list("pk", flat=True))
+
+
+def _report(label, rows, elapsed):
+    rate = rows / elapsed
+    print(f"{label:<10} {rows:>7} rows in {elapsed:7.3f}s {rate:10.0f} rows/sec")  # noqa: T201
+    return rate
+
+
+def test_bulk_import_against_per_row_posting(user):
+    layby_ids = _create_laybys(user, max(ROWS // ROWS_PER_LAYBY, 1))
+    rows = [
+        {"layby_id": layby_ids[i % len(layby_ids)], "amount": "1.00"}
+        for i in range(ROWS)
+    ]
+
+    start = time.perf_counter()
+    for row in rows:
+        layby = Layby.objects.get(id=row["layby_id"])
+        PaymentService.create_payment(layby, Decimal(row["amount"]))
+    per_row_rate = _report("per-row", ROWS, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    result = PaymentService.bulk_create_payments(rows)
+    bulk_rate = _report("bulk", ROWS, time.perf_counter() - start)
+
+    print(f"speedup    {bulk_rate / per_row_rate:.1f}x")  # noqa: T201
+    assert not result["errors"]
+    assert Payment.objects.count() == 2 * ROWS
+
+
+def _export(export_format):
+    response = stream_export(
+        "payments",
+        tuple(EXPORT_COLUMNS),
+        PaymentService.get_payments_for_export(),
+        export_format,
+    )
+    return sum(len(chunk) for chunk in response.streaming_content)
+
+
+def test_export_memory_stays_flat(user):
+    layby_ids = _create_laybys(user, 100)
+    created = 0
+    for rows in (EXPORT_ROWS // 4, EXPORT_ROWS):
+        Payment.objects.bulk_create(
+            (
+                Payment(layby_id=layby_ids[i % len(layby_ids)], amount=Decimal("1.00"))
+                for i in range(created, rows)
+            ),
+            batch_size=5000,
+        )
+        created = rows
+
+        for export_format in EXPORT_FORMATS:
+            start = time.perf_counter()
+            size = _export(export_format)
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            _export(export_format)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(  # noqa: T201
+                f"{export_format:<8} {rows:>8} rows {size / 2**20:7.1f} MiB "
+                f"in {elapsed:6.2f}s {rows / elapsed:9.0f} rows/sec "
+                f"peak {peak / 2**20:6.1f} MiB",
+            )
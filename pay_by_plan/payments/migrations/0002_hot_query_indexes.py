@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laybys', '0007_hot_query_indexes'),
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['layby', '-payment_date'], name='payment_layby_date_idx'),
+        ),
+    ]
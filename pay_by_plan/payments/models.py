@@ -27,6 +27,13 @@ class Payment(models.Model):
         verbose_name = _("Payment")
         verbose_name_plural = _("Payments")
         ordering = ["-payment_date"]
+        indexes = [
+            models.Index(
+                fields=["layby", "-payment_date"],
+                name="payment_layby_date_idx",
+            ),
+            models.Index(fields=["-payment_date"], name="payment_date_idx"),
+        ]
 
     def __str__(self):
         return f"{self.layby} - ${self.amount} on {self.payment_date.date()}"
@@ -35,7 +42,7 @@ class Payment(models.Model):
         if self.amount <= 0:
             raise ValidationError(_("Payment amount must be a positive number."))
 
-        if self.amount > self.layby.total_cost - self.layby.get_total_payments():
+        if self.amount > self.layby.remaining_balance:
             raise ValidationError(
                 _("Payment amount exceeds the remaining balance of the layby."),
             )
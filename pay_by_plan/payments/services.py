@@ -1,47 +1,268 @@
+from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
 from decimal import Decimal
 
+from dashboard.cache import DashboardCache
+from dashboard.rollups import ShopRollup
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Max
 from django.db.models import QuerySet
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from laybys.models import Layby
+from laybys.services import LaybyService
 from payments.models import Payment
 
+BULK_BATCH_SIZE = 1000
+
+# Columns of the payment export and the lookups they are read from.
+EXPORT_COLUMNS = {
+    "id": "pk",
+    "layby_id": "layby_id",
+    "shop_name": "layby__shop_name",
+    "user_email": "layby__user__email",
+    "amount": "amount",
+    "payment_date": "payment_date",
+}
+
 
 class PaymentService:
     @staticmethod
     def create_payment(layby: Layby, amount: Decimal) -> Payment:
-        payment = Payment(layby=layby, amount=amount)
-        payment.full_clean()
-        payment.save()
+        return PaymentService.record_payment(Payment(layby=layby, amount=amount))
+
+    @staticmethod
+    def record_payment(payment: Payment) -> Payment:
+        """
+        Post a payment against its layby.
 
-        if layby.get_total_payments() == layby.total_cost:
-            layby.mark_as_complete()
-            layby.save()
+        The layby row is locked for the rest of the transaction, so the balance the
+        payment is validated against cannot change before it is written. Posting
+        costs five statements: the locking SELECT, the payment INSERT, an UPDATE
+        of the layby totals and completion flag, an UPDATE allocating the payment
+        to the layby's installments and an upsert of the shop rollup. A payment
+        that completes the layby adds a sixth, the INSERT of its completion email
+        into the outbox.
+        """
+        with transaction.atomic():
+            payment.layby = PaymentService._lock_layby(payment.layby_id)
+            payment.full_clean(exclude=["layby"])
+            payment.save()
+            PaymentService._apply_to_layby(
+                payment.layby,
+                amount=payment.amount,
+                paid_at=payment.payment_date,
+                count=1,
+                last_payment_at=payment.payment_date,
+            )
 
         return payment
 
+    @staticmethod
+    def bulk_create_payments(rows: list[dict]) -> dict:
+        """
+        Post a batch of payments, such as a shop's end-of-day payment file.
+
+        Every referenced layby is locked and loaded in one query and each row is
+        validated in memory against the running balance. The valid payments are
+        inserted with bulk_create, the layby totals are written back with
+        bulk_update and the shop rollups are updated with one upsert. Invalid rows
+        are skipped and reported by their 1-based number.
+        """
+        errors = []
+        parsed = []
+        for row_number, row in enumerate(rows, start=1):
+            try:
+                parsed.append((row_number, *PaymentService._parse_payment_row(row)))
+            except ValidationError as e:
+                errors.append({"row": row_number, "errors": e.messages})
+
+        payments = []
+        completed = []
+        with transaction.atomic():
+            # The rows are locked in primary key order, like the rollup upsert
+            # orders its rows, so concurrent imports and single payments on the
+            # same laybys wait for each other instead of deadlocking.
+            laybys = {
+                layby.pk: layby
+                for layby in Layby.objects.select_for_update()
+                .filter(pk__in={layby_id for _, layby_id, _ in parsed})
+                .order_by("pk")
+            }
+            for row_number, layby_id, amount in parsed:
+                if layby_id not in laybys:
+                    errors.append(
+                        {"row": row_number, "errors": [_("Layby does not exist.")]},
+                    )
+                    continue
+
+                payment = Payment(layby=laybys[layby_id], amount=amount)
+                try:
+                    payment.clean()
+                except ValidationError as e:
+                    errors.append({"row": row_number, "errors": e.messages})
+                    continue
+
+                layby = payment.layby
+                layby.amount_paid += amount
+                layby.remaining_balance = layby.total_cost - layby.amount_paid
+                layby.payment_count += 1
+                if layby.remaining_balance == 0 and not layby.is_complete:
+                    layby.is_complete = True
+                    completed.append(layby)
+                payments.append(payment)
+
+            Payment.objects.bulk_create(payments, batch_size=BULK_BATCH_SIZE)
+
+            touched = {}
+            for payment in payments:
+                payment.layby.last_payment_at = payment.payment_date
+                payment.layby.updated_at = payment.payment_date
+                touched[payment.layby_id] = payment.layby
+            Layby.objects.bulk_update(
+                touched.values(),
+                [
+                    "amount_paid",
+                    "payment_count",
+                    "last_payment_at",
+                    "is_complete",
+                    "updated_at",
+                ],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            if touched:
+                LaybyService.allocate_installments(touched.keys())
+            ShopRollup.record(ShopRollup.batch_rows(payments, completed))
+            DashboardCache.invalidate_users(layby.user_id for layby in touched.values())
+            if completed:
+                LaybyService.on_laybys_completed(completed)
+
+        errors.sort(key=lambda error: error["row"])
+        return {"created": payments, "errors": errors}
+
+    @staticmethod
+    def _parse_payment_row(row: dict) -> tuple[int, Decimal]:
+        """
+        Convert a raw import row into a layby id and amount using the model fields.
+        """
+        if not isinstance(row, dict):
+            raise ValidationError(_("Row must be an object."))
+        layby_id = row.get("layby_id")
+        if layby_id in (None, ""):
+            raise ValidationError(_("layby_id is required."))
+        return (
+            Payment.layby.field.to_python(layby_id),
+            Payment.amount.field.clean(row.get("amount"), None),
+        )
+
     @staticmethod
     def get_payment(payment_id: int) -> Payment:
-        return get_object_or_404(Payment, id=payment_id)
+        return get_object_or_404(Payment.objects.select_related("layby"), id=payment_id)
 
     @staticmethod
     def get_layby_payments(layby: Layby) -> QuerySet[Payment]:
-        return Payment.objects.filter(layby=layby)
+        return Payment.objects.filter(layby=layby).select_related("layby")
 
     @staticmethod
     def update_payment(payment: Payment, amount: Decimal | None = None) -> Payment:
-        if amount is not None:
-            payment.amount = amount
-        payment.save()
+        with transaction.atomic():
+            layby = PaymentService._lock_layby(payment.layby_id)
+            previous_amount = Payment.objects.values_list("amount", flat=True).get(
+                pk=payment.pk,
+            )
+            if amount is not None:
+                payment.amount = amount
+
+            if payment.amount <= 0:
+                raise ValidationError(_("Payment amount must be a positive number."))
+            if payment.amount - previous_amount > layby.remaining_balance:
+                raise ValidationError(
+                    _("Payment amount exceeds the remaining balance of the layby."),
+                )
+
+            payment.layby = layby
+            payment.save(update_fields=["amount"])
+            PaymentService._apply_to_layby(
+                layby,
+                amount=payment.amount - previous_amount,
+                paid_at=payment.payment_date,
+            )
         return payment
 
     @staticmethod
     def delete_payment(payment: Payment) -> None:
-        payment.delete()
+        with transaction.atomic():
+            layby = PaymentService._lock_layby(payment.layby_id)
+            payment.delete()
+            PaymentService._apply_to_layby(
+                layby,
+                amount=-payment.amount,
+                paid_at=payment.payment_date,
+                count=-1,
+                last_payment_at=Payment.objects.filter(layby=layby).aggregate(
+                    latest=Max("payment_date"),
+                )["latest"],
+            )
+            DashboardCache.invalidate(layby.user_id)
+
+    @staticmethod
+    def _lock_layby(layby_id: int) -> Layby:
+        """
+        Fetch a layby with its row locked until the surrounding transaction ends.
+        """
+        return Layby.objects.select_for_update().get(pk=layby_id)
+
+    @staticmethod
+    def _apply_to_layby(
+        layby: Layby,
+        amount: Decimal,
+        paid_at,
+        count: int = 0,
+        last_payment_at=None,
+    ) -> None:
+        """
+        Adjust the denormalized payment totals of a locked layby in one UPDATE.
+
+        The layby is marked complete in the same statement once its balance reaches
+        zero, which queues its completion email, and reopened if an edited or
+        deleted payment leaves a balance again. The in-memory instance is updated
+        to match the stored row. The new total is then allocated to the
+        layby's installments, and the change is booked in the shop rollup of the
+        day the payment was made.
+        """
+        rollups = ShopRollup.payment_rows(layby.shop_name, paid_at, amount, count)
+        rollups += ShopRollup.completion_rows(layby, sign=-1)
+        layby.amount_paid += amount
+        layby.remaining_balance = layby.total_cost - layby.amount_paid
+        layby.payment_count += count
+        changes = {
+            "amount_paid": F("amount_paid") + amount,
+            "payment_count": F("payment_count") + count,
+        }
+        if count:
+            layby.last_payment_at = last_payment_at
+            changes["last_payment_at"] = last_payment_at
+        is_complete = layby.remaining_balance == 0
+        completed = is_complete and not layby.is_complete
+        if is_complete != layby.is_complete:
+            layby.is_complete = is_complete
+            layby.updated_at = timezone.now()
+            changes["is_complete"] = is_complete
+            changes["updated_at"] = layby.updated_at
+        Layby.objects.filter(pk=layby.pk).update(**changes)
+        LaybyService.allocate_installments([layby.pk])
+        ShopRollup.record(rollups + ShopRollup.completion_rows(layby))
+        if completed:
+            LaybyService.on_laybys_completed([layby])
 
     @staticmethod
     def get_total_paid(layby: Layby) -> Decimal:
-        return sum(payment.amount for payment in layby.payments.all())
+        return layby.amount_paid
 
     @staticmethod
     def get_recent_payments(days: int = 30) -> QuerySet[Payment]:
@@ -50,19 +271,48 @@ class PaymentService:
 
     @staticmethod
     def get_payments_for_user(user) -> QuerySet[Payment]:
-        return Payment.objects.filter(layby__user=user).order_by("-payment_date")
+        return (
+            Payment.objects.filter(layby__user=user)
+            .select_related("layby")
+            .order_by("-payment_date")
+        )
 
     @staticmethod
     def get_payment_summary(layby: Layby) -> dict:
-        total_paid = PaymentService.get_total_paid(layby)
-        remaining_balance = layby.total_cost - total_paid
         return {
             "layby_id": layby.id,
             "total_cost": layby.total_cost,
-            "total_paid": total_paid,
-            "remaining_balance": remaining_balance,
+            "total_paid": PaymentService.get_total_paid(layby),
+            "remaining_balance": layby.remaining_balance,
         }
 
+    @staticmethod
+    def get_payments_for_export(
+        shop_name: str | None = None,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> QuerySet:
+        """
+        Return the payments to export as tuples of EXPORT_COLUMNS, oldest first.
+
+        The start and end dates are inclusive and compared as bounds on the
+        payment date itself, so the payment date index can serve the range.
+        """
+        payments = Payment.objects.all()
+        if shop_name:
+            payments = payments.filter(layby__shop_name=shop_name)
+        if start:
+            start_at = timezone.make_aware(datetime.combine(start, time.min))
+            payments = payments.filter(payment_date__gte=start_at)
+        if end:
+            end_at = timezone.make_aware(
+                datetime.combine(end + timedelta(days=1), time.min),
+            )
+            payments = payments.filter(payment_date__lt=end_at)
+        return payments.order_by("payment_date", "pk").values_list(
+            *EXPORT_COLUMNS.values(),
+        )
+
     @staticmethod
     def get_payments(layby_id: int | None = None) -> QuerySet[Payment]:
         if layby_id:
@@ -1,3 +1,525 @@
-from django.test import TestCase
+import csv
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from dashboard.models import ShopDailyRollup
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from laybys.models import Layby
+from payments.models import Payment
+from payments.services import PaymentService
+from rest_framework import status
+
+from pay_by_plan.users.tests.factories import UserFactory
+
+
+def create_laybys(user, count):
+    return Layby.objects.bulk_create(
+        Layby(
+            user=user,
+            shop_name=f"Shop {i}",
+            item_description="Item",
+            total_cost=Decimal("100.00"),
+            expected_end_date="2099-01-01",
+        )
+        for i in range(count)
+    )
+
+
+class TestPaymentTotals:
+    def test_create_payment_updates_layby_totals(self, layby):
+        payment = PaymentService.create_payment(layby, Decimal("250.00"))
+
+        layby.refresh_from_db()
+        assert layby.amount_paid == Decimal("250.00")
+        assert layby.remaining_balance == Decimal("750.00")
+        assert layby.payment_count == 1
+        assert layby.last_payment_at == payment.payment_date
+        assert not layby.is_complete
+
+    def test_final_payment_completes_layby(self, layby):
+        PaymentService.create_payment(layby, Decimal("400.00"))
+        PaymentService.create_payment(layby, Decimal("600.00"))
+
+        layby.refresh_from_db()
+        assert layby.remaining_balance == 0
+        assert layby.payment_count == 2  # noqa: PLR2004
+        assert layby.is_complete
+
+    def test_overpayment_is_rejected(self, layby):
+        PaymentService.create_payment(layby, Decimal("900.00"))
+
+        with pytest.raises(ValidationError):
+            PaymentService.create_payment(layby, Decimal("100.01"))
+
+        layby.refresh_from_db()
+        assert layby.amount_paid == Decimal("900.00")
+
+    def test_update_payment_applies_difference(self, layby):
+        payment = PaymentService.create_payment(layby, Decimal("300.00"))
+
+        PaymentService.update_payment(payment, Decimal("200.00"))
+
+        layby.refresh_from_db()
+        assert layby.amount_paid == Decimal("200.00")
+        assert layby.payment_count == 1
+
+    def test_delete_payment_reverts_totals(self, layby):
+        first = PaymentService.create_payment(layby, Decimal("100.00"))
+        second = PaymentService.create_payment(layby, Decimal("50.00"))
+
+        PaymentService.delete_payment(second)
+
+        layby.refresh_from_db()
+        assert layby.amount_paid == Decimal("100.00")
+        assert layby.payment_count == 1
+        assert layby.last_payment_at == first.payment_date
+
+    def test_deleting_a_payment_reopens_a_completed_layby(self, layby):
+        PaymentService.create_payment(layby, Decimal("600.00"))
+        last = PaymentService.create_payment(layby, Decimal("400.00"))
+        assert last.layby.is_complete
+
+        PaymentService.delete_payment(last)
+
+        layby.refresh_from_db()
+        assert not layby.is_complete
+        assert not ShopDailyRollup.objects.filter(completed_laybys__gt=0).exists()
+
+        PaymentService.create_payment(layby, Decimal("400.00"))
+
+        layby.refresh_from_db()
+        assert layby.is_complete
+        assert ShopDailyRollup.objects.get().completed_laybys == 1
+
+    def test_layby_save_does_not_overwrite_totals(self, layby):
+        stale = type(layby).objects.get(pk=layby.pk)
+        PaymentService.create_payment(layby, Decimal("100.00"))
+
+        stale.shop_name = "Makro"
+        stale.save()
+
+        layby.refresh_from_db()
+        assert layby.shop_name == "Makro"
+        assert layby.amount_paid == Decimal("100.00")
+
+
+class TestPaymentPosting:
+    def test_posting_uses_fixed_query_budget(self, layby, django_assert_num_queries):
+        # The five statements of record_payment between SAVEPOINT and RELEASE:
+        # SELECT ... FOR UPDATE, INSERT, UPDATE of the layby, UPDATE of its
+        # installments and upsert of the shop rollup.
+        with django_assert_num_queries(7):
+            PaymentService.create_payment(layby, Decimal("400.00"))
+
+        layby.refresh_from_db()
+        assert not layby.is_complete
+
+    def test_completing_payment_adds_only_the_outbox_insert(
+        self,
+        layby,
+        django_assert_num_queries,
+    ):
+        # As above, plus the INSERT of the completion email into the outbox.
+        with django_assert_num_queries(8):
+            PaymentService.create_payment(layby, Decimal("1000.00"))
+
+        layby.refresh_from_db()
+        assert layby.is_complete
+
+    def test_update_rejects_amount_above_remaining_balance(self, layby):
+        payment = PaymentService.create_payment(layby, Decimal("600.00"))
+        PaymentService.create_payment(layby, Decimal("300.00"))
+
+        with pytest.raises(ValidationError):
+            PaymentService.update_payment(payment, Decimal("700.01"))
+
+        payment.refresh_from_db()
+        assert payment.amount == Decimal("600.00")
+
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_payments_never_overpay(self, layby):
+        workers = 8
+        barrier = threading.Barrier(workers)
+        rejected = []
+
+        def pay():
+            try:
+                barrier.wait()
+                PaymentService.create_payment(
+                    Layby(pk=layby.pk),
+                    Decimal("300.00"),
+                )
+            except ValidationError:
+                rejected.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        layby.refresh_from_db()
+        assert Payment.objects.filter(layby=layby).count() == 3  # noqa: PLR2004
+        assert len(rejected) == workers - 3
+        assert layby.amount_paid == Decimal("900.00")
+        assert layby.payment_count == 3  # noqa: PLR2004
+
+
+class TestBulkPayments:
+    def test_bulk_create_posts_valid_rows_and_reports_errors(self, layby):
+        result = PaymentService.bulk_create_payments(
+            [
+                {"layby_id": layby.pk, "amount": "600.00"},
+                {"layby_id": layby.pk, "amount": "500.00"},
+                {"layby_id": layby.pk, "amount": "-1"},
+                {"layby_id": 0, "amount": "10.00"},
+                {"layby_id": layby.pk, "amount": "400.00"},
+            ],
+        )
+
+        assert len(result["created"]) == 2  # noqa: PLR2004
+        assert [error["row"] for error in result["errors"]] == [2, 3, 4]
+        layby.refresh_from_db()
+        assert layby.amount_paid == Decimal("1000.00")
+        assert layby.payment_count == 2  # noqa: PLR2004
+        assert layby.is_complete
+        assert layby.last_payment_at == result["created"][-1].payment_date
+
+    def test_bulk_create_uses_fixed_query_budget(
+        self,
+        user,
+        layby,
+        django_assert_num_queries,
+    ):
+        other = Layby.objects.create(
+            user=user,
+            shop_name="Makro",
+            item_description="Television",
+            total_cost=Decimal("500.00"),
+            expected_end_date=layby.expected_end_date,
+        )
+        rows = [
+            {"layby_id": pk, "amount": "1.00"}
+            for pk in (layby.pk, other.pk)
+            for _ in range(50)
+        ]
+
+        # SAVEPOINT, SELECT ... FOR UPDATE, INSERT, UPDATE of the laybys, UPDATE of
+        # their installments, upsert of the shop rollups, RELEASE SAVEPOINT
+        with django_assert_num_queries(7):
+            PaymentService.bulk_create_payments(rows)
+
+        assert Payment.objects.count() == len(rows)
+
+    def test_bulk_create_locks_laybys_in_primary_key_order(
+        self,
+        user,
+        django_assert_num_queries,
+    ):
+        laybys = create_laybys(user, 3)
+        rows = [{"layby_id": layby.pk, "amount": "1.00"} for layby in reversed(laybys)]
+
+        with django_assert_num_queries(7) as captured:
+            PaymentService.bulk_create_payments(rows)
+
+        lock = next(
+            query["sql"]
+            for query in captured.captured_queries
+            if query["sql"].endswith("FOR UPDATE")
+        )
+        assert 'ORDER BY "laybys_layby"."id" ASC' in lock
+
+    @pytest.fixture
+    def staff_client(self, user, api_client):
+        user.is_staff = True
+        user.save()
+        return api_client
+
+    def test_bulk_endpoint_is_for_staff_only(self, api_client):
+        foreign = create_laybys(UserFactory(), 1)[0]
+
+        response = api_client.post(
+            reverse("api:payment-bulk"),
+            data=f"layby_id,amount\n{foreign.pk},100.00\n",
+            content_type="text/csv",
+        )
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert not Payment.objects.exists()
+
+    def test_bulk_endpoint_accepts_csv(self, staff_client, layby):
+        response = staff_client.post(
+            reverse("api:payment-bulk"),
+            data=f"layby_id,amount\n{layby.pk},100.00\n{layby.pk},abc\n",
+            content_type="text/csv",
+        )
+
+        assert response.status_code == 201  # noqa: PLR2004
+        assert response.data["created"] == 1
+        assert response.data["errors"][0]["row"] == 2  # noqa: PLR2004
+
+    def test_bulk_endpoint_accepts_json_lines(self, staff_client, layby):
+        response = staff_client.post(
+            reverse("api:payment-bulk"),
+            data=(
+                f'{{"layby_id": {layby.pk}, "amount": "100.00"}}\n'
+                f'{{"layby_id": {layby.pk}, "amount": "50.00"}}\n'
+            ),
+            content_type="application/x-ndjson",
+        )
+
+        assert response.status_code == 201  # noqa: PLR2004
+        assert response.data == {"created": 2, "errors": []}
+
+
+class TestPaymentListing:
+    def test_list_is_cursor_paginated_with_compact_layby(self, api_client, layby):
+        payments = [
+            PaymentService.create_payment(layby, Decimal("10.00")) for _ in range(5)
+        ]
+
+        first = api_client.get(reverse("api:payment-list"), {"page_size": 3}).data
+        second = api_client.get(first["next"]).data
+
+        assert [p["id"] for p in first["results"] + second["results"]] == [
+            payment.pk for payment in reversed(payments)
+        ]
+        assert second["next"] is None
+        assert first["results"][0]["layby"] == {"id": layby.pk, "shop_name": "Game"}
+
+    def test_recent_only_lists_own_payments(self, api_client, layby):
+        own = PaymentService.create_payment(layby, Decimal("10.00"))
+        other_layby = Layby.objects.create(
+            user=UserFactory(),
+            shop_name="Makro",
+            item_description="Television",
+            total_cost=Decimal("500.00"),
+            expected_end_date=layby.expected_end_date,
+        )
+        PaymentService.create_payment(other_layby, Decimal("10.00"))
+
+        response = api_client.get(reverse("api:payment-recent"))
+
+        assert [p["id"] for p in response.data["results"]] == [own.pk]
+
+    def test_layby_payments_rejects_other_users_layby(self, api_client, layby):
+        other_layby = Layby.objects.create(
+            user=UserFactory(),
+            shop_name="Makro",
+            item_description="Television",
+            total_cost=Decimal("500.00"),
+            expected_end_date=layby.expected_end_date,
+        )
+
+        response = api_client.get(
+            reverse("api:payment-layby-payments"),
+            {"layby_id": other_layby.pk},
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_endpoints_run_a_fixed_number_of_queries(
+        self,
+        user,
+        layby,
+        assert_query_budget,
+    ):
+        laybys = [layby, *create_laybys(user, 2)]
+        for each in laybys:
+            for _ in range(3):
+                PaymentService.create_payment(each, Decimal("10.00"))
+
+        assert_query_budget(reverse("api:payment-list"), 3)
+        assert_query_budget(reverse("api:payment-recent"), 3)
+        assert_query_budget(
+            reverse("api:payment-layby-payments"),
+            4,
+            {"layby_id": layby.pk},
+        )
+
+
+class TestPaymentExport:
+    @pytest.fixture
+    def payments(self, user, layby):
+        user.is_staff = True
+        user.save()
+        other_layby = Layby.objects.create(
+            user=UserFactory(),
+            shop_name="Makro",
+            item_description="Television",
+            total_cost=Decimal("500.00"),
+            expected_end_date=layby.expected_end_date,
+        )
+        old = PaymentService.create_payment(layby, Decimal("10.00"))
+        Payment.objects.filter(pk=old.pk).update(
+            payment_date=timezone.now() - timedelta(days=40),
+        )
+        return [
+            old,
+            PaymentService.create_payment(layby, Decimal("20.00")),
+            PaymentService.create_payment(other_layby, Decimal("30.00")),
+        ]
+
+    def _export(self, api_client, **params):
+        response = api_client.get(reverse("api:payment-export"), params)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_streams_rows_without_model_instances(
+        self,
+        api_client,
+        payments,
+        monkeypatch,
+    ):
+        def from_db(*args, **kwargs):
+            pytest.fail("The export must not instantiate payments.")
+
+        monkeypatch.setattr(Payment, "from_db", classmethod(from_db))
+
+        rows = list(csv.reader(self._export(api_client).splitlines()))
+
+        assert rows[0] == [
+            "id",
+            "layby_id",
+            "shop_name",
+            "user_email",
+            "amount",
+            "payment_date",
+        ]
+        assert [row[0] for row in rows[1:]] == [str(p.pk) for p in payments]
+        assert rows[1][2:5] == ["Game", payments[0].layby.user.email, "10.00"]
+
+    def test_ndjson_filters_by_shop_and_date_range(self, api_client, payments):
+        today = timezone.now().date()
+        content = self._export(
+            api_client,
+            export_format="ndjson",
+            shop_name="Game",
+            start=today - timedelta(days=7),
+            end=today,
+        )
+
+        rows = [json.loads(line) for line in content.splitlines()]
+
+        assert [row["id"] for row in rows] == [payments[1].pk]
+        assert rows[0]["amount"] == "20.00"
+        assert rows[0]["shop_name"] == "Game"
+
+    def test_export_is_for_staff_only(self, api_client, layby):
+        response = api_client.get(reverse("api:payment-export"))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_export_validates_params(self, user, api_client):
+        user.is_staff = True
+        user.save()
+
+        response = api_client.get(
+            reverse("api:payment-export"),
+            {"export_format": "xlsx"},
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestQueryPlans:
+    def test_layby_payments_use_the_layby_date_index(
+        self,
+        user,
+        layby,
+        assert_uses_index,
+    ):
+        Payment.objects.bulk_create(
+            Payment(layby=other, amount=Decimal("1.00"))
+            for other in create_laybys(user, 50)
+            for _ in range(10)
+        )
+
+        assert_uses_index(
+            PaymentService.get_layby_payments(layby),
+            "payment_layby_date_idx",
+        )
+
+
+class TestPaymentAdmin:
+    @pytest.fixture(autouse=True)
+    def _clear_cache(self):
+        cache.clear()
+
+    def test_changelist_renders_100_rows_in_fixed_queries(
+        self,
+        admin_client,
+        django_assert_num_queries,
+    ):
+        for layby in create_laybys(UserFactory(), 100):
+            PaymentService.create_payment(layby, Decimal("10.00"))
+        today = timezone.localdate()
+
+        with django_assert_num_queries(8):
+            response = admin_client.get(
+                reverse("admin:payments_payment_changelist"),
+                {"payment_date__year": today.year, "payment_date__month": today.month},
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.context["cl"].result_list) == 100  # noqa: PLR2004
+
+    def test_change_form_cannot_move_a_payment(self, admin_client, layby):
+        payment = PaymentService.create_payment(layby, Decimal("100.00"))
+        other = create_laybys(layby.user, 1)[0]
+
+        response = admin_client.post(
+            reverse("admin:payments_payment_change", args=[payment.pk]),
+            {"layby": other.pk, "amount": "150.00"},
+        )
+
+        assert response.status_code == status.HTTP_302_FOUND
+        payment.refresh_from_db()
+        assert payment.layby_id == layby.pk
+        assert payment.amount == Decimal("150.00")
+        assert Layby.objects.get(pk=other.pk).amount_paid == Decimal("0.00")
+
+    def test_changelist_opens_on_the_current_month(self, admin_client):
+        today = timezone.localdate()
+
+        response = admin_client.get(reverse("admin:payments_payment_changelist"))
+
+        assert response.status_code == status.HTTP_302_FOUND
+        assert f"payment_date__year={today.year}" in response.url
+        assert f"payment_date__month={today.month}" in response.url
+
+    @pytest.mark.parametrize("params", [{"q": "Game"}, {"all_dates": "1"}])
+    def test_search_and_all_dates_cover_every_date(self, admin_client, layby, params):
+        payment = PaymentService.create_payment(layby, Decimal("10.00"))
+        Payment.objects.filter(pk=payment.pk).update(
+            payment_date=timezone.now() - timedelta(days=400),
+        )
+
+        response = admin_client.get(
+            reverse("admin:payments_payment_changelist"),
+            params,
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.context["cl"].result_list) == [payment]
+
+    def test_exact_count_is_kept_in_the_links(self, admin_client):
+        response = admin_client.get(
+            reverse("admin:payments_payment_changelist"),
+            {"all_dates": "1", "exact_count": "1"},
+        )
+
+        cl = response.context["cl"]
+        assert response.status_code == status.HTTP_200_OK
+        assert "exact_count=1" in cl.get_query_string({"p": 2})
+        assert cl.paginator.exact
@@ -1,8 +1,17 @@
 from django.contrib import admin
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path
+from django.urls import reverse
+from django.utils.html import format_html
 from reminders.services import NotificationService
 
 from .models import Notification
 from .models import Reminder
+from .models import ReminderPreference
+from .models import ReminderSendJob
 
 
 class NotificationInline(admin.TabularInline):
@@ -24,21 +33,65 @@ class ReminderAdmin(admin.ModelAdmin):
     )
     list_filter = ("frequency", "next_reminder_date", "is_active")
     search_fields = ("layby__shop_name", "layby__user__email")
+    list_select_related = ("layby",)
     inlines = [NotificationInline]
     actions = ["send_reminder_notifications"]
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                notified=Exists(Notification.objects.filter(reminder=OuterRef("pk"))),
+            )
+        )
+
     def has_notifications(self, obj):
-        return obj.notifications.exists()
+        return obj.notified
 
     has_notifications.short_description = "Has Notifications"
+    has_notifications.boolean = True
+    has_notifications.admin_order_field = "notified"
+
+    def get_urls(self):
+        return [
+            path(
+                "send-jobs/<int:job_id>/",
+                self.admin_site.admin_view(self.send_job_progress_view),
+                name="reminders_reminder_send_job",
+            ),
+            *super().get_urls(),
+        ]
+
+    def send_job_progress_view(self, request, job_id):
+        """
+        Report a send job's progress as JSON, for the job's admin page to poll.
+        """
+        if not self.has_view_permission(request):
+            return JsonResponse({}, status=403)
+        job = get_object_or_404(ReminderSendJob, pk=job_id)
+        return JsonResponse(job.get_progress())
 
     def send_reminder_notifications(self, request, queryset):
         """
         Custom admin action to send reminders manually from the admin interface.
+
+        The reminders are sent in the background and the action returns at once
+        with a link to the job's page, which polls its progress.
         """
-        for reminder in queryset:
-            NotificationService.send_reminder_notification(reminder)
-        self.message_user(request, f"{queryset.count()} reminders processed.")
+        job = NotificationService.start_send_job(
+            list(queryset.order_by("pk").values_list("pk", flat=True)),
+            requested_by=request.user,
+        )
+        self.message_user(
+            request,
+            format_html(
+                'Sending {} reminders in the background. <a href="{}">Job {}</a>',
+                job.total,
+                reverse("admin:reminders_remindersendjob_change", args=[job.pk]),
+                job.pk,
+            ),
+        )
 
     send_reminder_notifications.short_description = "Send reminder notifications"
 
@@ -48,9 +101,49 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ("reminder", "sent_at", "is_sent")
     list_filter = ("is_sent", "sent_at")
     search_fields = ("reminder__layby__shop_name", "reminder__layby__user__email")
+    list_select_related = ("reminder__layby",)
     readonly_fields = ("sent_at", "is_sent")  # Remove 'reminder' from readonly_fields
 
     def get_readonly_fields(self, request, obj=None):
         if obj:  # Editing an existing object
             return (*self.readonly_fields, "reminder")
         return self.readonly_fields  # Creating a new object
+
+
+@admin.register(ReminderPreference)
+class ReminderPreferenceAdmin(admin.ModelAdmin):
+    list_display = ("user", "digest")
+    list_filter = ("digest",)
+    search_fields = ("user__email",)
+    list_select_related = ("user",)
+
+
+@admin.register(ReminderSendJob)
+class ReminderSendJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "requested_by",
+        "total",
+        "processed",
+        "sent",
+        "created_at",
+        "finished_at",
+    )
+    list_select_related = ("requested_by",)
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
+
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        job = self.get_object(request, object_id)
+        if job is not None:
+            extra_context = {
+                **(extra_context or {}),
+                "progress": job.get_progress(),
+                "progress_url": reverse(
+                    "admin:reminders_reminder_send_job",
+                    args=[job.pk],
+                ),
+            }
+        return super().change_view(request, object_id, form_url, extra_context)
@@ -1,5 +1,6 @@
 from reminders.models import Notification
 from reminders.models import Reminder
+from reminders.models import ReminderPreference
 from rest_framework import serializers
 
 
@@ -21,8 +22,15 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = ["id", "sent_at", "is_sent"]
 
 
+class ReminderPreferenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReminderPreference
+        fields = ["digest"]
+
+
 class ReminderSerializer(serializers.ModelSerializer):
-    notifications_count = serializers.SerializerMethodField()
+    # Annotated onto the queryset by ReminderViewSet.
+    notifications_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Reminder
@@ -34,6 +42,3 @@ class ReminderSerializer(serializers.ModelSerializer):
             "is_active",
             "notifications_count",
         ]
-
-    def get_notifications_count(self, obj):
-        return obj.notifications.count()
@@ -1,16 +1,26 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema
 from reminders.models import Notification
 from reminders.models import Reminder
+from reminders.models import ReminderPreference
 from reminders.tasks import process_reminders_manual
+from reminders.tasks import send_reminder
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from pay_by_plan.utils.pagination import NotificationCursorPagination
+from pay_by_plan.utils.pagination import ReminderCursorPagination
+
 from .serializers import NotificationSerializer
 from .serializers import ReminderCreateSerializer
+from .serializers import ReminderPreferenceSerializer
 from .serializers import ReminderSerializer
 from .serializers import ReminderUpdateSerializer
 
@@ -22,10 +32,13 @@ class ReminderViewSet(viewsets.ModelViewSet):
     """
 
     permission_classes = [IsAuthenticated]
+    pagination_class = ReminderCursorPagination
 
     def get_queryset(self):
         # Filter reminders based on user's laybys
-        return Reminder.objects.filter(layby__user=self.request.user)
+        return Reminder.objects.filter(layby__user=self.request.user).annotate(
+            notifications_count=Count("notifications"),
+        )
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -46,20 +59,43 @@ class ReminderViewSet(viewsets.ModelViewSet):
     def notification_history(self, request, pk=None):
         """Get notification history for a specific reminder."""
         reminder = self.get_object()
-        notifications = reminder.notifications.order_by("-sent_at")
+        paginator = NotificationCursorPagination()
+        notifications = paginator.paginate_queryset(
+            reminder.notifications.all(),
+            request,
+            view=self,
+        )
         serializer = NotificationSerializer(notifications, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=["get"])
     def upcoming(self, request):
         """Get upcoming reminders for the next 7 days."""
         end_date = timezone.now().date() + timezone.timedelta(days=7)
-        reminders = (
-            self.get_queryset()
-            .filter(next_reminder_date__lte=end_date, is_active=True)
-            .order_by("next_reminder_date")
+        reminders = self.paginate_queryset(
+            self.get_queryset().filter(
+                next_reminder_date__lte=end_date,
+                is_active=True,
+            ),
         )
         serializer = self.get_serializer(reminders, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(request=ReminderPreferenceSerializer)
+    @action(detail=False, methods=["get", "patch"])
+    def preferences(self, request):
+        """Get or update the user's reminder preferences."""
+        preference, _ = ReminderPreference.objects.get_or_create(user=request.user)
+        if request.method == "GET":
+            return Response(ReminderPreferenceSerializer(preference).data)
+
+        serializer = ReminderPreferenceSerializer(
+            preference,
+            data=request.data,
+            partial=True,
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
         return Response(serializer.data)
 
     @action(detail=False, methods=["post"])
@@ -73,16 +109,21 @@ class ReminderViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"])
     def send_now(self, request, pk=None):
-        """Immediately send a reminder regardless of schedule."""
-        self.get_object()
-        try:
-            process_reminders_manual()
-            return Response({"status": "Reminder sent successfully"})
-        except Exception as e:
+        """Send a reminder in the background regardless of schedule."""
+        reminder = self.get_object()
+        if reminder.notifications.filter(
+            period=timezone.now().date(),
+            is_sent=True,
+        ).exists():
             return Response(
-                {"error": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                {"status": "Reminder already sent today"},
+                status=status.HTTP_409_CONFLICT,
             )
+        transaction.on_commit(partial(send_reminder, reminder.pk))
+        return Response(
+            {"status": "Reminder scheduled for sending"},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
     @action(detail=True, methods=["post"])
     def reset_schedule(self, request, pk=None):
@@ -101,6 +142,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
 
     permission_classes = [IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = NotificationCursorPagination
 
     def get_queryset(self):
         return Notification.objects.filter(
@@ -111,6 +153,8 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     def recent(self, request):
         """Get recent notifications (last 30 days)."""
         thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-        notifications = self.get_queryset().filter(sent_at__gte=thirty_days_ago)
+        notifications = self.paginate_queryset(
+            self.get_queryset().filter(sent_at__gte=thirty_days_ago),
+        )
         serializer = self.get_serializer(notifications, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,136 @@
+"""
+Benchmarks for reminder processing.
+
+These are not collected by the regular test run. Run them explicitly with output
+enabled, optionally overriding the number of due reminders and of rendered emails:
+
+    $ BENCHMARK_REMINDERS=100000 BENCHMARK_RENDERS=20000 \
+        pytest pay_by_plan/reminders/benchmarks.py -s
+"""
+
+import os
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from laybys.models import Layby
+from reminders.mailer import ReminderMailer
+from reminders.models import Notification
+from reminders.models import Reminder
+from reminders.services import NotificationService
+from reminders.services import ReminderService
+
+REMINDERS = int(os.environ.get("BENCHMARK_REMINDERS", "10000"))
+RENDERS = int(os.environ.get("BENCHMARK_RENDERS", "5000"))
+
+
+def legacy_process_due_reminders():
+    """The original one-reminder-at-a-time loop, kept for comparison."""
+    for reminder in ReminderService.get_due_reminders():
+        NotificationService.send_reminder_notification(reminder)
+        ReminderService.update_next_reminder_date(reminder)
+
+
+def legacy_build_layby_reminder(user, layby):
+    """The original renderer: render the HTML, then strip its tags for the text."""
+    html_content = render_to_string(
+        "reminders/layby_reminder.html",
+        {"user": user, "layby": layby},
+    )
+    email = EmailMultiAlternatives(
+        ReminderMailer.SUBJECT,
+        strip_tags(html_content),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+    email.attach_alternative(html_content, "text/html")
+    return email
+
+
+def _reset(today):
+    Reminder.objects.update(next_reminder_date=today)
+    Notification.objects.all().delete()
+    mail.outbox = []
+
+
+def _report(label, elapsed):
+    rate = REMINDERS / elapsed
+    print(f"{label:<10} {REMINDERS} reminders in {elapsed:8.2f}s {rate:8.0f}/sec")  # noqa: T201
+    return rate
+
+
+def test_pipeline_against_legacy_loop(user, settings):
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    today = timezone.now().date()
+    laybys = Layby.objects.bulk_create(
+        (
+            Layby(
+                user=user,
+                shop_name=f"Shop {i}",
+                item_description="Benchmark item",
+                total_cost=Decimal("1000.00"),
+                expected_end_date="2099-01-01",
+            )
+            for i in range(REMINDERS)
+        ),
+        batch_size=5000,
+    )
+    Reminder.objects.bulk_create(
+        (
+            Reminder(layby=layby, frequency="weekly", next_reminder_date=today)
+            for layby in laybys
+        ),
+        batch_size=5000,
+    )
+
+    _reset(today)
+    start = time.perf_counter()
+    legacy_process_due_reminders()
+    legacy_rate = _report("legacy", time.perf_counter() - start)
+    assert len(mail.outbox) == REMINDERS
+
+    _reset(today)
+    start = time.perf_counter()
+    ReminderService.process_due_reminders()
+    pipeline_rate = _report("pipeline", time.perf_counter() - start)
+    assert len(mail.outbox) == REMINDERS
+
+    print(f"speedup    {pipeline_rate / legacy_rate:.1f}x")  # noqa: T201
+
+
+def test_batch_rendering_against_strip_tags(user):
+    Layby.objects.bulk_create(
+        (
+            Layby(
+                user=user,
+                shop_name=f"Shop {i}",
+                item_description="Benchmark item",
+                total_cost=Decimal("1000.00"),
+                expected_end_date="2099-01-01",
+            )
+            for i in range(RENDERS)
+        ),
+        batch_size=5000,
+    )
+    recipients = [(layby.user, layby) for layby in Layby.objects.select_related("user")]
+
+    start = time.perf_counter()
+    for recipient, layby in recipients:
+        legacy_build_layby_reminder(recipient, layby)
+    elapsed = time.perf_counter() - start
+    legacy_rate = RENDERS / elapsed
+    print(f"strip_tags {RENDERS} emails in {elapsed:8.2f}s {legacy_rate:8.0f}/sec")  # noqa: T201
+
+    start = time.perf_counter()
+    messages = ReminderMailer.build_layby_reminders(recipients)
+    elapsed = time.perf_counter() - start
+    batch_rate = RENDERS / elapsed
+    print(f"batch      {RENDERS} emails in {elapsed:8.2f}s {batch_rate:8.0f}/sec")  # noqa: T201
+    assert len(messages) == RENDERS
+
+    print(f"speedup    {batch_rate / legacy_rate:.1f}x")  # noqa: T201
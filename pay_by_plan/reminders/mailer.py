@@ -1,24 +1,120 @@
+from collections.abc import Iterable
+
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.template import Context
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.formats import localize
 
 
 class ReminderMailer:
+    SUBJECT = "Reminder for Your Layby Payment"
+    TEMPLATE = "reminders/layby_reminder"
+    DIGEST_SUBJECT = "Reminder for Your Layby Payments"
+    DIGEST_TEMPLATE = "reminders/layby_digest"
+
     @staticmethod
-    def send_layby_reminder(user, layby):
-        subject = "Reminder for Your Layby Payment"
-        html_content = render_to_string(
-            "reminders/layby_reminder.html",
-            {"user": user, "layby": layby},
+    def get_shared_context() -> dict:
+        """
+        Context shared by every reminder in a batch, formatted once.
+        """
+        return {
+            "today": localize(timezone.now().date()),
+            "support_email": settings.DEFAULT_FROM_EMAIL,
+        }
+
+    @staticmethod
+    def get_layby_context(layby) -> dict:
+        """
+        Context for one layby, with its values formatted once for both parts.
+        """
+        return {
+            "layby": layby,
+            "total_cost": localize(layby.total_cost),
+            "remaining_balance": localize(layby.remaining_balance),
+            "expected_end_date": localize(layby.expected_end_date),
+        }
+
+    @classmethod
+    def build_layby_reminders(
+        cls,
+        recipients: Iterable[tuple],
+    ) -> list[EmailMultiAlternatives]:
+        """
+        Render the reminder emails for many (user, layby) pairs.
+        """
+        return cls._build_messages(
+            cls.SUBJECT,
+            cls.TEMPLATE,
+            (
+                (user, {"user": user, **cls.get_layby_context(layby)})
+                for user, layby in recipients
+            ),
         )
-        text_content = strip_tags(html_content)
 
-        email = EmailMultiAlternatives(
-            subject,
-            text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[user.email],
+    @classmethod
+    def build_layby_digests(
+        cls,
+        recipients: Iterable[tuple],
+    ) -> list[EmailMultiAlternatives]:
+        """
+        Render one digest email for each (user, laybys) pair.
+        """
+        return cls._build_messages(
+            cls.DIGEST_SUBJECT,
+            cls.DIGEST_TEMPLATE,
+            (
+                (
+                    user,
+                    {
+                        "user": user,
+                        "laybys": [cls.get_layby_context(layby) for layby in laybys],
+                    },
+                )
+                for user, laybys in recipients
+            ),
         )
-        email.attach_alternative(html_content, "text/html")
-        email.send()
+
+    @classmethod
+    def build_layby_reminder(cls, user, layby) -> EmailMultiAlternatives:
+        return cls.build_layby_reminders([(user, layby)])[0]
+
+    @staticmethod
+    def send_layby_reminder(user, layby):
+        ReminderMailer.build_layby_reminder(user, layby).send()
+
+    @classmethod
+    def _build_messages(
+        cls,
+        subject: str,
+        template_name: str,
+        recipients: Iterable[tuple],
+    ) -> list[EmailMultiAlternatives]:
+        """
+        Render a batch of emails from (user, context) pairs.
+
+        The text and HTML templates are loaded and compiled once for the whole
+        batch and rendered against a single shared context, with only each
+        message's own context pushed on top of it. The plain-text part comes from
+        its own template rather than from stripping the tags out of the HTML.
+        """
+        text_template = get_template(f"{template_name}.txt").template
+        html_template = get_template(f"{template_name}.html").template
+        context = Context(cls.get_shared_context())
+
+        messages = []
+        for user, message_context in recipients:
+            with context.push(message_context):
+                text_content = text_template.render(context)
+                html_content = html_template.render(context)
+
+            email = EmailMultiAlternatives(
+                subject,
+                text_content,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[user.email],
+            )
+            email.attach_alternative(html_content, "text/html")
+            messages.append(email)
+        return messages
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.8 on 2026-10-18 06:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('laybys', '0003_alter_layby_start_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('biweekly', 'Bi-weekly'), ('monthly', 'Monthly')], max_length=10, verbose_name='Frequency')),
+                ('next_reminder_date', models.DateField(verbose_name='Next reminder date')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is active')),
+                ('layby', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reminder', to='laybys.layby', verbose_name='Layby')),
+            ],
+            options={
+                'verbose_name': 'Reminder',
+                'verbose_name_plural': 'Reminders',
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sent_at', models.DateTimeField(auto_now_add=True, verbose_name='Sent At')),
+                ('is_sent', models.BooleanField(default=False, verbose_name='Is Sent')),
+                ('reminder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='reminders.reminder')),
+            ],
+            options={
+                'verbose_name': 'Notification',
+                'verbose_name_plural': 'Notifications',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.8 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laybys', '0004_layby_payment_totals'),
+        ('reminders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='period',
+            field=models.DateField(blank=True, help_text='Reminder date this notification was sent for', null=True, verbose_name='Period'),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_reminder_date'], name='reminder_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('reminder', 'period'), name='unique_notification_per_period'),
+        ),
+    ]
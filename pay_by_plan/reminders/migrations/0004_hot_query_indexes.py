@@ -0,0 +1,17 @@
+# Generated by Django 5.0.8 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0003_reminderpreference'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['reminder', '-sent_at'], name='notification_history_idx'),
+        ),
+    ]
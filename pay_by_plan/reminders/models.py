@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from laybys.models import Layby
@@ -28,6 +29,13 @@ class Reminder(models.Model):
     class Meta:
         verbose_name = _("Reminder")
         verbose_name_plural = _("Reminders")
+        indexes = [
+            models.Index(
+                fields=["next_reminder_date"],
+                condition=models.Q(is_active=True),
+                name="reminder_due_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Reminder for {self.layby} - {self.get_frequency_display()}"
@@ -45,10 +53,88 @@ class Notification(models.Model):
     )
     sent_at = models.DateTimeField(_("Sent At"), auto_now_add=True)
     is_sent = models.BooleanField(_("Is Sent"), default=False)
+    period = models.DateField(
+        _("Period"),
+        null=True,
+        blank=True,
+        help_text=_("Reminder date this notification was sent for"),
+    )
 
     class Meta:
         verbose_name = _("Notification")
         verbose_name_plural = _("Notifications")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["reminder", "period"],
+                name="unique_notification_per_period",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["reminder", "-sent_at"],
+                name="notification_history_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Email notification for {self.reminder}"
+
+
+class ReminderPreference(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="reminder_preference",
+        verbose_name=_("User"),
+    )
+    digest = models.BooleanField(
+        _("Digest"),
+        default=False,
+        help_text=_("Send all of the user's due reminders in one email"),
+    )
+
+    class Meta:
+        verbose_name = _("Reminder preference")
+        verbose_name_plural = _("Reminder preferences")
+
+    def __str__(self):
+        return f"Reminder preference for {self.user}"
+
+
+class ReminderSendJob(models.Model):
+    """
+    Progress of reminders sent in the background from the admin.
+
+    The selected reminders are split into chunks, each sent by its own task,
+    which adds to the counters when it finishes.
+    """
+
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name=_("Requested by"),
+    )
+    total = models.PositiveIntegerField(_("Total"))
+    processed = models.PositiveIntegerField(_("Processed"), default=0)
+    sent = models.PositiveIntegerField(_("Sent"), default=0)
+    created_at = models.DateTimeField(_("Created at"), auto_now_add=True)
+    finished_at = models.DateTimeField(_("Finished at"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Reminder send job")
+        verbose_name_plural = _("Reminder send jobs")
+
+    def __str__(self):
+        return f"Sending {self.total} reminders ({self.processed} processed)"
+
+    def get_progress(self) -> dict:
+        return {
+            "id": self.pk,
+            "total": self.total,
+            "processed": self.processed,
+            "sent": self.sent,
+            "finished": self.finished_at is not None,
+        }
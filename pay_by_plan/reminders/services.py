@@ -1,41 +1,216 @@
 import logging
+from collections import defaultdict
+from functools import partial
 from smtplib import SMTPException
 
+from dashboard.cache import DashboardCache
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import When
 from django.utils import timezone
 
+from pay_by_plan.utils.mail import send_mass_messages
+
 from .mailer import ReminderMailer
 from .models import Notification
 from .models import Reminder
+from .models import ReminderPreference
+from .models import ReminderSendJob
 
 logger = logging.getLogger(__name__)
 
+REMINDER_CHUNK_SIZE = 500
+SEND_JOB_CHUNK_SIZE = 500
+
+FREQUENCY_INTERVALS = {
+    "daily": timezone.timedelta(days=1),
+    "weekly": timezone.timedelta(weeks=1),
+    "biweekly": timezone.timedelta(weeks=2),
+    "monthly": timezone.timedelta(days=30),
+}
+
+
+REMINDER_RELATED = ("layby__user__reminder_preference",)
+
 
 class ReminderService:
+    @staticmethod
+    def wants_digest(user) -> bool:
+        try:
+            return user.reminder_preference.digest
+        except ReminderPreference.DoesNotExist:
+            return False
+
     @staticmethod
     def get_due_reminders():
         return Reminder.objects.filter(
-            next_reminder_date=timezone.now().date(),
+            next_reminder_date__lte=timezone.now().date(),
             is_active=True,
         )
 
+    @staticmethod
+    def get_current_period(reminder, today):
+        """
+        Return the latest scheduled reminder date on or before today.
+
+        Reminders whose run was missed have several periods due at once; they are
+        collapsed into the most recent one so a backlog sends a single email.
+        """
+        interval = FREQUENCY_INTERVALS[reminder.frequency]
+        missed = (today - reminder.next_reminder_date) // interval
+        return reminder.next_reminder_date + max(missed, 0) * interval
+
+    @staticmethod
+    def get_next_reminder_date(reminder, today=None):
+        today = today or timezone.now().date()
+        period = ReminderService.get_current_period(reminder, today)
+        return period + FREQUENCY_INTERVALS[reminder.frequency]
+
     @staticmethod
     def update_next_reminder_date(reminder):
-        if reminder.frequency == "daily":
-            reminder.next_reminder_date += timezone.timedelta(days=1)
-        elif reminder.frequency == "weekly":
-            reminder.next_reminder_date += timezone.timedelta(weeks=1)
-        elif reminder.frequency == "biweekly":
-            reminder.next_reminder_date += timezone.timedelta(weeks=2)
-        elif reminder.frequency == "monthly":
-            reminder.next_reminder_date += timezone.timedelta(days=30)
+        reminder.next_reminder_date = ReminderService.get_next_reminder_date(reminder)
         reminder.save()
 
     @staticmethod
-    def process_due_reminders():
-        due_reminders = ReminderService.get_due_reminders()
-        for reminder in due_reminders:
-            NotificationService.send_reminder_notification(reminder)
-            ReminderService.update_next_reminder_date(reminder)
+    def get_due_reminder_ranges(chunk_size: int) -> list[tuple[int, int]]:
+        """
+        Split the due reminders into primary key ranges of chunk_size reminders.
+
+        Returns:
+            list[tuple[int, int]]: Inclusive (first_pk, last_pk) ranges
+        """
+        pks = list(
+            ReminderService.get_due_reminders()
+            .order_by("pk")
+            .values_list("pk", flat=True),
+        )
+        return [
+            (pks[start], pks[min(start + chunk_size, len(pks)) - 1])
+            for start in range(0, len(pks), chunk_size)
+        ]
+
+    @staticmethod
+    def process_due_reminders(
+        chunk_size: int = REMINDER_CHUNK_SIZE,
+        first_pk: int | None = None,
+        last_pk: int | None = None,
+    ) -> int:
+        """
+        Send every due reminder, one chunk of reminders at a time.
+
+        Each chunk is claimed with SELECT ... FOR UPDATE SKIP LOCKED and loaded
+        with its laybys, users and their reminder preferences in one query, so
+        concurrent runs split the backlog between them instead of sending it
+        twice. Its emails are sent over a single mail connection, its
+        notifications are written with one bulk_create and its schedules advanced
+        with one bulk_update before the claim is released. Chunks are walked by
+        primary key, so reminders advanced out of the due set do not shift the
+        remaining ones. Passing first_pk and last_pk restricts the run to that
+        inclusive primary key range.
+
+        Returns:
+            int: The number of reminders processed
+        """
+        due_reminders = (
+            ReminderService.get_due_reminders()
+            .select_related(*REMINDER_RELATED)
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("pk")
+        )
+        if first_pk is not None:
+            due_reminders = due_reminders.filter(pk__gte=first_pk)
+        if last_pk is not None:
+            due_reminders = due_reminders.filter(pk__lte=last_pk)
+
+        processed = 0
+        cursor = 0
+        while True:
+            with transaction.atomic():
+                chunk = list(due_reminders.filter(pk__gt=cursor)[:chunk_size])
+                if not chunk:
+                    break
+                processed += ReminderService.process_reminder_chunk(chunk)
+            cursor = chunk[-1].pk
+        return processed
+
+    @staticmethod
+    def process_reminder_chunk(reminders: list[Reminder]) -> int:
+        """
+        Send, record and reschedule a chunk of reminders loaded with their users.
+
+        Users who opted into the digest have the rest of their due reminders
+        claimed into the chunk, so all of them go out in one email. Every
+        notification is keyed by its reminder and period, and reminders that
+        already have a notification for their current period are rescheduled
+        without being sent again.
+
+        Returns:
+            int: The number of reminders processed
+        """
+        reminders = reminders + ReminderService.get_digest_reminders(reminders)
+        today = timezone.now().date()
+        periods = {
+            reminder.pk: ReminderService.get_current_period(reminder, today)
+            for reminder in reminders
+        }
+        already_sent = set(
+            Notification.objects.filter(
+                reminder__in=reminders,
+                period__in=set(periods.values()),
+            ).values_list("reminder_id", "period"),
+        )
+        pending = [
+            reminder
+            for reminder in reminders
+            if (reminder.pk, periods[reminder.pk]) not in already_sent
+        ]
+        sent = NotificationService.send_reminder_emails(pending)
+
+        with transaction.atomic(savepoint=False):
+            Notification.objects.bulk_create(
+                (
+                    Notification(
+                        reminder=reminder,
+                        period=periods[reminder.pk],
+                        is_sent=is_sent,
+                    )
+                    for reminder, is_sent in zip(pending, sent, strict=True)
+                ),
+                ignore_conflicts=True,
+            )
+            for reminder in reminders:
+                reminder.next_reminder_date = (
+                    periods[reminder.pk] + FREQUENCY_INTERVALS[reminder.frequency]
+                )
+            Reminder.objects.bulk_update(reminders, ["next_reminder_date"])
+            DashboardCache.invalidate_users(
+                reminder.layby.user_id for reminder in reminders
+            )
+        return len(reminders)
+
+    @staticmethod
+    def get_digest_reminders(reminders: list[Reminder]) -> list[Reminder]:
+        """
+        Claim the other due reminders of the digest users in a chunk.
+        """
+        digest_user_ids = {
+            reminder.layby.user_id
+            for reminder in reminders
+            if ReminderService.wants_digest(reminder.layby.user)
+        }
+        if not digest_user_ids:
+            return []
+        return list(
+            ReminderService.get_due_reminders()
+            .filter(layby__user_id__in=digest_user_ids)
+            .exclude(pk__in=[reminder.pk for reminder in reminders])
+            .select_related(*REMINDER_RELATED)
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("pk"),
+        )
 
 
 class NotificationService:
@@ -44,8 +219,24 @@ class NotificationService:
         return Notification.objects.create(reminder=reminder)
 
     @staticmethod
-    def send_reminder_notification(reminder: Reminder):
-        notification = NotificationService.create_notification(reminder)
+    def _update_notification(notification: Notification) -> None:
+        notification.is_sent = True
+        notification.save(update_fields=["is_sent"])
+
+    @staticmethod
+    def send_reminder_notification(reminder: Reminder) -> bool:
+        """
+        Send a reminder immediately, at most once per reminder per day.
+
+        Returns:
+            bool: True if an email was sent
+        """
+        notification, created = Notification.objects.get_or_create(
+            reminder=reminder,
+            period=timezone.now().date(),
+        )
+        if not created and notification.is_sent:
+            return False
 
         try:
             ReminderMailer.send_layby_reminder(reminder.layby.user, reminder.layby)
@@ -57,3 +248,146 @@ class NotificationService:
             logger.exception(
                 f"Error sending email notification for reminder {reminder.id}: {e}",
             )
+            return False
+        return True
+
+    @staticmethod
+    def send_reminder_emails(reminders: list[Reminder]) -> list[bool]:
+        """
+        Render and send the emails for a batch of reminders over one connection.
+
+        Reminders of users who opted into the digest are grouped into one email
+        per user; everyone else gets one email per reminder.
+
+        Returns:
+            list[bool]: Whether each reminder's email was sent, in order
+        """
+        singles = []
+        digests = defaultdict(list)
+        for reminder in reminders:
+            if ReminderService.wants_digest(reminder.layby.user):
+                digests[reminder.layby.user_id].append(reminder)
+            else:
+                singles.append(reminder)
+
+        messages = ReminderMailer.build_layby_reminders(
+            (reminder.layby.user, reminder.layby) for reminder in singles
+        ) + ReminderMailer.build_layby_digests(
+            (group[0].layby.user, [reminder.layby for reminder in group])
+            for group in digests.values()
+        )
+        groups = [[reminder] for reminder in singles] + list(digests.values())
+        results = send_mass_messages(messages)
+        logger.info(
+            "Sent %d of %d reminder emails for %d reminders",
+            sum(results),
+            len(results),
+            len(reminders),
+        )
+
+        sent = {
+            reminder.pk: is_sent
+            for group, is_sent in zip(groups, results, strict=True)
+            for reminder in group
+        }
+        return [sent[reminder.pk] for reminder in reminders]
+
+    @staticmethod
+    def send_reminder_notifications(reminder_ids: list[int]) -> int:
+        """
+        Send a batch of reminders immediately, at most once per reminder per day.
+
+        The reminders are loaded with their users in one query and their emails
+        sent over one connection. Today's notifications are then written with one
+        upsert, so a reminder whose email failed earlier today is marked sent
+        once it goes through.
+
+        Returns:
+            int: The number of reminders sent
+        """
+        today = timezone.now().date()
+        reminders = list(
+            Reminder.objects.filter(pk__in=reminder_ids)
+            .exclude(
+                Exists(
+                    Notification.objects.filter(
+                        reminder=OuterRef("pk"),
+                        period=today,
+                        is_sent=True,
+                    ),
+                ),
+            )
+            .select_related(*REMINDER_RELATED),
+        )
+        sent = NotificationService.send_reminder_emails(reminders)
+
+        Notification.objects.bulk_create(
+            [
+                Notification(reminder=reminder, period=today, is_sent=is_sent)
+                for reminder, is_sent in zip(reminders, sent, strict=True)
+            ],
+            update_conflicts=True,
+            unique_fields=["reminder", "period"],
+            update_fields=["is_sent"],
+        )
+        DashboardCache.invalidate_users(
+            reminder.layby.user_id for reminder in reminders
+        )
+        return sum(sent)
+
+    @staticmethod
+    def start_send_job(
+        reminder_ids: list[int],
+        requested_by=None,
+        chunk_size: int = SEND_JOB_CHUNK_SIZE,
+    ) -> ReminderSendJob:
+        """
+        Send reminders in the background, one task per chunk of reminders.
+
+        The tasks are enqueued once the job has committed. Each one adds to the
+        job's counters as it finishes, so the job shows the progress.
+        """
+        job = ReminderSendJob.objects.create(
+            total=len(reminder_ids),
+            requested_by=requested_by,
+        )
+        for start in range(0, len(reminder_ids), chunk_size):
+            transaction.on_commit(
+                partial(
+                    NotificationService._enqueue_send_chunk,
+                    job.pk,
+                    reminder_ids[start : start + chunk_size],
+                ),
+            )
+        return job
+
+    @staticmethod
+    def _enqueue_send_chunk(job_id: int, reminder_ids: list[int]) -> None:
+        # reminders.tasks imports this module, so the task is looked up lazily.
+        from reminders.tasks import send_reminder_chunk  # noqa: PLC0415
+
+        send_reminder_chunk(job_id, reminder_ids)
+
+    @staticmethod
+    def process_send_chunk(job_id: int, reminder_ids: list[int]) -> int:
+        """
+        Send one chunk of a send job and record its progress.
+
+        The counters are advanced with a single UPDATE, which also marks the job
+        finished once every reminder has been processed, so chunks finishing at
+        the same time cannot lose each other's progress.
+
+        Returns:
+            int: The number of reminders sent
+        """
+        sent = NotificationService.send_reminder_notifications(reminder_ids)
+        processed = F("processed") + len(reminder_ids)
+        ReminderSendJob.objects.filter(pk=job_id).update(
+            processed=processed,
+            sent=F("sent") + sent,
+            finished_at=Case(
+                When(total__lte=processed, then=timezone.now()),
+                default=F("finished_at"),
+            ),
+        )
+        return sent
@@ -1,15 +1,77 @@
+import logging
+
 from huey import crontab
+from huey.contrib.djhuey import HUEY
 from huey.contrib.djhuey import periodic_task
 from huey.contrib.djhuey import task
 
+from .services import NotificationService
 from .services import ReminderService
 
+logger = logging.getLogger(__name__)
+
+REMINDER_TASK_CHUNK_SIZE = 1000
+REMINDER_TASK_ATTEMPTS = 3
+REMINDER_TASK_RETRY_DELAY = 60
+
 
 @periodic_task(crontab(minute="0", hour="0"))  # Run daily at midnight
 def process_due_reminders():
-    ReminderService.process_due_reminders()
+    return fan_out_due_reminders()
 
 
 @task()
 def process_reminders_manual():
-    ReminderService.process_due_reminders()
+    return fan_out_due_reminders()
+
+
+@task()
+def send_reminder_chunk(job_id, reminder_ids):
+    return NotificationService.process_send_chunk(job_id, reminder_ids)
+
+
+@task()
+def send_reminder(reminder_id):
+    return NotificationService.send_reminder_notifications([reminder_id])
+
+
+@task()
+def process_reminder_range(first_pk, last_pk):
+    return ReminderService.process_due_reminders(first_pk=first_pk, last_pk=last_pk)
+
+
+@task()
+def report_failed_reminder_range(first_pk, last_pk, exception):
+    logger.error(
+        "Reminder chunk (%s, %s) failed on its last attempt: %s",
+        first_pk,
+        last_pk,
+        exception,
+    )
+
+
+def fan_out_due_reminders(
+    chunk_size: int = REMINDER_TASK_CHUNK_SIZE,
+    attempts: int = REMINDER_TASK_ATTEMPTS,
+    retry_delay: int = REMINDER_TASK_RETRY_DELAY,
+) -> dict:
+    """
+    Split the due reminders into primary key ranges and enqueue a subtask for each.
+
+    The subtasks run in parallel across the consumer's workers and nothing waits
+    for them, so the calling task frees its worker straight away. A range whose
+    task raises is re-enqueued by the consumer after `retry_delay` seconds, up to
+    `attempts` runs in all, and is reported by report_failed_reminder_range once
+    it has run out of attempts. Successful ranges are never repeated.
+    """
+    ranges = ReminderService.get_due_reminder_ranges(chunk_size)
+    for first_pk, last_pk in ranges:
+        HUEY.enqueue(
+            process_reminder_range.s(
+                first_pk,
+                last_pk,
+                retries=attempts - 1,
+                retry_delay=retry_delay,
+            ).error(report_failed_reminder_range.s(first_pk, last_pk)),
+        )
+    return {"chunks": len(ranges)}
@@ -1,3 +1,445 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from django.core import mail
+from django.urls import reverse
+from django.utils import timezone
+from laybys.models import Layby
+from reminders.mailer import ReminderMailer
+from reminders.models import Notification
+from reminders.models import Reminder
+from reminders.models import ReminderPreference
+from reminders.models import ReminderSendJob
+from reminders.services import NotificationService
+from reminders.services import ReminderService
+from reminders.tasks import fan_out_due_reminders
+from rest_framework import status
+
+from pay_by_plan.users.models import User
+from pay_by_plan.users.tests.factories import UserFactory
+from pay_by_plan.utils.testing import REJECTED
+from pay_by_plan.utils.testing import REJECTING_BACKEND
+
+
+def create_reminders(user, count, next_reminder_date=None, frequency="weekly"):
+    laybys = Layby.objects.bulk_create(
+        Layby(
+            user=user,
+            shop_name=f"Shop {i}",
+            item_description="Item",
+            total_cost=Decimal("100.00"),
+            expected_end_date=timezone.now().date() + timedelta(days=90),
+        )
+        for i in range(count)
+    )
+    return Reminder.objects.bulk_create(
+        Reminder(
+            layby=layby,
+            frequency=frequency,
+            next_reminder_date=next_reminder_date or timezone.now().date(),
+        )
+        for layby in laybys
+    )
+
+
+class TestProcessDueReminders:
+    def test_due_reminders_are_sent_recorded_and_advanced(self, user):
+        today = timezone.now().date()
+        due = create_reminders(user, 5)
+        later = create_reminders(user, 2, next_reminder_date=today + timedelta(days=3))
+
+        processed = ReminderService.process_due_reminders(chunk_size=2)
+
+        assert processed == len(due)
+        assert len(mail.outbox) == len(due)
+        assert mail.outbox[0].to == [user.email]
+        assert Notification.objects.filter(is_sent=True).count() == len(due)
+        assert set(
+            Reminder.objects.filter(pk__in=[r.pk for r in due]).values_list(
+                "next_reminder_date",
+                flat=True,
+            ),
+        ) == {today + timedelta(weeks=1)}
+        assert not Notification.objects.filter(reminder__in=later).exists()
+
+    @pytest.mark.parametrize("count", [3, 30])
+    def test_query_count_depends_only_on_chunks(
+        self,
+        user,
+        count,
+        django_assert_num_queries,
+    ):
+        create_reminders(user, count)
+
+        # SAVEPOINT, chunk SELECT, sent-period SELECT, INSERT, UPDATE, RELEASE,
+        # then SAVEPOINT, the final empty SELECT and RELEASE.
+        with django_assert_num_queries(9):
+            ReminderService.process_due_reminders(chunk_size=50)
+
+    def test_missed_periods_are_collapsed_into_one_send(self, user):
+        today = timezone.now().date()
+        (reminder,) = create_reminders(
+            user,
+            1,
+            next_reminder_date=today - timedelta(days=17),
+        )
+
+        ReminderService.process_due_reminders()
+
+        reminder.refresh_from_db()
+        assert len(mail.outbox) == 1
+        assert reminder.notifications.get().period == today - timedelta(days=3)
+        assert reminder.next_reminder_date == today + timedelta(days=4)
+
+    def test_period_already_sent_is_not_sent_again(self, user):
+        today = timezone.now().date()
+        sent, pending = create_reminders(user, 2)
+        Notification.objects.create(reminder=sent, period=today, is_sent=True)
+
+        processed = ReminderService.process_due_reminders()
+
+        assert processed == 2  # noqa: PLR2004
+        assert len(mail.outbox) == 1
+        assert pending.notifications.get().period == today
+        assert set(
+            Reminder.objects.values_list("next_reminder_date", flat=True),
+        ) == {today + timedelta(weeks=1)}
+
+    def test_failed_email_is_recorded_without_aborting_the_chunk(
+        self,
+        user,
+        settings,
+    ):
+        settings.EMAIL_BACKEND = REJECTING_BACKEND
+        reminders = create_reminders(user, 3)
+        User.objects.filter(pk=user.pk).update(email=REJECTED)
+        Layby.objects.filter(reminder=reminders[1]).update(user=UserFactory())
+
+        ReminderService.process_due_reminders()
+
+        assert len(mail.outbox) == 1
+        assert dict(
+            Notification.objects.values_list("reminder", "is_sent"),
+        ) == {reminders[0].pk: False, reminders[1].pk: True, reminders[2].pk: False}
+
+    def test_send_reminder_notification_marks_notification_sent(self, user):
+        (reminder,) = create_reminders(user, 1)
+
+        NotificationService.send_reminder_notification(reminder)
+
+        assert len(mail.outbox) == 1
+        assert reminder.notifications.get().is_sent
+
+    def test_send_reminder_notification_sends_once_per_day(self, user):
+        (reminder,) = create_reminders(user, 1)
+
+        assert NotificationService.send_reminder_notification(reminder)
+        assert not NotificationService.send_reminder_notification(reminder)
+
+        assert len(mail.outbox) == 1
+
+    @pytest.mark.usefixtures("immediate_huey")
+    def test_send_now_sends_only_that_reminder(
+        self,
+        user,
+        api_client,
+        django_capture_on_commit_callbacks,
+    ):
+        reminder, _other = create_reminders(user, 2)
+        url = reverse("api:reminder-send-now", kwargs={"pk": reminder.pk})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(url)
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert len(mail.outbox) == 1
+        assert list(Notification.objects.values_list("reminder", flat=True)) == [
+            reminder.pk,
+        ]
+        assert api_client.post(url).status_code == status.HTTP_409_CONFLICT
+
+
+class TestReminderDigest:
+    def test_digest_user_gets_one_email_for_all_due_reminders(self, user):
+        ReminderPreference.objects.create(user=user, digest=True)
+        digest_reminders = create_reminders(user, 3)
+        other = UserFactory()
+        (single,) = create_reminders(other, 1)
+
+        # The digest user's reminders straddle two chunks.
+        processed = ReminderService.process_due_reminders(chunk_size=2)
+
+        assert processed == 4  # noqa: PLR2004
+        assert sorted(message.to[0] for message in mail.outbox) == sorted(
+            [user.email, other.email],
+        )
+        digest = next(m for m in mail.outbox if m.to == [user.email])
+        assert digest.subject == ReminderMailer.DIGEST_SUBJECT
+        assert digest.body.count("Remaining balance") == len(digest_reminders)
+        assert set(
+            Notification.objects.filter(is_sent=True).values_list(
+                "reminder",
+                flat=True,
+            ),
+        ) == {reminder.pk for reminder in [*digest_reminders, single]}
+
+    def test_preferences_endpoint_toggles_digest(self, user, api_client):
+        url = reverse("api:reminder-preferences")
+
+        assert api_client.get(url).data == {"digest": False}
+        response = api_client.patch(url, {"digest": True}, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert ReminderPreference.objects.get(user=user).digest
+
+
+class TestReminderListing:
+    def test_upcoming_is_paginated_soonest_first(self, user, api_client):
+        today = timezone.now().date()
+        later = create_reminders(user, 2, next_reminder_date=today + timedelta(days=3))
+        sooner = create_reminders(user, 2)
+        create_reminders(user, 1, next_reminder_date=today + timedelta(days=30))
+
+        first = api_client.get(reverse("api:reminder-upcoming"), {"page_size": 3})
+        second = api_client.get(first.data["next"])
+
+        assert [r["id"] for r in first.data["results"] + second.data["results"]] == [
+            reminder.pk for reminder in [*sooner, *later]
+        ]
+
+    def test_list_endpoints_run_a_fixed_number_of_queries(
+        self,
+        user,
+        assert_query_budget,
+    ):
+        reminders = create_reminders(user, 5)
+        today = timezone.now().date()
+        Notification.objects.bulk_create(
+            Notification(reminder=reminder, period=today - timedelta(weeks=week))
+            for reminder in reminders
+            for week in range(3)
+        )
+
+        response = assert_query_budget(reverse("api:reminder-list"), 3)
+        assert {r["notifications_count"] for r in response.data["results"]} == {3}
+        assert_query_budget(reverse("api:reminder-upcoming"), 3)
+        assert_query_budget(
+            reverse("api:reminder-notification-history", args=[reminders[0].pk]),
+            4,
+        )
+        assert_query_budget(reverse("api:notification-list"), 3)
+        assert_query_budget(reverse("api:notification-recent"), 3)
+
+
+class TestQueryPlans:
+    def test_due_reminders_use_the_due_index(self, assert_uses_index):
+        assert_uses_index(ReminderService.get_due_reminders(), "reminder_due_idx")
+
+    def test_notification_history_uses_the_history_index(
+        self,
+        user,
+        assert_uses_index,
+    ):
+        (reminder,) = create_reminders(user, 1)
+
+        assert_uses_index(
+            reminder.notifications.order_by("-sent_at"),
+            "notification_history_idx",
+        )
+
+
+class TestReminderAdmin:
+    @pytest.mark.parametrize(
+        ("changelist", "queries"),
+        [
+            ("admin:reminders_reminder_changelist", 7),
+            ("admin:reminders_notification_changelist", 7),
+        ],
+    )
+    def test_changelist_renders_100_rows_in_fixed_queries(
+        self,
+        admin_client,
+        changelist,
+        queries,
+        django_assert_num_queries,
+    ):
+        reminders = create_reminders(UserFactory(), 100)
+        Notification.objects.bulk_create(
+            Notification(reminder=reminder) for reminder in reminders[::2]
+        )
+
+        with django_assert_num_queries(queries):
+            response = admin_client.get(reverse(changelist))
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+class TestReminderSendJobs:
+    def send_from_admin(self, admin_client, reminders):
+        return admin_client.post(
+            reverse("admin:reminders_reminder_changelist"),
+            {
+                "action": "send_reminder_notifications",
+                "_selected_action": [reminder.pk for reminder in reminders],
+            },
+        )
+
+    def test_action_returns_without_sending(
+        self,
+        user,
+        admin_client,
+        django_capture_on_commit_callbacks,
+    ):
+        reminders = create_reminders(user, 5)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            response = self.send_from_admin(admin_client, reminders)
+
+        assert response.status_code == status.HTTP_302_FOUND
+        job = ReminderSendJob.objects.get()
+        assert job.total == 5  # noqa: PLR2004
+        assert len(callbacks) == 1
+        assert mail.outbox == []
+
+    def test_action_links_to_a_job_page_that_polls_progress(self, user, admin_client):
+        reminders = create_reminders(user, 2)
+
+        response = self.send_from_admin(admin_client, reminders)
+
+        job = ReminderSendJob.objects.get()
+        job_url = reverse("admin:reminders_remindersendjob_change", args=[job.pk])
+        progress_url = reverse("admin:reminders_reminder_send_job", args=[job.pk])
+        response = admin_client.get(response.url)
+        assert job_url in response.content.decode()
+
+        response = admin_client.get(job_url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.context["progress"] == job.get_progress()
+        assert progress_url in response.content.decode()
+
+    @pytest.mark.usefixtures("immediate_huey")
+    def test_chunks_send_in_background_and_report_progress(
+        self,
+        user,
+        admin_client,
+        django_capture_on_commit_callbacks,
+    ):
+        reminders = create_reminders(user, 5)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            job = NotificationService.start_send_job(
+                [reminder.pk for reminder in reminders],
+                chunk_size=2,
+            )
+
+        assert len(mail.outbox) == 5  # noqa: PLR2004
+        assert Notification.objects.filter(is_sent=True).count() == 5  # noqa: PLR2004
+        response = admin_client.get(
+            reverse("admin:reminders_reminder_send_job", args=[job.pk]),
+        )
+        assert response.json() == {
+            "id": job.pk,
+            "total": 5,
+            "processed": 5,
+            "sent": 5,
+            "finished": True,
+        }
+
+    def test_chunk_sends_each_reminder_once_a_day_in_fixed_queries(
+        self,
+        user,
+        django_assert_num_queries,
+    ):
+        reminders = create_reminders(user, 20)
+        reminder_ids = [reminder.pk for reminder in reminders]
+        job = ReminderSendJob.objects.create(total=40)
+        NotificationService.send_reminder_notifications(reminder_ids[:5])
+
+        # SELECT reminders, upsert notifications, UPDATE job
+        with django_assert_num_queries(3):
+            sent = NotificationService.process_send_chunk(job.pk, reminder_ids)
+
+        assert sent == 15  # noqa: PLR2004
+        assert len(mail.outbox) == 20  # noqa: PLR2004
+        job.refresh_from_db()
+        assert (job.processed, job.sent, job.finished_at) == (20, 15, None)
+
+
+class TestReminderMailer:
+    def test_batch_renders_text_and_html_for_each_layby(self, user, layby):
+        Layby.objects.filter(pk=layby.pk).update(shop_name="Smith & Sons")
+        layby.refresh_from_db()
+        other = UserFactory()
+
+        first, second = ReminderMailer.build_layby_reminders(
+            [(user, layby), (other, layby)],
+        )
+
+        assert first.to == [user.email]
+        assert second.to == [other.email]
+        assert "Smith & Sons" in first.body
+        assert "<" not in first.body
+        assert "Remaining balance as of" in first.body
+        html, mimetype = first.alternatives[0]
+        assert mimetype == "text/html"
+        assert "Smith &amp; Sons" in html
+
+
+class TestFanOutDueReminders:
+    def test_due_reminders_are_split_into_ranges(self, user):
+        reminders = create_reminders(user, 5)
+        pks = [reminder.pk for reminder in reminders]
+
+        ranges = ReminderService.get_due_reminder_ranges(2)
+
+        assert ranges == [(pks[0], pks[1]), (pks[2], pks[3]), (pks[4], pks[4])]
+
+    @pytest.mark.usefixtures("immediate_huey")
+    def test_each_range_is_processed_by_a_subtask(self, user):
+        create_reminders(user, 5)
+
+        summary = fan_out_due_reminders(chunk_size=2)
+
+        assert summary == {"chunks": 3}
+        assert len(mail.outbox) == 5  # noqa: PLR2004
+
+    @pytest.mark.usefixtures("immediate_huey")
+    def test_only_failed_ranges_are_retried(self, user, monkeypatch):
+        reminders = create_reminders(user, 4)
+        process = ReminderService.process_due_reminders
+        calls = []
+
+        def flaky_process(first_pk, last_pk):
+            calls.append(first_pk)
+            if first_pk == reminders[2].pk and calls.count(first_pk) == 1:
+                msg = "SMTP server went away"
+                raise ConnectionError(msg)
+            return process(first_pk=first_pk, last_pk=last_pk)
+
+        monkeypatch.setattr(ReminderService, "process_due_reminders", flaky_process)
+
+        fan_out_due_reminders(chunk_size=2, retry_delay=0)
+
+        assert calls == [reminders[0].pk, reminders[2].pk, reminders[2].pk]
+        assert len(mail.outbox) == 4  # noqa: PLR2004
+
+    @pytest.mark.usefixtures("immediate_huey")
+    def test_ranges_out_of_attempts_are_reported(self, user, monkeypatch, caplog):
+        reminders = create_reminders(user, 2)
+        calls = []
+
+        def failing_process(first_pk, last_pk):
+            calls.append(first_pk)
+            msg = "SMTP server went away"
+            raise ConnectionError(msg)
+
+        monkeypatch.setattr(ReminderService, "process_due_reminders", failing_process)
+
+        fan_out_due_reminders(chunk_size=2, attempts=2, retry_delay=0)
+
+        assert calls == [reminders[0].pk, reminders[0].pk]
+        assert (
+            f"Reminder chunk ({reminders[0].pk}, {reminders[1].pk}) failed"
+            in caplog.text
+        )
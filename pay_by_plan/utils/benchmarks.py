@@ -0,0 +1,101 @@
+"""
+Benchmarks for the mail dispatch layer.
+
+These are not collected by the regular test run. Run them explicitly with output
+enabled, optionally overriding the number of messages and the delay the SMTP
+stand-in adds to every new connection (a stand-in for the TLS handshake):
+
+    $ BENCHMARK_MESSAGES=5000 BENCHMARK_SMTP_CONNECT_DELAY=0.02 \
+        pytest pay_by_plan/utils/benchmarks.py -s
+"""
+
+import os
+import socketserver
+import threading
+import time
+
+import pytest
+from django.core.mail import EmailMessage
+
+from pay_by_plan.utils.mail import send_mass_messages
+
+MESSAGES = int(os.environ.get("BENCHMARK_MESSAGES", "500"))
+CONNECT_DELAY = float(os.environ.get("BENCHMARK_SMTP_CONNECT_DELAY", "0.01"))
+
+
+class SMTPStandIn(socketserver.StreamRequestHandler):
+    """Just enough of SMTP to accept mail from smtplib and throw it away."""
+
+    connect_delay = CONNECT_DELAY
+    message_delay = 0.0
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        time.sleep(self.connect_delay)
+        self.reply("220 localhost ESMTP")
+        while line := self.rfile.readline():
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                self.reply("250-localhost")
+                self.reply("250 8BITMIME")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in {b".\r\n", b""}:
+                    pass
+                time.sleep(self.message_delay)
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp_server(settings):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+    settings.EMAIL_HOST, settings.EMAIL_PORT = server.server_address
+    settings.EMAIL_USE_TLS = False
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _build_messages():
+    return [
+        EmailMessage(
+            "Reminder for Your Layby Payment",
+            "Your next layby payment is due.",
+            "noreply@example.com",
+            [f"user{i}@example.com"],
+        )
+        for i in range(MESSAGES)
+    ]
+
+
+def _report(label, elapsed):
+    rate = MESSAGES / elapsed
+    print(f"{label:<12} {MESSAGES} messages in {elapsed:8.2f}s {rate:8.0f}/sec")  # noqa: T201
+    return rate
+
+
+@pytest.mark.usefixtures("smtp_server")
+def test_dispatcher_against_connection_per_message():
+    messages = _build_messages()
+    start = time.perf_counter()
+    sent = sum(message.send() for message in messages)
+    per_message_rate = _report("per-message", time.perf_counter() - start)
+    assert sent == MESSAGES
+
+    messages = _build_messages()
+    start = time.perf_counter()
+    results = send_mass_messages(messages)
+    dispatcher_rate = _report("dispatcher", time.perf_counter() - start)
+    assert all(results)
+
+    print(f"speedup      {dispatcher_rate / per_message_rate:.1f}x")  # noqa: T201
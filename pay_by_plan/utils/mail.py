@@ -0,0 +1,89 @@
+import logging
+from collections.abc import Iterable
+from smtplib import SMTPException
+from smtplib import SMTPServerDisconnected
+
+from django.core.mail import EmailMessage
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class MailDispatcher:
+    """
+    Send batches of email over a single email backend connection.
+
+    The connection is opened once when the dispatcher is entered and closed when
+    it exits, so a batch pays for one connection (and one TLS handshake) instead
+    of one per message. Messages are handed to the backend one at a time, so a
+    rejected recipient only fails its own message. If the server drops the
+    connection, it is reopened and the rest of the batch carries on.
+
+        with MailDispatcher() as dispatcher:
+            results = dispatcher.send_messages(messages)
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection or get_connection()
+        self.sent = 0
+        self.failed = 0
+
+    def __enter__(self):
+        self.connection.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.close()
+
+    def send(self, message: EmailMessage) -> bool:
+        """
+        Send one message over the shared connection.
+
+        Returns:
+            bool: True if the backend accepted the message
+        """
+        try:
+            sent = bool(self.connection.send_messages([message]))
+        except SMTPServerDisconnected:
+            logger.exception("Mail connection dropped while sending to %s", message.to)
+            self._reconnect()
+            sent = False
+        except (SMTPException, OSError):
+            logger.exception("Error sending email to %s", message.to)
+            sent = False
+
+        if sent:
+            self.sent += 1
+        else:
+            self.failed += 1
+        return sent
+
+    def send_messages(self, messages: Iterable[EmailMessage]) -> list[bool]:
+        """
+        Send every message, carrying on past individual failures.
+
+        Returns:
+            list[bool]: Whether each message was sent, in order
+        """
+        return [self.send(message) for message in messages]
+
+    def _reconnect(self) -> None:
+        self.connection.close()
+        try:
+            self.connection.open()
+        except (SMTPException, OSError):
+            logger.exception("Could not reopen the mail connection")
+
+
+def send_mass_messages(messages: Iterable[EmailMessage]) -> list[bool]:
+    """
+    Send messages over one backend connection.
+
+    Returns:
+        list[bool]: Whether each message was sent, in order
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+    with MailDispatcher() as dispatcher:
+        return dispatcher.send_messages(messages)
@@ -0,0 +1,32 @@
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    """
+    Keyset pagination for list endpoints.
+
+    Pages are fetched with a WHERE on the ordering columns instead of an OFFSET,
+    so every page costs the same no matter how deep into the history it is. The
+    ordering ends in the primary key to make it unique.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = ("-id",)
+
+
+class PaymentCursorPagination(CursorPagination):
+    ordering = ("-payment_date", "-id")
+
+
+class LaybyCursorPagination(CursorPagination):
+    ordering = ("-start_date", "-id")
+
+
+class ReminderCursorPagination(CursorPagination):
+    ordering = ("next_reminder_date", "id")
+
+
+class NotificationCursorPagination(CursorPagination):
+    ordering = ("-sent_at", "-id")
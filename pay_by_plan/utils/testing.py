@@ -0,0 +1,26 @@
+"""
+Helpers shared by the test suites of the apps.
+"""
+
+from smtplib import SMTPRecipientsRefused
+
+from django.core.mail.backends.locmem import EmailBackend
+
+REJECTED = "rejected@example.com"
+REJECTING_BACKEND = "pay_by_plan.utils.testing.RejectingBackend"
+
+
+class RejectingBackend(EmailBackend):
+    """Locmem backend that refuses one recipient and counts opened connections."""
+
+    opened = 0
+
+    def open(self):
+        RejectingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if REJECTED in message.to:
+                raise SMTPRecipientsRefused({REJECTED: (550, b"No such user")})
+        return super().send_messages(messages)
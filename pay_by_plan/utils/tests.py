@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+import pytest
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.db import connection
+from laybys.models import Layby
+
+from pay_by_plan.utils.admin import EstimatedCountPaginator
+from pay_by_plan.utils.mail import MailDispatcher
+from pay_by_plan.utils.mail import send_mass_messages
+from pay_by_plan.utils.testing import REJECTED
+from pay_by_plan.utils.testing import REJECTING_BACKEND
+from pay_by_plan.utils.testing import RejectingBackend
+
+
+def build_messages(recipients):
+    return [
+        EmailMessage("Subject", "Body", "from@example.com", [recipient])
+        for recipient in recipients
+    ]
+
+
+class TestMailDispatcher:
+    def test_failed_message_does_not_abort_the_batch(self):
+        messages = build_messages(["a@example.com", REJECTED, "b@example.com"])
+
+        with MailDispatcher(RejectingBackend()) as dispatcher:
+            results = dispatcher.send_messages(messages)
+
+        assert results == [True, False, True]
+        assert (dispatcher.sent, dispatcher.failed) == (2, 1)
+        assert [message.to for message in mail.outbox] == [
+            ["a@example.com"],
+            ["b@example.com"],
+        ]
+
+    def test_batch_uses_one_connection(self, settings):
+        settings.EMAIL_BACKEND = REJECTING_BACKEND
+        RejectingBackend.opened = 0
+
+        results = send_mass_messages(build_messages(["a@example.com"] * 5))
+
+        assert results == [True] * 5
+        assert RejectingBackend.opened == 1
+
+    def test_empty_batch_opens_no_connection(self, settings):
+        settings.EMAIL_BACKEND = REJECTING_BACKEND
+        RejectingBackend.opened = 0
+
+        assert send_mass_messages([]) == []
+        assert RejectingBackend.opened == 0
+
+
+def create_laybys(user, count):
+    Layby.objects.bulk_create(
+        Layby(
+            user=user,
+            shop_name="Game",
+            item_description="Item",
+            total_cost=Decimal("100.00"),
+            expected_end_date="2099-01-01",
+        )
+        for _ in range(count)
+    )
+
+
+class TestEstimatedCountPaginator:
+    @pytest.fixture
+    def analyzed(self, user):
+        create_laybys(user, 30)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE laybys_layby")
+        # Rows added since the last ANALYZE are not in the estimate.
+        create_laybys(user, 5)
+
+    @pytest.mark.usefixtures("analyzed")
+    def test_large_unfiltered_table_is_estimated(self):
+        paginator = EstimatedCountPaginator(Layby.objects.all(), 10, threshold=20)
+
+        assert paginator.count == 30  # noqa: PLR2004
+
+    @pytest.mark.usefixtures("analyzed")
+    def test_small_filtered_and_exact_querysets_are_counted(self, user):
+        laybys = Layby.objects.all()
+        paginators = [
+            EstimatedCountPaginator(laybys, 10, threshold=50),
+            EstimatedCountPaginator(laybys, 10, threshold=20, exact=True),
+            EstimatedCountPaginator(laybys.filter(user=user), 10, threshold=20),
+        ]
+
+        assert [paginator.count for paginator in paginators] == [35, 35, 35]